@@ -5,11 +5,13 @@ Created on Thu Jun 22 14:36:51 2017
 @author: ls
 """
 
+import Queue
 import socket
 import sys
+import threading
 
 from Src.Management import timeout
-from Src.Communication import pickler
+from Src.Communication import protocol
 
 
 def update_sensors(sock, only_sens=True):
@@ -33,6 +35,20 @@ def change_state(sock, new_state):
     return ans
 
 
+def request_role(sock, role='control'):
+    """ Ask the server for the role 'control' or 'read_only'. Only one
+    client at a time can control the robot.
+
+        Returns:
+            (str): the role the server granted
+    """
+    order = [['role', role]]
+    send_all(sock, order)
+    ans = recieve_data(sock)
+    print('sent request_role', role, 'ans=', ans)
+    return ans
+
+
 def set_valve(valve_data, order=[]):
     order.append(['set_valve', valve_data])
     return order
@@ -49,11 +65,11 @@ def set_dvalve(dvalve_data, order=[]):
 
 
 def send_all(sock, order):
-    sock.sendall(pickler.pickle_data(order))
+    sock.send(order)
 
 
 def recieve_data(sock):
-    ans = pickler.unpickle_data(sock.recv(4096))
+    ans = sock.recv()
     return ans
 
 
@@ -100,6 +116,124 @@ def set_walking_state(sock, state):
     print('sent set_walking', state, 'ans=', ans)
 
 
+def fetch_telemetry(sock, cursor=0, limit=None):
+    """ Get the samples the server recorded since *cursor*
+
+        Args:
+            sock (socket): connection to the server
+            cursor (int): cursor returned by the last fetch
+            limit (int): max number of samples
+
+        Returns:
+            (int): cursor for the next fetch
+            (list): names of the channels
+            (list): samples, [time, channels...] each
+    """
+    order = [['telemetry', cursor, limit]]
+    send_all(sock, order)
+    ans = recieve_data(sock)
+    return ans.cursor, ans.channels, ans.samples
+
+
+def get_latency(sock):
+    """ Get the latency of the phases of the control loop
+
+        Returns:
+            (dict): {phase: {'count', 'mean', 'max', 'p50', ...}}, times in
+                us, see latency.Histogram.summary
+    """
+    order = [['latency']]
+    send_all(sock, order)
+    return recieve_data(sock)
+
+
+def get_sensor_health(sock):
+    """ Get the failure statistics of the sensors
+
+        Returns:
+            (dict): {bank: {sensor: {'reads', 'errors', 'consecutive',
+                'skipped', 'age'}}}, see health.SensorHealth.stats
+    """
+    order = [['sensor_health']]
+    send_all(sock, order)
+    return recieve_data(sock)
+
+
+class StreamReader(threading.Thread):
+    """ Receives everything the server sends, in the background. Pushed
+    telemetry is handed to a callback, all other messages are answers and
+    are queued for recieve_data. """
+    def __init__(self, sock, callback):
+        """
+        *Initialize with:*
+
+        Args:
+            sock (protocol.Connection): connection to the server
+            callback (function): called with (channels, samples) for every
+                batch of telemetry
+        """
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.sock = sock
+        self.callback = callback
+        self.answers = Queue.Queue()
+
+    def run(self):
+        try:
+            while True:
+                ans = self.sock.recv()
+                if isinstance(ans, protocol.Samples) and ans.pushed:
+                    self.callback(ans.channels, ans.samples)
+                else:
+                    self.answers.put(ans)
+        except Exception as err:
+            # e.g. closed, a malformed frame or a failing callback. Passed to
+            # recv(), which would wait forever otherwise.
+            self.answers.put(err)
+
+
+class StreamConnection(object):
+    """ Connection to the server with a StreamReader. Can be used
+    everywhere a protocol.Connection is expected. """
+    def __init__(self, sock, callback):
+        self.sock = sock
+        self.reader = StreamReader(sock, callback)
+        self.reader.start()
+
+    def send(self, data):
+        self.sock.send(data)
+
+    def recv(self):
+        ans = self.reader.answers.get()
+        if isinstance(ans, Exception):
+            self.reader.answers.put(ans)
+            raise ans
+        return ans
+
+    def close(self):
+        self.sock.close()
+
+
+def subscribe(sock, callback, decimation=1, interval=.1):
+    """ Let the server push its telemetry
+
+        Args:
+            sock (protocol.Connection): connection to the server
+            callback (function): called with (channels, samples) for every
+                batch, e.g. GUIRecorder.extend
+            decimation (int): the server sends every decimation-th sample
+            interval (float): time between two batches in sec
+
+        Returns:
+            (StreamConnection): use this instead of sock from now on
+    """
+    stream = StreamConnection(sock, callback)
+    send_all(stream, [['subscribe', decimation, interval]])
+    ans = recieve_data(stream)
+    print('sent subscribe', decimation, 'ans=', ans)
+    return stream
+
+
 def get_meta_data(sock):
     """ Get informations about initialized things at the BBB
     """
@@ -128,4 +262,4 @@ def init_BBB_connection(hostname):
     print >>sys.stderr, 'connecting to %s port %s' % server_address
     with timeout.timeout():
         sock.connect(server_address)
-    return sock
+    return protocol.Connection(sock)
@@ -3,168 +3,415 @@
 Created on Wed Jun 14 14:24:30 2017
 
 @author: ls
+
+The server side of the communication. Serves any number of clients (the
+GUI, a second laptop, a logger, ...) in one thread with select().
+
+The first client which connects gets the role 'control', all others are
+'read_only'. Read only clients can ask for data and subscribe to the
+telemetry, but their set_* commands are ignored (they get the unchanged
+value as answer). If the controlling client disconnects, the robot is
+paused and the next client which asks for it (command ['role', 'control'])
+or connects gets the control.
+
+Nothing a client sends is unpickled (see protocol), i.e. a client can not
+run code on the robot. A client which sends a malformed frame is dropped.
+
+Changes of the cargo are not applied by this thread, but queued in
+cargo.tasks and executed by the control loop between two ticks.
+
+A change_state is answered as soon as the control loop arrived in the new
+state: cargo.handoff wakes the select() by a socketpair. If the state is not
+reached within STATE_TIMEOUT, the client gets the actual state.
 """
 from __future__ import print_function
 
 import __builtin__
+import errno
+import select
 import socket
 import sys
 import threading
 import traceback
-import time
 
 from termcolor import colored
-from Src.Communication import pickler
+from Src.Communication import protocol
+from Src.Management import clock
+from Src.Management import telemetry
+from Src.Management.tasks import STATE_TIMEOUT
 from Src.Controller import controller as ctrlib
 
 
+ROLES = ['control', 'read_only']
+POLL_TIME = .1          # [sec] to check for EXIT
+MAX_OUTBOX = 2**20      # [bytes] per client. If exceeded, pushes are delayed
+
+
 def print(*args, **kwargs):
     __builtin__.print(colored('Comm_Thread: ', 'red'), *args, **kwargs)
 
 
+class ClientSession(object):
+    def __init__(self, sock, address, role):
+        """
+        A connected client.
+
+        *Initialize with:*
+
+        Args:
+            sock (socket.socket): the connection (non-blocking)
+            address (tuple): address of the client
+            role (str): one of ROLES
+        """
+        self.sock = sock
+        self.address = address
+        self.role = role
+        self.encoder = protocol.Encoder()
+        self.decoder = protocol.Decoder()
+        self.outbox = ''
+        self.subscription = None
+        self.awaited_state = None
+        self.awaited_deadline = None
+        self.delayed_pushes = 0
+
+    @property
+    def control(self):
+        return self.role == 'control'
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def receive(self):
+        """
+        Read from the socket.
+
+        Returns:
+            (list): all messages which are received completely
+        """
+        data = self.sock.recv(65536)
+        if not data:
+            raise EOFError('connection closed by client')
+        return self.decoder.feed(data)
+
+    def send(self, data):
+        """ Queue a message. It is sent by flush(). """
+        self.outbox += self.encoder.encode(data)
+
+    def flush(self):
+        """ Send as much of the outbox as the socket takes """
+        try:
+            sent = self.sock.send(self.outbox)
+        except socket.error as err:
+            if err.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        self.outbox = self.outbox[sent:]
+
+
 class CommunicationThread(threading.Thread):
     def __init__(self, cargo):
         """ """
         threading.Thread.__init__(self)
         self.cargo = cargo
         self.SOCK = None
-        self.connection = None
+        self.clients = []
+        self.wakeup = None
 
         print('Starting server ...')
         self.SOCK = init_connection()
+        self.init_wakeup()
+
+    def init_wakeup(self):
+        """ Let cargo.handoff wake the select() of serve(), whenever the
+        control loop arrives in a new state """
+        self.wakeup = socket.socketpair()
+        for sock in self.wakeup:
+            sock.setblocking(0)
+        self.cargo.handoff.listeners.append(self.notify)
+
+    def close_wakeup(self):
+        if self.notify in self.cargo.handoff.listeners:
+            self.cargo.handoff.listeners.remove(self.notify)
+        for sock in self.wakeup:
+            sock.close()
+
+    def notify(self, state):
+        """ Called by the control loop, see tasks.StateHandoff.set """
+        try:
+            self.wakeup[1].send('x')
+        except socket.error as err:
+            # a full pipe wakes the select() anyway
+            if err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
 
     def run(self):
         """ run the Communication """
 
-        print('Waiting for connection')
-        self.connection, client_adress = self.SOCK.accept()
-        print('Sucessfull connected to ', client_adress)
-
+        print('Waiting for connections')
         try:
             while self.cargo.state != 'EXIT':
-                try:
-                    self.get_tasks()
-                except:
-                    print('\n--caught exception! in Communictaion Thread--\n')
-                    print("Unexpected error:\n", sys.exc_info()[0])
-                    print(sys.exc_info()[1])
-                    traceback.print_tb(sys.exc_info()[2])
-                    print('\nBreaking the communication loop ...')
-                    break
+                self.serve()
+        except:
+            print('\n--caught exception! in Communictaion Thread--\n')
+            print("Unexpected error:\n", sys.exc_info()[0])
+            print(sys.exc_info()[1])
+            traceback.print_tb(sys.exc_info()[2])
+            print('\nBreaking the communication loop ...')
         finally:
             print('Exit the communication Thread ...')
             self.cargo.state = 'EXIT'
-            graceful_exit(self.connection, self.SOCK)
+            for client in list(self.clients):
+                if client.awaited_state:
+                    client.send(client.awaited_state)
+                self.flush(client)
+            graceful_exit([client.sock for client in self.clients],
+                          self.SOCK)
+            self.close_wakeup()
 
         print('Communication Thread is done ...')
 
-    def get_tasks(self):
-        data_in_raw = self.connection.recv(4096)
-        data_in_list = pickler.unpickle_data(data_in_raw)
-
-        for data_in in data_in_list:
-            if 'update' in data_in:
-                self.send_back([self.cargo.rec, self.cargo.rec_u,
-                                self.cargo.rec_r])
-
-            if 'valve_meta_info' in data_in:
-                valve_data = []
-                for valve in self.cargo.valve:
-                    valve_data.append(valve.name)
-                PID_gains = []
-                for c in self.cargo.controller:
-                    PID_gains.append([c.Kp, c.Ti, c.Td])
-                self.send_back([valve_data,
-                                self.cargo.maxpressure,
-                                self.cargo.maxctrout,
-                                self.cargo.sampling_time,
-                                PID_gains,
-                                self.cargo.wcomm.pattern])
-
-            if 'dvalve_meta_info' in data_in:
-                dvalve_data = []
-                for dvalve in self.cargo.dvalve:
-                    dvalve_data.append(dvalve.name)
-                self.send_back(dvalve_data)
-
-            if 'change_state' in data_in:
-                candidates = ['PAUSE', 'REFERENCE_TRACKING', 'EXIT',
-                              'USER_CONTROL', 'USER_REFERENCE']
-                new_state = None
-                for candidate in candidates:
-                    if candidate in data_in:
-                        new_state = candidate
-                        print('recieved task to change state to:', new_state)
-                if new_state:
-                    self.cargo.state = new_state
-                    while not self.cargo.actual_state == new_state:
-                        time.sleep(self.cargo.sampling_time)
-                self.send_back(new_state)
-
-            if 'set_valve' in data_in:
-                valve_data = data_in[1]
-                for key in valve_data:
-                    self.cargo.pwm_task[key] = valve_data[key]
-
-            if 'set_ref' in data_in:
-                ref_data = data_in[1]
-                for key in ref_data:
-                    self.cargo.ref_task[key] = ref_data[key]
-
-            if 'set_dvalve' in data_in:
-                dvalve_data = data_in[1]
-                for key in dvalve_data:
-                    self.cargo.dvalve_task[key] = dvalve_data[key]
-
-            if 'set_pidgain' in data_in:
-                idx = data_in[1]
-                gain_data = data_in[2]
-                if isinstance(self.cargo.controller[idx],
-                              ctrlib.PidController):
-                    self.cargo.controller[idx].set_gain(gain_data)
-                else:
-                    raise NotImplementedError(
-                        "Controller", self.cargo.controller[idx],
-                        "doesn't support gain setting at runtime")
-                c = self.cargo.controller[idx]
-                gain = [c.Kp, c.Ti, c.Td]
-                self.send_back(gain)
-
-            if 'set_maxpressure' in data_in:
-                maxpressure = data_in[1]
-                if 10 > maxpressure > 0:
-                    self.cargo.maxpressure = maxpressure
-                    for sensor in self.cargo.sens:
-                        sensor.set_maxpressure(maxpressure)
-                self.send_back(self.cargo.maxpressure)
-
-            if 'set_maxctrout' in data_in:
-                maxctrout = data_in[1]
-                if 1. > maxctrout > 0.:
-                    self.cargo.maxctrout = maxctrout
-                    for ctr in self.cargo.controller:
-                        ctr.set_maxoutput(maxctrout)
-                self.send_back(self.cargo.maxctrout)
-
-            if 'set_tsampling' in data_in:
-                tsampling = data_in[1]
-                if 1. > tsampling > 0.:
-                    self.cargo.sampling_time = tsampling
-                self.send_back(self.cargo.sampling_time)
-
-            if 'set_pattern' in data_in:
-                pattern = data_in[1]
-                self.cargo.wcomm.pattern = pattern
-                self.send_back(self.cargo.wcomm.pattern)
-
-            if 'set_walking' in data_in:
-                state = data_in[1]
-                self.cargo.wcomm.confirm = state
-                self.send_back(self.cargo.wcomm.confirm)
-
-    def send_back(self, data_out):
-        data_out_raw = pickler.pickle_data(data_out)
-        self.connection.sendall(data_out_raw)
+    def serve(self):
+        """ One round: wait for something to do (at most POLL_TIME), then
+        accept, receive, execute, push and send """
+        timeout = POLL_TIME
+        now = clock.monotonic()
+        for client in self.clients:
+            if client.subscription:
+                timeout = min(timeout, client.subscription.timeout())
+            if client.awaited_state:
+                timeout = min(timeout, client.awaited_deadline - now)
+        writers = [client for client in self.clients if client.outbox]
+        readable, _, _ = select.select(
+            [self.SOCK, self.wakeup[0]] + self.clients, writers, [],
+            max(timeout, 0.))
+
+        for client in readable:
+            if client is self.SOCK:
+                self.accept()
+                continue
+            if client is self.wakeup[0]:
+                self.drain_wakeup()
+                continue
+            try:
+                messages = client.receive()
+            except Exception as err:    # closed, or a malformed frame
+                self.drop(client, err)
+                continue
+            try:
+                for data_in_list in messages:
+                    for data_in in data_in_list:
+                        self.get_task(client, data_in)
+            except Exception as err:
+                traceback.print_exc()
+                self.drop(client, err)
+
+        now = clock.monotonic()
+        for client in list(self.clients):
+            if client.awaited_state:
+                actual_state = self.cargo.actual_state
+                if (actual_state == client.awaited_state or
+                        now >= client.awaited_deadline):
+                    client.send(actual_state)
+                    client.awaited_state = None
+            if client.subscription:
+                self.push_telemetry(client)
+            if client.outbox:
+                self.flush(client)
+
+    def drain_wakeup(self):
+        try:
+            while self.wakeup[0].recv(4096):
+                pass
+        except socket.error as err:
+            if err.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def accept(self):
+        sock, address = self.SOCK.accept()
+        sock.setblocking(0)
+        if [client for client in self.clients if client.control]:
+            role = 'read_only'
+        else:
+            role = 'control'
+        self.clients.append(ClientSession(sock, address, role))
+        print('Sucessfull connected to ', address, 'as', role)
+
+    def drop(self, client, reason=None):
+        print('Connection to', client.address, 'closed:', reason)
+        self.clients.remove(client)
+        client.sock.close()
+        if client.control:
+            print('Lost the controlling client. Pausing ...')
+            if self.cargo.state not in ['EXIT', 'PAUSE']:
+                self.cargo.state = 'PAUSE'
+
+    def flush(self, client):
+        try:
+            client.flush()
+        except socket.error as err:
+            self.drop(client, err)
+
+    def get_task(self, client, data_in):
+        """ Execute the command *data_in* of *client* """
+        cargo = self.cargo
+        tasks = cargo.tasks
+        if 'update' in data_in:
+            client.send([cargo.rec, cargo.rec_u, cargo.rec_r])
+
+        if 'valve_meta_info' in data_in:
+            valve_data = []
+            for valve in cargo.valve:
+                valve_data.append(valve.name)
+            PID_gains = []
+            for c in cargo.controller:
+                PID_gains.append([c.Kp, c.Ti, c.Td])
+            client.send([valve_data,
+                         cargo.maxpressure,
+                         cargo.maxctrout,
+                         cargo.sampling_time,
+                         PID_gains,
+                         cargo.wcomm.pattern])
+
+        if 'dvalve_meta_info' in data_in:
+            dvalve_data = []
+            for dvalve in cargo.dvalve:
+                dvalve_data.append(dvalve.name)
+            client.send(dvalve_data)
+
+        if 'role' in data_in:
+            if len(data_in) > 1 and data_in[1] == 'control':
+                if not [c for c in self.clients if c.control]:
+                    client.role = 'control'
+            elif len(data_in) > 1 and data_in[1] == 'read_only':
+                client.role = 'read_only'
+            client.send(client.role)
+
+        if 'change_state' in data_in:
+            candidates = ['PAUSE', 'REFERENCE_TRACKING', 'EXIT',
+                          'USER_CONTROL', 'USER_REFERENCE']
+            new_state = None
+            for candidate in candidates:
+                if candidate in data_in:
+                    new_state = candidate
+            if not client.control:
+                client.send(cargo.actual_state)
+            elif new_state:
+                print('recieved task to change state to:', new_state)
+                cargo.state = new_state
+                # answered by serve(), as soon as the state is reached
+                client.awaited_state = new_state
+                client.awaited_deadline = clock.monotonic() + STATE_TIMEOUT
+            else:
+                client.send(new_state)
+
+        if 'set_valve' in data_in and client.control:
+            tasks.put(cargo.pwm_task.update, data_in[1])
+
+        if 'set_ref' in data_in and client.control:
+            tasks.put(cargo.ref_task.update, data_in[1])
+
+        if 'set_dvalve' in data_in and client.control:
+            tasks.put(cargo.dvalve_task.update, data_in[1])
+
+        if 'set_pidgain' in data_in:
+            idx = data_in[1]
+            gain_data = data_in[2]
+            c = cargo.controller[idx]
+            if not isinstance(c, ctrlib.PidController):
+                raise NotImplementedError(
+                    "Controller", c,
+                    "doesn't support gain setting at runtime")
+            gain = [c.Kp, c.Ti, c.Td]
+            if client.control:
+                tasks.put(c.set_gain, gain_data)
+                gain = list(gain_data)
+            client.send(gain)
+
+        if 'set_maxpressure' in data_in:
+            maxpressure = data_in[1]
+            answer = cargo.maxpressure
+            if client.control and 10 > maxpressure > 0:
+                tasks.put(set_maxpressure, cargo, maxpressure)
+                answer = maxpressure
+            client.send(answer)
+
+        if 'set_maxctrout' in data_in:
+            maxctrout = data_in[1]
+            answer = cargo.maxctrout
+            if client.control and 1. > maxctrout > 0.:
+                tasks.put(set_maxctrout, cargo, maxctrout)
+                answer = maxctrout
+            client.send(answer)
+
+        if 'set_tsampling' in data_in:
+            tsampling = data_in[1]
+            answer = cargo.sampling_time
+            if client.control and 1. > tsampling > 0.:
+                tasks.put(setattr, cargo, 'sampling_time', tsampling)
+                answer = tsampling
+            client.send(answer)
+
+        if 'set_pattern' in data_in:
+            pattern = data_in[1]
+            answer = cargo.wcomm.pattern
+            if client.control:
+                tasks.put(setattr, cargo.wcomm, 'pattern', pattern)
+                answer = pattern
+            client.send(answer)
+
+        if 'set_walking' in data_in:
+            state = data_in[1]
+            answer = cargo.wcomm.confirm
+            if client.control:
+                tasks.put(setattr, cargo.wcomm, 'confirm', state)
+                answer = state
+            client.send(answer)
+
+        if 'telemetry' in data_in:
+            cursor, limit = data_in[1], data_in[2]
+            cursor, samples = cargo.telemetry.read(cursor, limit)
+            client.send(protocol.Samples(
+                cursor, cargo.telemetry.channels, samples))
+
+        if 'latency' in data_in:
+            client.send(cargo.latency.summary())
+
+        if 'sensor_health' in data_in:
+            client.send(dict([(health.kind, health.stats())
+                              for health in cargo.health]))
+
+        if 'subscribe' in data_in:
+            decimation, interval = data_in[1], data_in[2]
+            if decimation > 0:
+                client.subscription = telemetry.Subscription(
+                    cargo.telemetry, decimation, interval)
+            else:
+                client.subscription = None
+            client.send(decimation)
+
+    def push_telemetry(self, client):
+        """ Send the telemetry since the last push to *client*, if it is due.
+        As long as the client does not take what was sent before, the push
+        is delayed and the samples stay in the ring. """
+        if len(client.outbox) > MAX_OUTBOX:
+            client.delayed_pushes += 1
+            return
+        cursor, samples = client.subscription.poll()
+        if samples is not None and len(samples):
+            client.send(protocol.Samples(
+                cursor, self.cargo.telemetry.channels, samples, pushed=True))
+
+
+def set_maxpressure(cargo, maxpressure):
+    cargo.maxpressure = maxpressure
+    for sensor in cargo.sens:
+        sensor.set_maxpressure(maxpressure)
+
+
+def set_maxctrout(cargo, maxctrout):
+    cargo.maxctrout = maxctrout
+    for ctr in cargo.controller:
+        ctr.set_maxoutput(maxctrout)
 
 
 def init_connection():
@@ -198,9 +445,10 @@ def init_connection():
     return SOCK
 
 
-def graceful_exit(connection, SOCK):
+def graceful_exit(connections, SOCK):
     """Shutdown"""
     print('Closing Socket ...')
     SOCK.close()
-    print('Closing Connection ...')
-    connection.close()
+    print('Closing Connections ...')
+    for connection in connections:
+        connection.close()
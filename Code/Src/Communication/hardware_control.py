@@ -11,13 +11,14 @@ import __builtin__
 import threading
 import time
 import sys
-import Adafruit_BBIO.GPIO as GPIO
-import Adafruit_BBIO.ADC as ADC
 
 from termcolor import colored
-from Src.Management import reference as ref
+from Src.Hardware.backend import GPIO
+from Src.Hardware.backend import ADC
+from Src.Management.tasks import STATE_TIMEOUT
 
-TSamplingUI = .1
+TSamplingUI = .1    # [sec] period of the potis, buttons wake up at once
+BOUNCETIME = 50     # [ms] debounce of the buttons and switches
 p7_ptrn = 0.0
 
 PWMREFMODE = "P9_23"
@@ -81,6 +82,16 @@ class HUIThread(threading.Thread):
         self.process_time = 0
         self.state = cargo.state
 
+        # set by the callbacks of the buttons, consumed by take_event
+        self.events = dict([(btn, False) for btn in BTNS])
+        self.events_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.switches = {}      # pin: level of the discrete ref switch
+        self.potis = [0]*len(CONTINUOUSPRESSUREREF)     # [%]
+        self.potis_changed = True
+        self.pattern_potis = None   # potis of the last user pattern
+        self.led_levels = {}    # pin: level written last
+
         self.rootLogger.info('Initialize HUI Thread ...')
         ADC.setup()
 
@@ -98,12 +109,13 @@ class HUIThread(threading.Thread):
 
         for pin in DISCRETEPRESSUREREF:
             GPIO.setup(pin, GPIO.IN)
+            self.switches[pin] = bool(GPIO.input(pin))
+            GPIO.add_event_detect(pin, GPIO.BOTH, callback=self.on_switch,
+                                  bouncetime=BOUNCETIME)
 
-        GPIO.add_event_detect(PWMREFMODE, GPIO.RISING)
-        GPIO.add_event_detect(PRESSUREREFMODE, GPIO.RISING)
-        GPIO.add_event_detect(PATTERNREFMODE, GPIO.RISING)
-        GPIO.add_event_detect(WALKINGCONFIRM, GPIO.RISING)
-        GPIO.add_event_detect(INFINITYMODE, GPIO.RISING)
+        for btn in BTNS:
+            GPIO.add_event_detect(btn, GPIO.RISING, callback=self.on_button,
+                                  bouncetime=BOUNCETIME)
 
         self.leds = [PWMLED, PRESSURELED, PATTERNLED,
                      WALKINGCONFIRMLED, INFINITYLED]
@@ -115,6 +127,47 @@ class HUIThread(threading.Thread):
                 GPIO.output(led, GPIO.LOW)
             time.sleep(.05)
 
+    def on_button(self, channel):
+        """ Callback of the buttons, runs in the thread of GPIO """
+        with self.events_lock:
+            self.events[channel] = True
+        self.wake.set()
+
+    def on_switch(self, channel):
+        """ Callback of the discrete ref switches, runs in the thread of
+        GPIO """
+        self.switches[channel] = bool(GPIO.input(channel))
+        self.wake.set()
+
+    def take_event(self, btn):
+        """ Whether *btn* was pushed since the last call
+
+        Args:
+            btn (str): pin of the button
+
+        Returns:
+            (bool): pushed or not
+        """
+        with self.events_lock:
+            pushed = self.events[btn]
+            self.events[btn] = False
+        return pushed
+
+    def sample_potis(self):
+        """ Read every poti once into self.potis and note whether one of
+        them changed
+
+        Returns:
+            (bool): changed or not
+        """
+        potis = []
+        for pin in CONTINUOUSPRESSUREREF:
+            _ = ADC.read(pin)  # bug-> read twice
+            potis.append(int(round(ADC.read(pin)*100)))
+        self.potis_changed = potis != self.potis
+        self.potis = potis
+        return self.potis_changed
+
     def run(self):
         """ run HUI """
         self.rootLogger.info('Running HUI Thread ...')
@@ -123,8 +176,10 @@ class HUIThread(threading.Thread):
         try:
             while self.cargo.state != 'EXIT':
                 try:
+                    self.wake.clear()
+                    self.sample_potis()
                     self.get_tasks()
-                    time.sleep(TSamplingUI)
+                    self.wake.wait(TSamplingUI)
                 except Exception as err:
                     self.rootLogger.exception(excp_str)
                     self.rootLogger.exception(
@@ -145,19 +200,18 @@ class HUIThread(threading.Thread):
             print(state)
 
         for idx, pin in enumerate(DISCRETEPRESSUREREF):
-            print('DValve Ref', idx, ': ', True if GPIO.input(pin) else False)
+            print('DValve Ref', idx, ': ', self.switches[pin])
 
         # check pattern btns
-        if GPIO.event_detected(INFINITYMODE):
+        if self.take_event(INFINITYMODE):
             print('Mode2 btn pushed')
-        if GPIO.event_detected(WALKINGCONFIRM):
+        if self.take_event(WALKINGCONFIRM):
             print('WALKING START btn pushed')
 
         # check adc potis
-        for idx, pin in enumerate(CONTINUOUSPRESSUREREF):
-            val = ADC.read(pin)
-            val = ADC.read(pin)
-            print('POTI Ref', idx, ': ', val)
+        self.sample_potis()
+        for idx, val in enumerate(self.potis):
+            print('POTI Ref', idx, ': ', val/100.)
         time.sleep(1)
 
         print('\n')
@@ -207,23 +261,22 @@ class HUIThread(threading.Thread):
                 self.last_process_time = time.time()
 
     def generate_pattern_ref(self):
-        pattern = self.cargo.wcomm.pattern
+        pattern = self.cargo.wcomm.compiled
         idx = self.ptrn_idx
-        idx = idx+1 if idx<len(pattern)-1 else 0
-        dvtask, pvtask, process_time = ref.generate_walking_ref(pattern, idx)
-        self.cargo.dvalve_task = dvtask
-        self.cargo.ref_task = pvtask
+        idx = idx+1 if idx < len(pattern)-1 else 0
+        self.cargo.dvalve_task.update(pattern.dvalve_tasks[idx])
+        self.cargo.ref_task.update(pattern.ref_tasks[idx])
         self.ptrn_idx = idx
-        return process_time
+        return pattern.durations[idx]
 
 
     def check_state(self):
         new_state = None
-        if GPIO.event_detected(PWMREFMODE):
+        if self.take_event(PWMREFMODE):
             new_state = 'USER_CONTROL'
-        elif GPIO.event_detected(PRESSUREREFMODE):
+        elif self.take_event(PRESSUREREFMODE):
             new_state = 'USER_REFERENCE'
-        elif GPIO.event_detected(PATTERNREFMODE):
+        elif self.take_event(PATTERNREFMODE):
             new_state = 'PATTERN_REF'
 
         change = False
@@ -238,55 +291,65 @@ class HUIThread(threading.Thread):
                     for led in self.leds:
                         GPIO.output(led, GPIO.LOW)
                     time.sleep(.05)
+                self.led_levels.clear()     # s.t. set_leds restores them
         self.state = new_state if change else self.state
         return (self.state, change)
 
+    def set_led(self, pin, on):
+        """ Switch the LED at *pin*, GPIO is only written on a change """
+        level = GPIO.HIGH if on else GPIO.LOW
+        if self.led_levels.get(pin) != level:
+            GPIO.output(pin, level)
+            self.led_levels[pin] = level
+
     def set_leds(self):
         my_state = self.state
         for pin, state in [(PWMLED, "USER_CONTROL"),
                            (PRESSURELED, "USER_REFERENCE"),
                            (PATTERNLED, "PATTERN_REF")]:
-            GPIO.output(pin, GPIO.HIGH if my_state == state else GPIO.LOW)
+            self.set_led(pin, my_state == state)
         if my_state == 'PATTERN_REF':
             for pin, state in [(WALKINGCONFIRMLED, self.cargo.wcomm.is_active),
                                (INFINITYLED, self.mode2)
                                ]:
-                GPIO.output(pin, GPIO.HIGH if state else GPIO.LOW)
+                self.set_led(pin, state)
         elif my_state == "USER_REFERENCE":
-            GPIO.output(INFINITYLED, GPIO.HIGH if self.mode2 else GPIO.LOW)
-            GPIO.output(WALKINGCONFIRMLED, GPIO.HIGH if self.refzero else GPIO.LOW)
+            self.set_led(INFINITYLED, self.mode2)
+            self.set_led(WALKINGCONFIRMLED, self.refzero)
         elif my_state == "USER_CONTROL":
-            GPIO.output(INFINITYLED, GPIO.LOW)
-            GPIO.output(WALKINGCONFIRMLED, GPIO.LOW)
+            self.set_led(INFINITYLED, False)
+            self.set_led(WALKINGCONFIRMLED, False)
         elif my_state == "IMU_CONTROL":
-            GPIO.output(INFINITYLED, GPIO.LOW)
-            GPIO.output(WALKINGCONFIRMLED, GPIO.LOW)
+            self.set_led(INFINITYLED, False)
+            self.set_led(WALKINGCONFIRMLED, False)
 
     def change_state(self, state):
+        """ Hand *state* to the control loop and wait until it arrived """
+        if self.cargo.state == 'EXIT':
+            return
         self.cargo.state = state
-        while not self.cargo.actual_state == state:
-            time.sleep(self.cargo.sampling_time)
+        if not self.cargo.wait_state(state, STATE_TIMEOUT):
+            self.rootLogger.warning(
+                'Control loop did not reach {} within {} sec'.format(
+                    state, STATE_TIMEOUT))
 
     def set_valve(self):
-        for idx, pin in enumerate(CONTINUOUSPRESSUREREF):
-            _ = ADC.read(pin)  # bug-> read twice
-            self.cargo.pwm_task[str(idx)] = round(ADC.read(pin)*100)
+        for idx, val in enumerate(self.potis):
+            self.cargo.pwm_task[str(idx)] = float(val)
 
     def set_ref(self):
-        for idx, pin in enumerate(CONTINUOUSPRESSUREREF):
+        for idx, val in enumerate(self.potis):
             if self.refzero:
                 self.cargo.ref_task[str(idx)] = 0.
             else:
-                _ = ADC.read(pin)
-                self.cargo.ref_task[str(idx)] = round(ADC.read(pin)*100)/100.
+                self.cargo.ref_task[str(idx)] = val/100.
 
     def set_dvalve(self):
         for idx, pin in enumerate(DISCRETEPRESSUREREF):
-            self.cargo.dvalve_task[str(idx)] = (
-                True if GPIO.input(pin) else False)
+            self.cargo.dvalve_task[str(idx)] = self.switches[pin]
 
     def set_walking(self):
-        if GPIO.event_detected(WALKINGCONFIRM):
+        if self.take_event(WALKINGCONFIRM):
             if time.time()-self.lastconfirm > 1:
                 confirm = self.cargo.wcomm.confirm
                 self.cargo.wcomm.confirm = not confirm
@@ -295,7 +358,7 @@ class HUIThread(threading.Thread):
                 self.lastconfirm = time.time()
 
     def set_mode2(self):
-        if GPIO.event_detected(INFINITYMODE):
+        if self.take_event(INFINITYMODE):
             if time.time()-self.lastmode2 > 1:
                 state = self.mode2
                 self.mode2 = not state
@@ -323,7 +386,7 @@ class HUIThread(threading.Thread):
 #        return P, I, D
 
     def set_refzero(self):
-        if GPIO.event_detected(WALKINGCONFIRM):
+        if self.take_event(WALKINGCONFIRM):
             if time.time()-self.lastmode1 > 1:
                 state = self.refzero
                 self.refzero = not state
@@ -339,14 +402,14 @@ class HUIThread(threading.Thread):
         else:
             if not self.cargo.wcomm.user_pattern:
                 self.cargo.wcomm.user_pattern = True
+                self.pattern_potis = None
                 self.rootLogger.info('user_pattern was turned True')
 
     def set_pattern(self):
-        if self.cargo.wcomm.user_pattern:
-            pref = []
-            for idx, pin in enumerate(CONTINUOUSPRESSUREREF):
-                _ = ADC.read(pin)
-                pref.append(round(ADC.read(pin)*100)/100.)
+        # only a new pattern if a poti was turned
+        if self.cargo.wcomm.user_pattern and self.potis != self.pattern_potis:
+            self.pattern_potis = self.potis
+            pref = [val/100. for val in self.potis]
             pref.append(p7_ptrn)
             pattern = generate_pattern(*pref)
             self.cargo.wcomm.pattern = pattern
@@ -354,22 +417,14 @@ class HUIThread(threading.Thread):
 #            self.cargo.wcomm.pattern = self.cargo.wcomm.ptrndic['default']
 
     def all_potis_zero(self):
-        zero = False
-        potis = []
-        for idx, pin in enumerate(CONTINUOUSPRESSUREREF):
-            val = ADC.read(pin)
-            val = ADC.read(pin)
-            potis.append(round(val*100))
-        if sum(potis) == 0:
-            zero = True
-        return zero
+        return sum(self.potis) == 0
 
     def kill(self):
         self.cargo.state = 'EXIT'
 
     def reset_events(self):
         for btn in BTNS:
-            GPIO.event_detected(btn)
+            self.take_event(btn)
 
     def reset_confirmations(self):
         self.refzero = False
@@ -381,17 +436,17 @@ class HUIThread(threading.Thread):
     def print_state(self):
         state_str = ('Current State: \n\n' +
                      'F1 Ref/state: \t\t{}\t{}\n'.format(
-                             True if GPIO.input(DISCRETEPRESSUREREF[0])
-                             else False, self.cargo.dvalve_task['0']) +
+                             self.switches[DISCRETEPRESSUREREF[0]],
+                             self.cargo.dvalve_task['0']) +
                      'F2 Ref/state: \t\t{}\t{}\n'.format(
-                             True if GPIO.input(DISCRETEPRESSUREREF[1])
-                             else False, self.cargo.dvalve_task['1']) +
+                             self.switches[DISCRETEPRESSUREREF[1]],
+                             self.cargo.dvalve_task['1']) +
                      'F3 Ref/state: \t\t{}\t{}\n'.format(
-                             True if GPIO.input(DISCRETEPRESSUREREF[2])
-                             else False, self.cargo.dvalve_task['2']) +
+                             self.switches[DISCRETEPRESSUREREF[2]],
+                             self.cargo.dvalve_task['2']) +
                      'F4 Ref/state: \t\t{}\t{}\n'.format(
-                             True if GPIO.input(DISCRETEPRESSUREREF[3])
-                             else False, self.cargo.dvalve_task['3'])
+                             self.switches[DISCRETEPRESSUREREF[3]],
+                             self.cargo.dvalve_task['3'])
                      )
         for i in range(8):
             s = 'PWM Ref {}: \t\t{}\n'.format(i, self.cargo.pwm_task[str(i)])
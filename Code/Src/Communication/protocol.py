@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Wire protocol between client (main.py) and server.
+
+Every message is sent as one frame:
+
+    ======= = ===============================================
+    | len   = uint32, length of the payload
+    | type  = uint8, how the payload is encoded (see below)
+    | data  = payload
+    ======= = ===============================================
+
+so the receiver always knows where a message ends, no matter how TCP
+fragments or coalesces the stream.
+
+The hot messages of the control loop have a compact fixed schema:
+
+    ============ = ==================================================
+    | MSG_ORDER  = list of commands, e.g. [['update']] or
+    |            = [['set_ref', {'0': .4, ...}], ['set_dvalve', {..}]]
+    | MSG_RECS   = list of recorders, i.e. the answer to 'update'
+    | MSG_SAMPLES= a batch of telemetry (Samples), pushed to subscribers
+    ============ = ==================================================
+
+A dict of floats is packed as the id of its schema (the sorted keys)
+followed by the values as float32. The first time a schema is used, it is
+announced by a MSG_SCHEMA frame. Since the schema is defined by the keys,
+None is sent as nan and comes back as None. Telemetry samples are sent as
+float64, since they carry the time stamps.
+
+Everything else, e.g. the meta information, is sent as json (MSG_JSON).
+Nothing received is ever unpickled, so a client (read only or not) can only
+send data, never code. Strings come back as str, tuples as lists. A frame
+which announces more than MAX_FRAME bytes is rejected by its header, before
+anything of its payload is buffered.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+
+HEADER = struct.Struct('!IB')
+MSG_JSON, MSG_ORDER, MSG_RECS, MSG_SCHEMA, MSG_SAMPLES = range(5)
+
+# commands with a compact encoding: name -> has a dict as argument
+COMMANDS = ['update', 'set_valve', 'set_ref', 'set_dvalve']
+HAS_ARG = [False, True, True, True]
+COMMAND_ID = dict([(name, idx) for idx, name in enumerate(COMMANDS)])
+MAX_SCHEMAS = 256
+MAX_FRAME = 2**20       # [bytes] largest payload accepted by Decoder.feed
+NAN = float('nan')
+
+_NUMBER = (float, int, long, bool)
+_UINT8 = struct.Struct('!B')
+_SAMPLES_HEADER = struct.Struct('!QI?')    # cursor, number, pushed
+
+
+def _to_json(obj):
+    """ numpy scalars and arrays, which json does not know """
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError('{!r} is not JSON serializable'.format(obj))
+
+
+def _from_json(obj):
+    """ unicode -> str, s.t. names compare and hash as before """
+    if isinstance(obj, unicode):
+        return obj.encode('utf-8')
+    if isinstance(obj, list):
+        return [_from_json(item) for item in obj]
+    if isinstance(obj, dict):
+        return dict([(_from_json(k), _from_json(v))
+                     for k, v in obj.items()])
+    return obj
+
+
+class Samples(object):
+    """ A batch of telemetry, see telemetry.TelemetryRing.read """
+    def __init__(self, cursor, channels, samples, pushed=False):
+        """
+        Args:
+            cursor (int): cursor for the next read
+            channels (list of str): names of the channels
+            samples (numpy.ndarray): one row [time, channels...] per sample
+            pushed (bool): sent unasked to a subscriber, i.e. no answer
+        """
+        self.cursor = cursor
+        self.channels = channels
+        self.samples = samples
+        self.pushed = pushed
+
+
+class NoFastPath(Exception):
+    """ The message does not fit a compact schema """
+    pass
+
+
+class Encoder(object):
+    """ Encodes messages into frames. One per direction of a connection """
+    def __init__(self):
+        self.schemas = {}       # sorted keys: (schema id, struct)
+        self.pending = []       # frames announcing new schemas
+
+    def _pack_dict(self, dic):
+        keys = sorted(dic)
+        values = []
+        for k in keys:
+            value = dic[k]
+            if value is None:
+                values.append(NAN)
+            elif isinstance(value, _NUMBER):
+                values.append(value)
+            else:
+                raise NoFastPath
+        sid, fmt = self._schema(keys)
+        return sid + fmt.pack(*values)
+
+    def _schema(self, keys):
+        key = tuple(keys)
+        schema = self.schemas.get(key)
+        if schema is None:
+            if (len(self.schemas) >= MAX_SCHEMAS or
+                    not all([isinstance(k, str) for k in keys])):
+                raise NoFastPath
+            sid = _UINT8.pack(len(self.schemas))
+            schema = (sid, struct.Struct('!{}f'.format(len(keys))))
+            self.schemas[key] = schema
+            self.pending.append(frame(MSG_SCHEMA, sid + '\0'.join(keys)))
+        return schema
+
+    def _pack_samples(self, data):
+        sid = self._schema(data.channels)[0]
+        samples = np.asarray(data.samples, dtype='>f8')
+        return (sid + _SAMPLES_HEADER.pack(data.cursor, len(samples),
+                                           data.pushed) +
+                samples.tostring())
+
+    def _pack_order(self, order):
+        parts = [_UINT8.pack(len(order))]
+        for command in order:
+            if (not isinstance(command, list) or not command or
+                    not isinstance(command[0], str)):
+                raise NoFastPath
+            cid = COMMAND_ID.get(command[0])
+            if cid is None or len(command) != 1 + HAS_ARG[cid]:
+                raise NoFastPath
+            parts.append(_UINT8.pack(cid))
+            if HAS_ARG[cid]:
+                if not isinstance(command[1], dict):
+                    raise NoFastPath
+                parts.append(self._pack_dict(command[1]))
+        return ''.join(parts)
+
+    def _pack_recs(self, recs):
+        parts = [_UINT8.pack(len(recs))]
+        for rec in recs:
+            parts.append(self._pack_dict(rec))
+        return ''.join(parts)
+
+    def encode(self, data):
+        """
+        Args:
+            data: the message
+
+        Returns:
+            (str): the frame(s) to send
+        """
+        msg_type, payload = MSG_JSON, None
+        if isinstance(data, Samples):
+            # the channels are fixed, i.e. this only fails for non-str names
+            payload = self._pack_samples(data)
+            msg_type = MSG_SAMPLES
+        elif isinstance(data, list) and 0 < len(data) < 256:
+            try:
+                if isinstance(data[0], list):
+                    payload = self._pack_order(data)
+                    msg_type = MSG_ORDER
+                elif isinstance(data[0], dict):
+                    payload = self._pack_recs(data)
+                    msg_type = MSG_RECS
+            except NoFastPath:
+                msg_type, payload = MSG_JSON, None
+        if payload is None:
+            payload = json.dumps(data, default=_to_json)
+        frames = self.pending + [frame(msg_type, payload)]
+        self.pending = []
+        return ''.join(frames)
+
+
+class Decoder(object):
+    """ Decodes frames. One per direction of a connection """
+    def __init__(self, max_frame=MAX_FRAME):
+        """
+        *Initialize with:*
+
+        Args:
+            max_frame (int): [bytes] largest payload accepted by feed
+        """
+        self.schemas = {}       # schema id: (keys, struct)
+        self.max_frame = max_frame
+        self.buffer = bytearray()   # the beginning of the next frame
+
+    def _unpack_dict(self, payload, pos):
+        keys, fmt = self.schemas[_UINT8.unpack_from(payload, pos)[0]]
+        values = fmt.unpack_from(payload, pos+1)
+        # nan != nan
+        dic = dict([(k, v if v == v else None)
+                    for k, v in zip(keys, values)])
+        return dic, pos + 1 + fmt.size
+
+    def decode(self, msg_type, payload):
+        """
+        Args:
+            msg_type (int): type of the frame
+            payload (str): data of the frame
+
+        Returns:
+            (tuple): (True, message) or (False, None) if the frame was no
+                message but a schema announcement
+        """
+        if msg_type == MSG_JSON:
+            return True, _from_json(json.loads(payload))
+        if msg_type == MSG_SCHEMA:
+            sid = _UINT8.unpack_from(payload)[0]
+            keys = payload[1:].split('\0') if len(payload) > 1 else []
+            fmt = struct.Struct('!{}f'.format(len(keys)))
+            self.schemas[sid] = (keys, fmt)
+            return False, None
+        if msg_type == MSG_SAMPLES:
+            keys = self.schemas[_UINT8.unpack_from(payload)[0]][0]
+            cursor, rows, pushed = _SAMPLES_HEADER.unpack_from(payload, 1)
+            samples = np.frombuffer(payload, '>f8', rows*(1+len(keys)),
+                                    1+_SAMPLES_HEADER.size)
+            samples = samples.reshape(rows, 1+len(keys)).astype(float)
+            return True, Samples(cursor, keys, samples, pushed)
+        count = _UINT8.unpack_from(payload)[0]
+        pos = 1
+        data = []
+        if msg_type == MSG_ORDER:
+            for _ in range(count):
+                cid = _UINT8.unpack_from(payload, pos)[0]
+                pos += 1
+                command = [COMMANDS[cid]]
+                if HAS_ARG[cid]:
+                    dic, pos = self._unpack_dict(payload, pos)
+                    command.append(dic)
+                data.append(command)
+        elif msg_type == MSG_RECS:
+            for _ in range(count):
+                dic, pos = self._unpack_dict(payload, pos)
+                data.append(dic)
+        else:
+            raise IOError('unknown message type {}'.format(msg_type))
+        return True, data
+
+    def feed(self, data):
+        """
+        Decode all frames which are complete with the next chunk of the
+        stream. The rest is kept in self.buffer until the next call.
+
+        Args:
+            data (str): data received from the stream
+
+        Returns:
+            (list): the decoded messages
+        """
+        frames = self.buffer
+        frames.extend(data)
+        messages = []
+        pos = 0
+        while len(frames) - pos >= HEADER.size:
+            length, msg_type = HEADER.unpack_from(frames, pos)
+            if length > self.max_frame:
+                raise IOError('frame of {} bytes exceeds {} bytes'.format(
+                    length, self.max_frame))
+            end = pos + HEADER.size + length
+            if end > len(frames):
+                break
+            is_msg, msg = self.decode(msg_type,
+                                      str(frames[pos+HEADER.size:end]))
+            if is_msg:
+                messages.append(msg)
+            pos = end
+        del frames[:pos]
+        return messages
+
+
+def frame(msg_type, payload):
+    """ Prefix the payload with the header """
+    return HEADER.pack(len(payload), msg_type) + payload
+
+
+class Connection(object):
+    """ A socket which sends and receives whole messages """
+    def __init__(self, sock):
+        """
+        Args:
+            sock (socket.socket): connected socket
+        """
+        self.sock = sock
+        self.encoder = Encoder()
+        self.decoder = Decoder()
+
+    def _recv_exactly(self, length):
+        chunks = []
+        while length > 0:
+            chunk = self.sock.recv(min(length, 65536))
+            if not chunk:
+                raise EOFError('connection closed by peer')
+            chunks.append(chunk)
+            length -= len(chunk)
+        return ''.join(chunks)
+
+    def send(self, data):
+        """ Send one message """
+        self.sock.sendall(self.encoder.encode(data))
+
+    def recv(self):
+        """ Block until one message has been received and return it """
+        while True:
+            length, msg_type = HEADER.unpack(self._recv_exactly(HEADER.size))
+            is_msg, data = self.decoder.decode(msg_type,
+                                               self._recv_exactly(length))
+            if is_msg:
+                return data
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
@@ -27,6 +27,7 @@ import traceback
 from termcolor import colored
 from Src.Communication import pickler
 from Src.Controller import controller as ctrlib
+from Src.Management.tasks import STATE_TIMEOUT
 
 
 def print(*args, **kwargs):
@@ -107,8 +108,9 @@ class WebserverThread(threading.Thread):
                         print('recieved task to change state to:', new_state)
                 if new_state:
                     self.cargo.state = new_state
-                    while not self.cargo.actual_state == new_state:
-                        time.sleep(self.cargo.sampling_time)
+                    if not self.cargo.wait_state(new_state, STATE_TIMEOUT):
+                        print('state', new_state, 'not reached within',
+                              STATE_TIMEOUT, 'sec')
                 self.send_back(new_state)
 
             if 'set_valve' in data_in:
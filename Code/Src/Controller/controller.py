@@ -166,6 +166,155 @@ class PidController(Controller):
         return self.last_out
 
 
+class PidBank(object):
+    """
+    A bank of PidControllers, which computes the outputs of all channels in
+    one vectorised step. The states and gains of all channels are held in
+    numpy arrays.
+
+    Indexing and iterating the bank gives a PidChannel for each channel,
+    which behaves like a PidController. So the bank can be used as drop-in
+    for a list of PidControllers.
+    """
+    def __init__(self, gains, tsampling, max_output):
+        """
+        Args:
+            gains (list): gains of each channel, i.e. [[Kp, Ti, Td], ...]
+            tsampling (float): sampling time of the controller
+            max_output (float): saturation of output
+
+        Example:
+            >>> bank = PidBank([[10, 1.2, .4], [5, 1., .1]], .001, 100)
+            >>> out = bank.output([1., 2.], [0., 0.])
+            >>> bank[1].set_gain([1., 1., 0.])
+            >>> [c.Kp for c in bank]
+            [10.0, 1.0]
+        """
+        gains = np.array(gains, dtype=float)
+        n_channels = len(gains)
+        self.Kp = gains[:, 0].copy()
+        self.Ti = gains[:, 1].copy()
+        self.Td = gains[:, 2].copy()
+        self.max_output = np.full(n_channels, float(max_output))
+        self.integral = np.zeros(n_channels)
+        self.last_err = np.zeros(n_channels)
+        self.last_out = np.zeros(n_channels)
+        self.windup_guard = np.zeros(n_channels)
+        self.gam = .1   # pole for stability. Typically = .1
+        self.tsampling = tsampling
+        self._update_coefficients()
+        self.channels = [PidChannel(self, idx) for idx in range(n_channels)]
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __getitem__(self, idx):
+        return self.channels[idx]
+
+    def __iter__(self):
+        return iter(self.channels)
+
+    def _update_coefficients(self):
+        half_ts = self.tsampling/2
+        self.k_out = (self.gam*self.Td - half_ts)/(self.gam*self.Td + half_ts)
+        self.k_diff = self.Td/(self.gam + half_ts)
+        self.k_int = self.tsampling/(2*self.Ti)
+
+    def set_gain(self, idx, gain):
+        """ Set the gain [Kp, Ti, Td] of channel *idx* and reset its state """
+        self.Kp[idx] = gain[0]
+        self.Ti[idx] = gain[1]
+        self.Td[idx] = gain[2]
+        self._update_coefficients()
+        self.reset_state(idx)
+
+    def set_maxoutput(self, maxoutput, idx=slice(None)):
+        self.max_output[idx] = maxoutput
+
+    def reset_state(self, idx=slice(None)):
+        self.integral[idx] = 0.
+        self.last_err[idx] = 0.
+        self.windup_guard[idx] = 0.
+        self.last_out[idx] = 0.
+
+    def output(self, reference, system_output):
+        """
+        Same as PidController.output, but for all channels at once.
+
+        Args:
+            reference (array_like): where the systems should be
+            system_output (array_like): where the systems actually are
+
+        Returns:
+            (numpy.ndarray): controller_output of each channel
+        """
+        err = np.subtract(reference, system_output, dtype=float)
+        diff = self.k_out*self.last_out + self.k_diff*(err-self.last_err)
+        self.last_err = err
+        integ = self.integral + self.k_int*(err-self.windup_guard)
+        np.clip(integ, -self.max_output, self.max_output, out=integ)
+        self.integral = integ
+
+        controller_output = self.Kp*(err + integ + diff)
+
+        self.last_out = np.clip(controller_output, -self.max_output,
+                                self.max_output)
+        self.windup_guard = controller_output - self.last_out
+        return self.last_out
+
+
+def _bank_property(name):
+    def fget(self):
+        return float(getattr(self.bank, name)[self.idx])
+
+    def fset(self, value):
+        getattr(self.bank, name)[self.idx] = value
+    return property(fget, fset)
+
+
+class PidChannel(PidController):
+    """
+    One channel of a PidBank. Behaves like a PidController, but its state
+    lives in the bank.
+    """
+    Kp = _bank_property('Kp')
+    Ti = _bank_property('Ti')
+    Td = _bank_property('Td')
+    max_output = _bank_property('max_output')
+    integral = _bank_property('integral')
+    last_err = _bank_property('last_err')
+    last_out = _bank_property('last_out')
+    windup_guard = _bank_property('windup_guard')
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, bank, idx):
+        """
+        Args:
+            bank (PidBank): the bank this channel belongs to
+            idx (int): index of the channel in the bank
+        """
+        self.bank = bank
+        self.idx = idx
+        self.initial_cable_length = None
+
+    @property
+    def gam(self):
+        return self.bank.gam
+
+    @property
+    def tsampling(self):
+        return self.bank.tsampling
+
+    def set_maxoutput(self, maxoutput):
+        self.bank.set_maxoutput(maxoutput, self.idx)
+
+    def reset_state(self):
+        self.bank.reset_state(self.idx)
+
+    def set_gain(self, gain):
+        self.bank.set_gain(self.idx, gain)
+
+
 class PidController_WindUp(Controller):
     """
     A simple PID controller
@@ -11,8 +11,12 @@ https://stackoverflow.com/questions/323972/is-there-any-way-to-kill-a-thread-in-
 import threading
 import time
 
+from Src.Hardware import backend
+from Src.Hardware import sensors
 from Src.Management import timeout
 from Src.Management import exception
+from Src.Management import reference
+from Src.Management import scheduler
 from Src.Management import state_machine
 from Src.Controller import controller as ctrlib
 
@@ -25,13 +29,16 @@ class SimpleWalkingCommander(object):
     def __init__(self, cargo):
         """ Minimal Walking Commander """
         self.cargo = cargo
-
+        # columns of the valves in a pattern
+        self.valve_idx = [int(valve.name) for valve in cargo.valve]
+        self.dvalve_idx = [int(dvalve.name) for dvalve in cargo.dvalve]
 
     def process_pattern(self, pattern):
         """ Play the given pattern only once.
 
             Args:
-                pattern(list): A list of lists of references
+                pattern(list or reference.CompiledPattern): A list of lists
+                    of references
 
             Example:
                 WCommander.process_pattern([[ref11, ref12, ..., ref1N, tmin1],
@@ -39,48 +46,48 @@ class SimpleWalkingCommander(object):
                                             ...
                                             [refM1, refM2, ..., refMN, tminM]])
         """
-        n_valves = len(self.cargo.valve)
-        n_dvalves = len(pattern[0]) - 1 - n_valves
-
-        for pos in pattern:
-            # read the refs
-            local_min_process_time = pos[-1]
-            ppos = pos[:n_valves]
-            dpos = pos[-n_dvalves-1:-1]
-
+        cargo = self.cargo
+        if not isinstance(pattern, reference.CompiledPattern):
+            pattern = reference.CompiledPattern(
+                pattern, len(pattern[0]) - 1 - len(cargo.valve))
+        refs = pattern.phase_refs(self.valve_idx)
+        dvalves = zip(cargo.dvalve, self.dvalve_idx)
+        rec, rec_r, rec_u = cargo.rec, cargo.rec_r, cargo.rec_u
+
+        tstart = time.time()
+        for idx in range(len(pattern)):
             # set d valves
-            for dvalve in self.cargo.dvalve:
-                state = dpos[int(dvalve.name)]
-                dvalve.set_state(state)
-            
-            # hold the thing for local_min_process_time
-            tstart = time.time()
-            while time.time() - tstart < local_min_process_time:
+            mask = pattern.dmasks[idx]
+            for dvalve, jdx in dvalves:
+                dvalve.set_state(bool(mask >> jdx & 1))
+
+            channels = zip(cargo.valve, cargo.controller, refs[idx],
+                           [cargo.r_key[valve.name] for valve in cargo.valve],
+                           [cargo.u_key[valve.name] for valve in cargo.valve])
+            # hold the thing until the end of the phase
+            tend = tstart + pattern.ends[idx]
+            while time.time() < tend:
                 # read
-                for sensor in self.cargo.sens:
-                    self.cargo.rec[sensor.name] = sensor.get_value()
-    
+                for sensor in cargo.sens:
+                    rec[sensor.name] = sensor.get_value()
+
                 # write
-                for valve, controller in zip(self.cargo.valve, self.cargo.controller):
-                    ref = ppos[int(valve.name)]
-                    sys_out = self.cargo.rec[valve.name]
-                    ctr_out = controller.output(ref, sys_out)
+                for valve, controller, ref, r_key, u_key in channels:
+                    ctr_out = controller.output(ref, rec[valve.name])
                     valve.set_pwm(ctrlib.sys_input(ctr_out))
-                    self.cargo.rec_r['r{}'.format(valve.name)] = ref
-                    self.cargo.rec_u['u{}'.format(valve.name)] = ctr_out
+                    rec_r[r_key] = ref
+                    rec_u[u_key] = ctr_out
                 # meta
-                time.sleep(self.cargo.sampling_time)
-
-
-
-
-
+                cargo.telemetry.record()
+                cargo.tasks.run_pending()
+                time.sleep(cargo.sampling_time)
 
 
 class Walking_Commander(object):
     def __init__(self, cargo):
-        """ This class controls all extremities. It starts as many threads
-        as poroprtional valves exists and communicate with those threads.
+        """ This class controls all extremities. It runs an automaton for
+        every proportional valve, all of them on one thread (ValveExecutor),
+        and communicates with those automata.
         This class should provide a handsome interface to track references.
 
             Args:
@@ -89,31 +96,32 @@ class Walking_Commander(object):
 
         self.timeout = 10    # [sec] until Exceptions is raised (must be int)
         self.minimum_process_time = 1.0  # [sec] until next pose is set
-        self.pthreads = []
+        self.pvalves = []
         self.status = [None]*len(cargo.valve)
         self.cargo = cargo
-        self._init_threads()
+        self._init_valves()
 
-    def _init_threads(self):
-        """ initialize the PThreads """
+    def _init_valves(self):
+        """ initialize the automata of the valves and their executor """
         for v, s, c, i in zip(self.cargo.valve, self.cargo.sens,
                               self.cargo.controller,
                               range(len(self.cargo.valve))):
-            self.pthreads.append(Thread_ProportinalValve(
+            self.pvalves.append(ProportionalValve(
                 v, s, c, i, self.status, self.cargo.rec, self.cargo.rec_r,
-                self.cargo.rec_u, self.cargo.sampling_time))
+                self.cargo.rec_u))
+        self.executor = ValveExecutor(self.pvalves, self.cargo.sampling_time)
 
     def _set_pos(self, pos):
-        """ Interface self.pthreads. Send the references for extremities
-        to the Proportional Threads.
+        """ Interface self.pvalves. Send the references for extremities
+        to the automata of the proportional valves.
 
             Args:
                 pos(list): references for all extremities
 
             Example:
                 WalkingCommander._set_pos([ref1, ref2, ..., refN]) """
-        for p, thread in zip(pos, self.pthreads):
-            thread.set_ref(p)
+        for p, pvalve in zip(pos, self.pvalves):
+            pvalve.set_ref(p)
 
     def _set_dpos(self, dpos):
         """ Interface discrete valve.
@@ -153,44 +161,84 @@ class Walking_Commander(object):
                 continue
 
     def run_threads(self):
-        """ Run all PThreads """
-        for thread in self.pthreads:
-            thread.start()
+        """ Run the executor of the valves """
+        self.executor.start()
 
     def clean(self):
-        """ Close all PThreads """
+        """ Bring all valves down and stop the executor """
         try:
-            self._set_pos([0.]*len(self.pthreads))
+            self._set_pos([0.]*len(self.pvalves))
             self._wait()
         except exception.TimeoutError:
-            print "TimeOut while cleaning Pthreads... Shut down anyway"
+            print "TimeOut while cleaning the valves... Shut down anyway"
         finally:
-            for thread in self.pthreads:
-                thread.stop()
-                thread.join()
+            for pvalve in self.pvalves:
+                pvalve.stop()
+            self.executor.join()
 
     def _wait(self):
-        """ waiting until all PThreads have reached the desired reference """
+        """ waiting until all valves have reached the desired reference """
         with timeout.timeout(self.timeout, 'PThreads TimeOut'):
             while 'PROCESS' in self.status:
                 time.sleep(self.cargo.sampling_time)
 
 
-class Thread_ProportinalValve(threading.Thread):
+class ValveExecutor(threading.Thread):
+    def __init__(self, pvalves, sampling_time, bank=None,
+                 clock=backend.monotonic, sleep=backend.sleep):
+        """ Runs the automata of several proportional valves on one thread.
+        Every tick, all sensors are read in one sweep of the bus, then every
+        automaton does one step.
+
+            Args:
+                pvalves(list of ProportionalValve): the valves to control
+                sampling_time(float): [sec] period of the ticks
+                bank(sensors.DPressureSensBank): reads the sensors of the
+                    valves, in the same order. Default: a bank of them
+                clock(callable): monotonic time source in sec
+                sleep(callable): function to sleep for a given time in sec
+        """
+        super(ValveExecutor, self).__init__()
+        self.pvalves = pvalves
+        self.bank = bank or sensors.DPressureSensBank(
+            [pvalve.sensor for pvalve in pvalves])
+        self.loop = scheduler.LoopScheduler(sampling_time, clock=clock,
+                                            sleep=sleep)
+
+    def run(self):
+        """ Step all automata until every one reached EXIT """
+        for pvalve in self.pvalves:
+            pvalve.automat.start(cargo=None)
+        self.loop.start('VALVES')
+        self._sweep()
+        state_machine.run_machines(
+            [pvalve.automat for pvalve in self.pvalves], self._next_tick)
+
+    def _next_tick(self):
+        self.loop.wait()
+        self._sweep()
+
+    def _sweep(self):
+        for pvalve, pressure in zip(self.pvalves, self.bank.sweep()):
+            pvalve.sys_out = pressure
+
+
+class ProportionalValve(object):
     def __init__(self, valve, sensor, controller, ident, status, rec, rec_r,
-                 rec_u, sampling_time):
+                 rec_u):
         """ This class provide the autonomous ability to act for every muscle
         of the soft robot.
-        You can set a reference and the Thread will bring the muscle to it
+        You can set a reference and the automaton will bring the muscle to it
         and stay there until you set another one.
-        Furthermore this Thread has a kind of stop_button. Everybody can push
-        it and cancel the Thread this way.
+        Furthermore it has a kind of stop_button. Everybody can push it and
+        bring the automaton to EXIT this way.
 
-        Thread class with a stop() method. The thread itself has to check
-        regularly for the stopped() condition.
+        The automaton does one tick per step, with the pressure in *sys_out*
+        read before by its executor (ValveExecutor or
+        Thread_ProportinalValve).
 
             Args:
-                valve(Actuators.ProportionalValve): valve this Thread
+                valve(Actuators.ProportionalValve): valve this automaton
                     should control
                 sensor(Sensor.PressureSensor): sensor which belongs to valve
                 controller(Controller.Controller): plug in what you like
@@ -198,15 +246,14 @@ class Thread_ProportinalValve(threading.Thread):
                 status(list): list of status for the WalkingCommander himself
                 rec(dict): The Recorder of the server
         """
-
-        super(Thread_ProportinalValve, self).__init__()
         self.valve = valve
         self.sensor = sensor
         self.controller = controller
         self.rec = rec
         self.rec_r = rec_r
         self.rec_u = rec_u
-        self.sampling_time = sampling_time
+        self.r_key = 'r{}'.format(valve.name)
+        self.u_key = 'u{}'.format(valve.name)
         self._stop_event = threading.Event()
         self.status = status
         self.id = ident
@@ -215,16 +262,19 @@ class Thread_ProportinalValve(threading.Thread):
         self.ref = 0.0
         self.ref_old = 0.0
         self.tol = TOL
+        self.sys_out = 0.0
         self.automat = state_machine.StateMachine()
-        self.automat.add_state('HOLD', self._hold)
-        self.automat.add_state('PROCESS', self._process)
-        self.automat.add_state('EXIT', None, end_state=True)
+        self.automat.add_state('HOLD', self._hold, on_enter=self._enter_hold)
+        self.automat.add_state('PROCESS', self._process,
+                               on_enter=self._enter_process)
+        self.automat.add_state('EXIT', None, end_state=True,
+                               on_enter=self._clean)
         self.automat.set_start('HOLD')
 
     def stop(self):
-        """ Push this button to bring the Thread down in the near future """
+        """ Push this button to bring the automaton down in the near future """
         self._stop_event.set()
-        print 'PThread', self.id, 'stopped', self.stopped()
+        print 'PValve', self.id, 'stopped', self.stopped()
 
     def stopped(self):
         """ In case somebody is interested if stop-button was pushed """
@@ -235,71 +285,89 @@ class Thread_ProportinalValve(threading.Thread):
         self.ref_old = self.ref
         self.ref = ref
 
-    def run(self):
-        """ Start the StateMachine and call clean() after """
-        self.status[self.id] = 'running'
-        self.automat.run(cargo=None)
-        self._clean()
-
-    def _hold(self, cargo):
-        """ Hold the reference as long as WalkingCommander set a new one"""
-
-        # print 'PThread', self.id, 'hold ref:', self.ref
+    def _control(self):
+        self.rec[self.sensor.name] = self.sys_out
+        ctr_out = self.controller.output(self.ref, self.sys_out)
+        self.valve.set_pwm(ctrlib.sys_input(ctr_out))
+        self.rec_r[self.r_key] = self.ref
+        self.rec_u[self.u_key] = ctr_out
 
+    def _enter_hold(self, cargo):
         self.status[self.id] = 'HOLD'
-        while self.ref == self.ref_old and not self.stopped():
-            sys_out = self.sensor.get_value()
-            self.rec[self.sensor.name] = sys_out
-            ctr_out = self.controller.output(self.ref, sys_out)
-            sys_in = ctrlib.sys_input(ctr_out)
-            self.valve.set_pwm(sys_in)
-            self.rec_r['r{}'.format(self.valve.name)] = self.ref
-            self.rec_u['u{}'.format(self.valve.name)] = ctr_out
-            time.sleep(self.sampling_time)
 
+    def _hold(self, cargo):
+        """ Hold the reference as long as WalkingCommander set a new one"""
         if self.stopped():
-            new_state = 'EXIT'
-        else:
-            new_state = 'PROCESS'
+            return ('EXIT', cargo)
+        self._control()
+        if self.ref != self.ref_old:
+            return ('PROCESS', cargo)
+        return ('HOLD', cargo)
 
-        # print 'PThread', self.id, 'goes to:', new_state
-        return (new_state, cargo)
+    def _enter_process(self, cargo):
+        self.ref_old = self.ref
+        self.status[self.id] = 'PROCESS'
 
     def _process(self, cargo):
         """ Bring the muscle to the disered Reference and if reached go
         back to HOLD """
-        # print 'PThread', self.id, 'process to new ref:', self.ref
-        self.ref_old = self.ref
-        self.status[self.id] = 'PROCESS'
-        sys_out = self.sensor.get_value()
-
-        while not isclose(sys_out, self.ref, tol=self.tol) and \
-                not self.stopped() and self.ref == self.ref_old:
-            sys_out = self.sensor.get_value()
-            self.rec[self.sensor.name] = sys_out
-            ctr_out = self.controller.output(self.ref, sys_out)
-            sys_in = ctrlib.sys_input(ctr_out)
-            self.valve.set_pwm(sys_in)
-            self.rec_r['r{}'.format(self.valve.name)] = self.ref
-            self.rec_u['u{}'.format(self.valve.name)] = ctr_out
-            time.sleep(self.sampling_time)
-
         if self.stopped():
-            new_state = 'EXIT'
-        elif self.ref != self.ref_old:
-            new_state = 'PROCESS'
-        else:
-            new_state = 'HOLD'
-
-#        print 'PThread', self.id, 'goes to:', new_state
-        return (new_state, cargo)
-
-    def _clean(self):
-        """ clean everything before closing the thread """
+            return ('EXIT', cargo)
+        if self.ref != self.ref_old:    # a new reference meanwhile
+            self.ref_old = self.ref
+        if isclose(self.sys_out, self.ref, tol=self.tol):
+            return ('HOLD', cargo)
+        self._control()
+        return ('PROCESS', cargo)
+
+    def _clean(self, cargo):
+        """ clean everything before closing """
         self.status[self.id] = 'cleaning'
         self.valve.set_pwm(0)
 
 
+class Thread_ProportinalValve(threading.Thread):
+    def __init__(self, valve, sensor, controller, ident, status, rec, rec_r,
+                 rec_u, sampling_time, sleep=time.sleep):
+        """ A ProportionalValve on a thread of its own, which reads its sensor
+        and sleeps *sampling_time* every tick. Walking_Commander runs all
+        valves in one ValveExecutor instead, see benchmark.py valves.
+
+            Args:
+                sampling_time(float): [sec] sleep after every tick
+                sleep(callable): function to sleep for a given time in sec
+
+        for the others see ProportionalValve
+        """
+        super(Thread_ProportinalValve, self).__init__()
+        self.pvalve = ProportionalValve(valve, sensor, controller, ident,
+                                        status, rec, rec_r, rec_u)
+        self.status = status
+        self.id = ident
+        self.sampling_time = sampling_time
+        self.sleep = sleep
+
+    def stop(self):
+        self.pvalve.stop()
+
+    def stopped(self):
+        return self.pvalve.stopped()
+
+    def set_ref(self, ref):
+        self.pvalve.set_ref(ref)
+
+    def run(self):
+        """ Run the automaton until it reached EXIT """
+        self.status[self.id] = 'running'
+        automat = self.pvalve.automat
+        automat.start(cargo=None)
+        while True:
+            self.pvalve.sys_out = self.pvalve.sensor.get_value()
+            if not automat.step():
+                break
+            self.sleep(self.sampling_time)
+
+
 def isclose(a, b, rel_tol=1e-09, tol=0.0):
     """ Use to compare if two floats are close to each other. From:
     https://stackoverflow.com/questions/5595425/what-is-the-best-way-to-compare-floats-for-almost-equality-in-python
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Sample the sensor banks on their own threads, concurrently to the control
+loop.
+
+Every bank (e.g. the DPressureSensBank and the IMUBank, which hang on
+different multiplexers) is swept back to back by a Sampler thread. A sweep
+is written to the back slot of a DoubleBuffer, which is then swapped with
+the front slot. The control loop copies the front slot, i.e. the latest
+complete sweep, and never waits for the bus. So the controller computes
+while the next sweep is on the bus, and pressure and IMU sweeps overlap.
+
+Example:
+    >>> import numpy as np
+    >>> class Bank(object):
+    ...     names = ['0', '1']
+    ...     failed = []
+    ...     def sweep(self):
+    ...         return np.array([1., 2.])
+    >>> sampler = Sampler('pressure', Bank())
+    >>> sampler.start()
+    >>> sampler.wait_first()
+    True
+    >>> out = np.zeros(2)
+    >>> seq, timestamp, failed = sampler.read(out)
+    >>> out.tolist()
+    [1.0, 2.0]
+    >>> sampler.stop()
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from Src.Management import clock as clk
+from Src.Management import latency
+
+
+class DoubleBuffer(object):
+    """ Two preallocated slots. One writer fills the back slot and swaps,
+    readers copy the front slot. """
+    def __init__(self, shape, dtype=float):
+        self._slots = [np.zeros(shape, dtype), np.zeros(shape, dtype)]
+        self._meta = [(0, None, ()), (0, None, ())]
+        self._front = 0
+        self.lock = threading.Lock()
+
+    @property
+    def seq(self):
+        """ Number of the latest published sweep, 0 if none """
+        return self._meta[self._front][0]
+
+    def write(self, values, timestamp, failed=()):
+        """
+        Publish a complete sweep. Only one thread may write.
+
+        Args:
+            values (numpy.ndarray): the sweep
+            timestamp (float): time at the start of the sweep
+            failed (list of str): names of the sensors which did not answer
+        """
+        back = 1 - self._front
+        np.copyto(self._slots[back], values)
+        self._meta[back] = (self.seq + 1, timestamp, tuple(failed))
+        with self.lock:
+            self._front = back
+
+    def read(self, out):
+        """
+        Copy the latest sweep to *out*.
+
+        Args:
+            out (numpy.ndarray): destination, same shape as the slots
+
+        Returns:
+            (int): sequence number of the sweep
+            (float): its timestamp
+            (tuple): names of the sensors which did not answer
+        """
+        with self.lock:
+            np.copyto(out, self._slots[self._front])
+            return self._meta[self._front]
+
+
+class Sampler(threading.Thread):
+    def __init__(self, name, bank, period=0., clock=clk.monotonic,
+                 sleep=time.sleep):
+        """
+        Sweep *bank* on a daemon thread, at most every *period* seconds.
+
+        Exceptions of the sweep (other than not answering sensors, which are
+        handled by the bank) stop the thread and are raised in the thread
+        which calls read().
+
+        *Initialize with:*
+
+        Args:
+            name (str): name of the thread
+            bank: has *sweep()*, returning a numpy.ndarray of fixed shape,
+                and *failed*, the sensors that failed in the last sweep
+                (e.g. sensors.DPressureSensBank)
+            period (float): minimal time between two sweeps in sec. The
+                thread sleeps for the rest of the period.
+            clock (callable): time source of the timestamps and the period
+            sleep (callable): function to sleep for a given time in sec, of
+                the same time base as *clock*, e.g. backend.sleep
+        """
+        threading.Thread.__init__(self, name=name)
+        self.daemon = True
+        self.bank = bank
+        self.period = period
+        self.clock = clock
+        self.sleep = sleep
+        self.buffer = DoubleBuffer(np.shape(bank.sweep()))
+        self.duration = latency.Histogram()     # of a sweep in ns
+        self.exc_info = None
+        self._halt = threading.Event()
+        self._first = threading.Event()
+
+    def run(self):
+        try:
+            while not self._halt.is_set():
+                start = clk.monotonic_ns()
+                timestamp = self.clock()
+                values = self.bank.sweep()
+                self.buffer.write(values, timestamp, self.bank.failed)
+                self._first.set()
+                self.duration.add(clk.monotonic_ns() - start)
+                remaining = self.period - (self.clock() - timestamp)
+                if remaining > 0:
+                    self.sleep(remaining)
+                else:
+                    # always yield, s.t. the control loop gets the GIL
+                    time.sleep(0)
+        except Exception:
+            self.exc_info = sys.exc_info()
+            self._first.set()
+
+    def wait_first(self, timeout=1.):
+        """ Wait until the first sweep is published
+
+        Returns:
+            (bool): True if it is
+        """
+        self._first.wait(timeout)
+        return self.buffer.seq > 0
+
+    def read(self, out):
+        """
+        Copy the latest sweep to *out*, without waiting for the bus.
+
+        Returns:
+            see DoubleBuffer.read
+        """
+        if self.exc_info:
+            exc_type, exc_value, exc_tb = self.exc_info
+            raise exc_type, exc_value, exc_tb
+        return self.buffer.read(out)
+
+    def stop(self):
+        self._halt.set()
+        if self.is_alive():
+            self.join()
+
+
+class Acquisition(object):
+    """ A Sampler for the pressure and one for the IMU bank """
+    def __init__(self, sens_bank=None, imu_bank=None, period=0.,
+                 clock=clk.monotonic, sleep=time.sleep):
+        """
+        *Initialize with:*
+
+        Args:
+            sens_bank (sensors.DPressureSensBank): or None
+            imu_bank (sensors.IMUBank): or None
+            period (float): minimal time between two sweeps in sec
+            clock (callable): time source of the timestamps and the period
+            sleep (callable): function to sleep for a given time in sec
+        """
+        self.samplers = {}
+        self.pressure = None
+        self.imu = None
+        if sens_bank:
+            self.pressure = Sampler('pressure', sens_bank, period, clock,
+                                    sleep)
+            self.samplers['pressure'] = self.pressure
+        if imu_bank:
+            self.imu = Sampler('imu', imu_bank, period, clock, sleep)
+            self.samplers['imu'] = self.imu
+
+    def start(self, timeout=1.):
+        """ Start all samplers and wait for their first sweep """
+        for sampler in self.samplers.values():
+            sampler.start()
+        for sampler in self.samplers.values():
+            sampler.wait_first(timeout)
+
+    def stop(self):
+        for sampler in self.samplers.values():
+            sampler.stop()
+
+    def report(self):
+        """
+        Returns:
+            (str): number and duration of the sweeps of every sampler in us
+        """
+        lines = []
+        for name in sorted(self.samplers):
+            summary = self.samplers[name].duration.summary()
+            lines.append(
+                '[{}] sweeps: {}, mean: {:.1f} us, p99: {:.1f} us, '
+                'max: {:.1f} us'.format(name, summary['count'],
+                                        summary['mean'], summary['p99'],
+                                        summary['max']))
+        return '\n'.join(lines)
@@ -1,18 +1,10 @@
 # pylint: skip-file
 import time
-try:
-    import Adafruit_BBIO.PWM as PWM
-except ImportError:
-    print "Can't import Adafruit_BBIO.PWM"
-
-try:
-    import Adafruit_BBIO.GPIO as GPIO
-except ImportError:
-    print "Can't import Adafruit_BBIO.GPIO"
-
 
 from termcolor import colored
 
+from Src.Hardware.backend import ACTUATOR_PWM as PWM
+from Src.Hardware.backend import ACTUATOR_GPIO as GPIO
 from Src.Management import exception
 
 
@@ -93,21 +85,30 @@ class VacuumPump(object):
 
 class Valve(object):
     """ Software Representation of the Proportional Pressure Valve
+
+    Like DiscreteValve.set_state, set_pwm only writes the hardware (a sysfs
+    write on the BBB) if the duty cycle changed by more than *deadband*.
     """
 
-    def __init__(self, name, pwm_pin):
+    def __init__(self, name, pwm_pin, deadband=0.):
         """*Initialize with*
 
         Args:
            pwm_pin_0 (str): Pin for pwm 1, e.g. "P9_14"
+           deadband (float): smaller changes of the duty cycle are not
+               written, in %
         """
         self.name = name
         self.pwm_pin = pwm_pin
+        self.deadband = deadband
+        self.writes = 0         # issued writes of the duty cycle
+        self.suppressed = 0     # skipped, since within the deadband
 
 #        print(
 #            'starting PWM with duty cycle 1. at Prportional Valve ', self.name)
         PWM.start(self.pwm_pin, 0, 25000)
         PWM.set_duty_cycle(self.pwm_pin, 10.0)
+        self.duty_cycle = 10.0  # last written
 
     def cleanup(self):
         """Stop pwm services."""
@@ -116,14 +117,30 @@ class Valve(object):
 
         PWM.stop(self.pwm_pin)
         PWM.cleanup()
+        self.duty_cycle = None
 
-    def set_pwm(self, duty_cycle):
+    def set_pwm(self, duty_cycle, force=False):
         """Set the pwm to **duty_cycle**
 
         Args:
             duty_cycle (int): Value between 0 to 100
+            force (bool): write, even if within the deadband
         """
+        last = self.duty_cycle
+        if (not force and last is not None and
+                abs(duty_cycle - last) <= self.deadband):
+            self.suppressed += 1
+            return
         PWM.set_duty_cycle(self.pwm_pin, duty_cycle)
+        self.duty_cycle = duty_cycle
+        self.writes += 1
+
+    def write_stats(self):
+        """
+        Returns:
+            (dict): number of 'issued' and 'suppressed' writes
+        """
+        return {'issued': self.writes, 'suppressed': self.suppressed}
 
 
 class DiscreteValve(object):
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Selects the backend the hardware is accessed with.
+
+    ====== = ====================================================
+    | bbb  = Adafruit_BBIO and Adafruit_GPIO on the BeagleBone (default)
+    | sim  = simulated hardware (see simulation.py)
+    ====== = ====================================================
+
+Choose with the environment variable GECKOBOT_BACKEND, e.g.:
+
+    GECKOBOT_BACKEND=sim python server_hardware_controlled.py
+
+Provides the modules ADC, PWM, GPIO and I2C, as well as the clock
+(*monotonic*, *sleep*) the control loop should be scheduled with. In the
+simulation, time is virtual, so the loop runs faster than real time.
+
+The valves are driven by ACTUATOR_PWM and ACTUATOR_GPIO. On the BBB, they
+can write sysfs directly with the files kept open (see sysfs.py), instead
+of going through Adafruit_BBIO:
+
+    ========== = ==============================================
+    | bbio     = Adafruit_BBIO, i.e. PWM and GPIO (default)
+    | sysfs    = sysfs.SysfsPWM and sysfs.SysfsGPIO
+    ========== = ==============================================
+
+Choose with the environment variable GECKOBOT_ACTUATORS. It is ignored by
+the simulation.
+"""
+from __future__ import print_function
+
+import os
+import time
+
+from Src.Management import clock
+
+
+BACKEND = os.environ.get('GECKOBOT_BACKEND', 'bbb').lower()
+SIMULATED = BACKEND == 'sim'
+ACTUATORS = os.environ.get('GECKOBOT_ACTUATORS', 'bbio').lower()
+
+
+if SIMULATED:
+    from Src.Hardware import simulation
+
+    ADC = simulation.ADC
+    PWM = simulation.PWM
+    GPIO = simulation.GPIO
+    I2C = simulation.I2C
+    plant = simulation.PLANT
+    monotonic = simulation.CLOCK.monotonic
+    sleep = simulation.CLOCK.sleep
+else:
+    plant = None
+    monotonic = clock.monotonic
+    sleep = time.sleep
+
+    try:
+        import Adafruit_BBIO.ADC as ADC
+    except ImportError:
+        print("Can't import Adafruit_BBIO.ADC")
+        ADC = None
+
+    try:
+        import Adafruit_BBIO.PWM as PWM
+    except ImportError:
+        print("Can't import Adafruit_BBIO.PWM")
+        PWM = None
+
+    try:
+        import Adafruit_BBIO.GPIO as GPIO
+    except ImportError:
+        print("Can't import Adafruit_BBIO.GPIO")
+        GPIO = None
+
+    try:
+        import Adafruit_GPIO.I2C as I2C
+    except ImportError:
+        print("Can't import Adafruit_I2C")
+        I2C = None
+
+
+if ACTUATORS == 'sysfs' and not SIMULATED:
+    from Src.Hardware import sysfs
+
+    ACTUATOR_PWM = sysfs.SysfsPWM()
+    ACTUATOR_GPIO = sysfs.SysfsGPIO()
+else:
+    ACTUATOR_PWM = PWM
+    ACTUATOR_GPIO = GPIO
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Health of the sensors on a flaky bus.
+
+A SensorHealth counts the reads and failures of every sensor of a bank. If
+a sensor fails repeatedly, it is not read again until its backoff has
+passed (doubled on every failure up to *max_backoff*), s.t. a dead sensor
+does not stall every sweep with bus timeouts. The bank keeps the last good
+value of the sensor, the SensorHealth tracks its age.
+
+Instead of logging every failure, a HealthLog writes a summary of the
+failures at most every *interval* seconds.
+
+Example:
+    >>> health = SensorHealth('pressure', ['0', '1'], backoff=.1)
+    >>> health.due(1, 0.), health.failed(1, 0.)
+    (True, None)
+    >>> health.due(1, .05), health.due(1, .1)
+    (False, True)
+    >>> health.stats(.5)['1']['errors']
+    1
+"""
+
+from Src.Management import clock as clk
+
+
+class SensorHealth(object):
+    def __init__(self, kind, names, backoff=.001, max_backoff=1.,
+                 clock=clk.monotonic):
+        """
+        *Initialize with:*
+
+        Args:
+            kind (str): name of the bank, e.g. 'pressure'
+            names (list of str): names of the sensors
+            backoff (float): pause after the first failure in sec
+            max_backoff (float): longest pause in sec
+            clock (callable): time source
+        """
+        self.kind = kind
+        self.names = list(names)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        n = len(self.names)
+        self.reads = [0]*n
+        self.errors = [0]*n
+        self.consecutive = [0]*n
+        self.skipped = [0]*n
+        self.last_good = [None]*n
+        self.retry_at = [0.]*n
+
+    def due(self, idx, now):
+        """
+        Returns:
+            (bool): False, if sensor *idx* should not be read (backoff)
+        """
+        if now >= self.retry_at[idx]:
+            return True
+        self.skipped[idx] += 1
+        return False
+
+    def ok(self, idx, now):
+        """ Sensor *idx* was read successfully at *now* """
+        self.reads[idx] += 1
+        self.consecutive[idx] = 0
+        self.last_good[idx] = now
+
+    def failed(self, idx, now):
+        """ Sensor *idx* did not answer at *now* """
+        self.reads[idx] += 1
+        self.errors[idx] += 1
+        count = self.consecutive[idx] = self.consecutive[idx] + 1
+        self.retry_at[idx] = now + min(self.backoff*2**min(count-1, 32),
+                                       self.max_backoff)
+
+    def age(self, idx, now):
+        """
+        Returns:
+            (float): seconds since the last good value of sensor *idx*,
+                None if it never answered
+        """
+        last = self.last_good[idx]
+        return None if last is None else now - last
+
+    def stats(self, now=None):
+        """
+        Returns:
+            (dict): {name: {'reads', 'errors', 'consecutive', 'skipped',
+                'age'}} of every sensor
+        """
+        if now is None:
+            now = self.clock()
+        stats = {}
+        for idx, name in enumerate(self.names):
+            stats[name] = {'reads': self.reads[idx],
+                           'errors': self.errors[idx],
+                           'consecutive': self.consecutive[idx],
+                           'skipped': self.skipped[idx],
+                           'age': self.age(idx, now)}
+        return stats
+
+
+class HealthLog(object):
+    """ Rate limited summary of the failures of some SensorHealths """
+    def __init__(self, log, healths, interval=5., clock=clk.monotonic):
+        """
+        *Initialize with:*
+
+        Args:
+            log (callable): writes the summary, e.g. logger.warning
+            healths (list of SensorHealth): the banks to watch
+            interval (float): at most one summary per interval sec
+            clock (callable): time source
+        """
+        self.log = log
+        self.healths = list(healths)
+        self.interval = interval
+        self.clock = clock
+        self.last_log = clock()
+        self.logged_errors = [list(h.errors) for h in self.healths]
+
+    def check(self):
+        """ Log the failures since the last summary, if the interval has
+        passed. Cheap enough to be called every tick. """
+        now = self.clock()
+        if now - self.last_log < self.interval:
+            return
+        for health, logged in zip(self.healths, self.logged_errors):
+            failures = []
+            for idx, name in enumerate(health.names):
+                new = health.errors[idx] - logged[idx]
+                if new:
+                    age = health.age(idx, now)
+                    failures.append('[{}] {}x, age {}'.format(
+                        name, new,
+                        'never read' if age is None else
+                        '{:.3f} s'.format(age)))
+                    logged[idx] = health.errors[idx]
+            if failures:
+                self.log(
+                    'Sensor health {}: failures in the last {:.1f} s: '
+                    '{}'.format(health.kind, now - self.last_log,
+                                ', '.join(failures)))
+        self.last_log = now
@@ -7,27 +7,49 @@ https://randymxj.com/?p=538
 https://groups.google.com/forum/#!topic/beagleboard/vbuM-4oShS8
 """
 
-try:
-    import Adafruit_BBIO.ADC as ADC
-except ImportError:
-    print "Can't import Adafruit_BBIO.ADC"
-
-try:
-    import Adafruit_GPIO.I2C as Adafruit_I2C
-except ImportError:
-    print "Can't import Adafruit_I2C"
-
+import errno
+import struct
 import subprocess
 import time
 
+import numpy as np
+
+from Src.Hardware.backend import ADC
+from Src.Hardware.backend import I2C as Adafruit_I2C
+from Src.Hardware import health as hlth
+
 
 # import random
 
 # Auf "P9_25" liegt eine Schwingung, funktioniert nicht.
 
 
+def _mean(values):
+    return sum(values)/float(len(values))
+
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values)//2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid-1] + values[mid])*.5
+
+
+def _trimmed_mean(values):
+    """ Mean without the smallest and the largest value """
+    if len(values) < 3:
+        return _mean(values)
+    return (sum(values) - min(values) - max(values))/float(len(values)-2)
+
+
+# how the samples of one PressureSens.get_value are combined
+REDUCTIONS = {'mean': _mean, 'median': _median, 'trimmed': _trimmed_mean}
+
+
 class PressureSens(object):
-    def __init__(self, name, pin_0):
+    def __init__(self, name, pin_0, samples=10, skip=2, reduction='mean',
+                 alpha=None):
         """
         Software Representation of a Pressure Sensor (MPX2200AP)
 
@@ -47,17 +69,43 @@ class PressureSens(object):
             AIN5 - P9_36
             AIN6 - P9_35
 
+        Every get_value reads the ADC *samples* times, drops the first
+        *skip* samples and combines the rest by *reduction*. With *alpha*,
+        the result is filtered across the calls by a first order IIR
+        filter, s.t. e.g. samples=1, skip=0 and alpha=.1 costs one ADC read
+        per call and still smooths the noise. To keep the filtered value
+        ready without any read in the control loop, sweep an
+        AnalogPressureBank with an acquisition.Sampler.
+
         *Initialize with*
 
         Args:
             name (str): The name of the sensor
             pin_0 (str): Input pin 0 for PressureSens
+            samples (int): ADC reads per get_value
+            skip (int): number of the first reads to drop
+            reduction (str): 'mean', 'median' or 'trimmed' (the mean
+                without min and max), see REDUCTIONS
+            alpha (float): weight of a new value in the IIR filter, in
+                (0, 1]. None: no filter
         """
+        if not 0 <= skip < samples:
+            raise ValueError('skip must be in [0, samples)')
+        if alpha is not None and not 0 < alpha <= 1:
+            raise ValueError('alpha must be in (0, 1]')
         ADC.setup()
         self.PinVPlus = pin_0
 #        self.PinVMin = pin_1
         self.offset = 0.0  # to calibrate the sensor
         self.name = name
+        self.samples = samples
+        self.skip = skip
+        self.reduce = REDUCTIONS[reduction]
+        self.alpha = alpha
+        self.filtered = None    # state of the IIR filter
+
+    def reset_filter(self):
+        self.filtered = None
 
     def get_value(self):
         """
@@ -77,15 +125,43 @@ class PressureSens(object):
 #        diff -= self.offset
 #        pressure = diff  # / 0.0002  # 0.0002V is 0.2mV
 
-        values = []
-        for i in range(10):
-            values.append(ADC.read(self.PinVPlus))
-        values = values[2:]  # delete the first tweo entries
-        voltage = sum(values)/float(len(values)) * 1.8  # Volt
+        read, pin = ADC.read, self.PinVPlus
+        values = [read(pin) for _ in xrange(self.samples)]
+        value = self.reduce(values[self.skip:])
+        if self.alpha is not None:
+            if self.filtered is None:
+                self.filtered = value
+            else:
+                self.filtered += self.alpha*(value - self.filtered)
+            value = self.filtered
+        voltage = value * 1.8  # Volt
         pressure = voltage  # * 5
         return pressure
 
 
+class AnalogPressureBank(object):
+    def __init__(self, sensors):
+        """
+        A set of PressureSens, to be swept like a DPressureSensBank, e.g. by
+        an acquisition.Sampler.
+
+        *Initialize with*
+
+        Args:
+            sensors (list of PressureSens): the sensors
+        """
+        self.sensors = list(sensors)
+        self.names = [sensor.name for sensor in self.sensors]
+        self.failed = []    # the ADC always answers
+
+    def sweep(self):
+        """
+        Returns:
+            (numpy.ndarray): pressure of each sensor
+        """
+        return np.array([sensor.get_value() for sensor in self.sensors])
+
+
 def i2cdetect():
     bashCommand = "i2cdetect -y -r 2"
     process = subprocess.Popen(bashCommand.split(), stdout=subprocess.PIPE)
@@ -97,9 +173,15 @@ def i2cdetect():
 class MultiPlexer(object):
     def __init__(self, address=0x70):
         self.i2c = Adafruit_I2C.get_i2c_device(address, busnum=2)
+        self.port = None    # currently selected channel
 
     def select(self, port_id):
-        self.i2c.write8(0, 1 << port_id)
+        """ Select channel *port_id*. The bus is only written if the
+        channel is not selected yet. """
+        if port_id != self.port:
+            self.port = None    # unknown if the write fails
+            self.i2c.write8(0, 1 << port_id)
+            self.port = port_id
 
 
 class DPressureSens(object):
@@ -110,6 +192,7 @@ class DPressureSens(object):
         self.i2c = Adafruit_I2C.get_i2c_device(address, busnum=2)
         self.name = name
         self.maxpressure = maxpressure
+        self.banks = []     # (bank, index) of the DPressureSensBanks with it
 
         self.pmin = 0.0
         self.pmax = 150.0
@@ -133,10 +216,103 @@ class DPressureSens(object):
 
     def set_maxpressure(self, maxpressure):
         self.maxpressure = maxpressure
+        for bank, idx in self.banks:
+            bank.maxpressure[idx] = maxpressure
+
+
+class DPressureSensBank(object):
+    def __init__(self, sensors, health=None):
+        """
+        Read a set of DPressureSens, which are connected to the same
+        MultiPlexer, in a single sweep.
+
+        The sensors are read ordered by their channel, starting at the
+        channel which is currently selected, such that the multiplexer is
+        switched as few times as possible. The raw values are converted to
+        pressures in one vectorised calibration step.
+
+        *Initialize with*
+
+        Args:
+            sensors (list of DPressureSens): Sensors on the same MultiPlexer
+            health (health.SensorHealth): counts the failures and pauses
+                failing sensors. Default: SensorHealth('pressure', names)
+        """
+        self.sensors = list(sensors)
+        self.names = [sensor.name for sensor in self.sensors]
+        self.health = health or hlth.SensorHealth('pressure', self.names)
+        self.plexer = self.sensors[0].plexer
+        for sensor in self.sensors:
+            if sensor.plexer is not self.plexer:
+                raise ValueError('All sensors of a bank must be connected '
+                                 'to the same MultiPlexer')
+
+        self.outmin = np.array([s.outmin for s in self.sensors], dtype=float)
+        self.clb = np.array([s.clb for s in self.sensors])
+        self.pmin = np.array([s.pmin for s in self.sensors])
+        self.barfact = np.array([s.barfact for s in self.sensors])
+        # updated by DPressureSens.set_maxpressure
+        self.maxpressure = np.array([s.maxpressure for s in self.sensors],
+                                    dtype=float)
+        for idx, sensor in enumerate(self.sensors):
+            sensor.banks.append((self, idx))
+        self.raw = self.outmin.copy()   # last good raw value of each sensor
+        self.failed = []
+
+        # read order for every channel the sweep could start at
+        order = sorted(range(len(self.sensors)),
+                       key=lambda idx: self.sensors[idx].mplx_id)
+        self._default_order = order
+        self._orders = {}
+        for start, idx in enumerate(order):
+            port = self.sensors[idx].mplx_id
+            if port not in self._orders:
+                self._orders[port] = order[start:] + order[:start]
+
+    def sweep(self):
+        """
+        Read all sensors of the bank.
+
+        If a sensor does not answer (EREMOTEIO), its last good value is
+        kept and its name is listed in *self.failed*. Sensors in backoff
+        (see health.SensorHealth) are not read.
+
+        Returns:
+            (numpy.ndarray): pressure of each sensor (same order as
+                *self.sensors*) related to its maxpressure
+        """
+        self.failed = []
+        health = self.health
+        now = health.clock()
+        order = self._orders.get(self.plexer.port, self._default_order)
+        for idx in order:
+            if not health.due(idx, now):
+                continue
+            sensor = self.sensors[idx]
+            try:
+                self.plexer.select(sensor.mplx_id)
+                sens_bytes = sensor.i2c.readList(register=0, length=2)
+                self.raw[idx] = sens_bytes[0]*256 + sens_bytes[1]
+                health.ok(idx, now)
+            except IOError as e:
+                if e.errno != errno.EREMOTEIO:
+                    raise
+                self.plexer.port = None
+                self.failed.append(sensor.name)
+                health.failed(idx, now)
+        return ((self.raw-self.outmin)*self.clb +
+                self.pmin)*self.barfact/self.maxpressure
+
+    def set_maxpressure(self, maxpressure):
+        for sensor in self.sensors:
+            sensor.set_maxpressure(maxpressure)
 
 
 class MPU_9150(object):
     plexer = MultiPlexer(address=0x71)
+    ACCEL_XOUT_H = 0x3b     # acc x, y, z, temperature, gyro x, y, z follow
+    ACC_BYTES = 6           # 0x3b .. 0x40
+    MOTION_BYTES = 14       # 0x3b .. 0x48
 
     def __init__(self, name, mplx_id, address=0x68):
         power_mgmt_1 = 0x6b     # register power management of IMU
@@ -163,13 +339,87 @@ class MPU_9150(object):
         else:
             return val
 
-    def get_acceleration(self):
+    def read_burst(self, length=ACC_BYTES):
+        """ Read *length* contiguous registers, starting at ACCEL_XOUT_H,
+        in one I2C transaction """
         self.plexer.select(self.mplx_id)
+        return self.i2c.readList(register=self.ACCEL_XOUT_H, length=length)
+
+    def get_acceleration(self):
+        data = bytearray(self.read_burst(self.ACC_BYTES))
+        return struct.unpack('>hhh', data)
+
+    def get_motion(self):
+        """
+        Returns:
+            (tuple): acceleration x, y, z
+            (tuple): angular velocity x, y, z
+        """
+        data = bytearray(self.read_burst(self.MOTION_BYTES))
+        words = struct.unpack('>hhhhhhh', data)
+        return words[:3], words[4:]
+
+
+class IMUBank(object):
+    def __init__(self, imus, gyro=False, health=None):
+        """
+        Read a set of MPU_9150 in a single sweep.
+
+        Every IMU is read with one burst of its contiguous data registers.
+        The raw bytes of all IMUs are decoded at once (signed big-endian
+        words).
+
+        *Initialize with*
+
+        Args:
+            imus (list of MPU_9150): the IMUs
+            gyro (bool): read the angular velocity as well
+            health (health.SensorHealth): counts the failures and pauses
+                failing IMUs. Default: SensorHealth('imu', names)
+        """
+        self.imus = list(imus)
+        self.names = [imu.name for imu in self.imus]
+        self.health = health or hlth.SensorHealth('imu', self.names)
+        self.gyro = gyro
+        if gyro:
+            self.length = MPU_9150.MOTION_BYTES
+            self.columns = [0, 1, 2, 4, 5, 6]   # skip the temperature
+        else:
+            self.length = MPU_9150.ACC_BYTES
+            self.columns = [0, 1, 2]
+        # last good raw bytes of each IMU
+        self.raw = np.zeros((len(self.imus), self.length), dtype=np.uint8)
+        self.failed = []
+
+    def sweep(self):
+        """
+        Read all IMUs.
+
+        If an IMU does not answer (EREMOTEIO), its last good value is kept
+        and its name is listed in *self.failed*. IMUs in backoff (see
+        health.SensorHealth) are not read.
 
-        acc_xout = self._read_word_2c(0x3b)
-        acc_yout = self._read_word_2c(0x3d)
-        acc_zout = self._read_word_2c(0x3f)
-        return (acc_xout, acc_yout, acc_zout)
+        Returns:
+            (numpy.ndarray): acceleration (and angular velocity) of each IMU,
+                shape (n_imu, 3) (or (n_imu, 6) with gyro)
+        """
+        self.failed = []
+        health = self.health
+        now = health.clock()
+        for idx, imu in enumerate(self.imus):
+            if not health.due(idx, now):
+                continue
+            try:
+                self.raw[idx] = bytearray(imu.read_burst(self.length))
+                health.ok(idx, now)
+            except IOError as e:
+                if e.errno != errno.EREMOTEIO:
+                    raise
+                imu.plexer.port = None
+                self.failed.append(imu.name)
+                health.failed(idx, now)
+        words = self.raw.view('>i2')
+        return words[:, self.columns].astype(float)
 
 
 if __name__ == "__main__":
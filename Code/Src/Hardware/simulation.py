@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated hardware, i.e. stand-ins for Adafruit_BBIO.ADC, Adafruit_BBIO.PWM,
+Adafruit_BBIO.GPIO and Adafruit_GPIO.I2C, which allow to run the server
+without a BeagleBone.
+
+The I2C bus knows the two multiplexers (0x70 for the pressure sensors and
+0x71 for the IMUs), the pressure sensors (0x28) and the MPU-9150 (0x68).
+Every proportional valve fills a pneumatic chamber, modelled as first order
+system:
+
+    | u      = (duty_cycle - 50)/50
+    | dp/dt  = u/tau*(p_supply - p)   for u > 0  (inflate)
+    | dp/dt  = u/tau*p                for u < 0  (deflate)
+
+The pressure of a chamber is measured by the pressure sensor it is wired to
+(see PneumaticPlant.connect).
+
+Time is virtual: *SimClock.sleep* does not sleep but advances the clock.
+Hence a loop which is scheduled by this clock runs as fast as the CPU allows.
+
+FakeSysfs is a directory tree which looks like the sysfs of the BBB for the
+drivers in sysfs.py.
+"""
+
+import errno
+import math
+import os
+import threading
+
+from Src.Hardware import sysfs
+
+
+class SimClock(object):
+    """ Virtual time, which only advances on sleep """
+    def __init__(self):
+        self.now = 0.
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            with self.lock:
+                self.now += seconds
+
+
+class Chamber(object):
+    def __init__(self, tau=.2, p_supply=1.5):
+        """
+        First order model of a pneumatic chamber filled by a proportional
+        valve.
+
+        Args:
+            tau (float): time constant of the chamber at fully opened valve
+            p_supply (float): pressure of the supply in bar
+        """
+        self.tau = tau
+        self.p_supply = p_supply
+        self.pressure = 0.
+        self.duty_cycle = 0.
+
+    def advance(self, dt):
+        """ Integrate the chamber pressure (exact for constant input) """
+        u = (self.duty_cycle - 50.)/50.
+        if u > 0:
+            self.pressure = self.p_supply - (self.p_supply-self.pressure) * \
+                math.exp(-u*dt/self.tau)
+        elif u < 0:
+            self.pressure = self.pressure*math.exp(u*dt/self.tau)
+
+
+class SimIMU(object):
+    """ MPU-9150 at rest. It measures gravity, turned by *angle* [deg]
+    around its z-axis and tilted by *tilt* [deg]. """
+    ACC_LSB = 16384.    # LSB/g at +-2g
+
+    def __init__(self, angle=0., tilt=45.):
+        self.angle = angle
+        self.tilt = tilt
+        self.awake = False
+
+    def registers(self):
+        """ Register content from 0x3b (ACCEL_XOUT_H) to 0x48 """
+        phi = math.radians(self.angle)
+        theta = math.radians(self.tilt)
+        acc = [self.ACC_LSB*math.sin(theta)*math.cos(phi),
+               self.ACC_LSB*math.sin(theta)*math.sin(phi),
+               self.ACC_LSB*math.cos(theta)]
+        words = [int(round(a)) for a in acc] + [0] + [0, 0, 0]
+        data = []
+        for word in words:
+            word &= 0xffff
+            data += [word >> 8, word & 0xff]
+        return data
+
+
+class PneumaticPlant(object):
+    """ All chambers, sensors and IMUs of the simulated robot """
+    # transfer function of the pressure sensors (see sensors.DPressureSens)
+    OUTMIN = int((2**14-1)*.1)
+    OUTMAX = int((2**14-1)*.9)
+    PMAX = 150.     # psi
+    PSI_PER_BAR = 14.5038
+
+    def __init__(self, clock, n_imu=6):
+        """
+        Args:
+            clock (SimClock): time base of the simulation
+            n_imu (int): number of IMUs, connected to channel 0..n_imu-1 of
+                the multiplexer 0x71
+        """
+        self.clock = clock
+        self.last_update = clock.monotonic()
+        self.chambers = {}      # pwm_pin: Chamber
+        self.wiring = {}        # mplx_id of pressure sensor: pwm_pin
+        self.imus = dict([(idx, SimIMU()) for idx in range(n_imu)])
+        self.lock = threading.RLock()
+
+    def chamber(self, pwm_pin):
+        if pwm_pin not in self.chambers:
+            self.chambers[pwm_pin] = Chamber()
+        return self.chambers[pwm_pin]
+
+    def connect(self, pwm_pin, mplx_id):
+        """ Wire the chamber of the valve at *pwm_pin* to the pressure sensor
+        at channel *mplx_id* of multiplexer 0x70 """
+        self.chamber(pwm_pin)
+        self.wiring[mplx_id] = pwm_pin
+
+    def update(self):
+        """ Integrate all chambers up to now """
+        with self.lock:
+            now = self.clock.monotonic()
+            dt = now - self.last_update
+            if dt > 0:
+                for chamber in self.chambers.values():
+                    chamber.advance(dt)
+            self.last_update = now
+
+    def set_duty_cycle(self, pwm_pin, duty_cycle):
+        with self.lock:
+            self.update()
+            self.chamber(pwm_pin).duty_cycle = duty_cycle
+
+    def pressure(self, mplx_id):
+        """ Pressure [bar] at the sensor of channel *mplx_id* """
+        with self.lock:
+            self.update()
+            pwm_pin = self.wiring.get(mplx_id)
+            if pwm_pin is None:
+                return 0.
+            return self.chambers[pwm_pin].pressure
+
+    def pressure_bytes(self, mplx_id):
+        """ What the pressure sensor at channel *mplx_id* sends """
+        psi = self.pressure(mplx_id)*self.PSI_PER_BAR
+        output = int(psi/self.PMAX*(self.OUTMAX-self.OUTMIN) + self.OUTMIN)
+        output = min(max(output, 0), 2**14-1)
+        return [output >> 8, output & 0xff]
+
+
+class SimI2CDevice(object):
+    """ Stand-in for Adafruit_GPIO.I2C.Device """
+    def __init__(self, bus, address):
+        self.bus = bus
+        self.address = address
+
+    def write8(self, register, value):
+        self.bus.write(self.address, register, [value & 0xff])
+
+    def writeList(self, register, data):
+        self.bus.write(self.address, register, list(data))
+
+    def readList(self, register, length):
+        return self.bus.read(self.address, register, length)
+
+    def readU8(self, register):
+        return self.bus.read(self.address, register, 1)[0]
+
+
+class SimI2C(object):
+    """ Stand-in for the module Adafruit_GPIO.I2C """
+    PRESSURE_MPLX = 0x70
+    IMU_MPLX = 0x71
+    PRESSURE_ADDR = 0x28
+    IMU_ADDR = 0x68
+
+    def __init__(self, plant):
+        self.plant = plant
+        self.mplx = {self.PRESSURE_MPLX: 0, self.IMU_MPLX: 0}
+        self.lock = threading.Lock()
+
+    def get_i2c_device(self, address, busnum=None, **kwargs):
+        return SimI2CDevice(self, address)
+
+    def _selected(self, mplx):
+        mask = self.mplx[mplx]
+        return [idx for idx in range(8) if mask & (1 << idx)]
+
+    def _no_answer(self, address):
+        return IOError(errno.EREMOTEIO, 'Remote I/O error', hex(address))
+
+    def write(self, address, register, data):
+        with self.lock:
+            if address in self.mplx:
+                self.mplx[address] = data[-1]
+            elif address == self.IMU_ADDR:
+                for idx in self._selected(self.IMU_MPLX):
+                    if idx in self.plant.imus:
+                        self.plant.imus[idx].awake = True
+                        return
+                raise self._no_answer(address)
+            elif address != self.PRESSURE_ADDR:
+                raise self._no_answer(address)
+
+    def read(self, address, register, length):
+        with self.lock:
+            if address == self.PRESSURE_ADDR:
+                channels = self._selected(self.PRESSURE_MPLX)
+                if not channels:
+                    raise self._no_answer(address)
+                data = self.plant.pressure_bytes(channels[0])
+                return (data*length)[:length]
+            if address == self.IMU_ADDR:
+                for idx in self._selected(self.IMU_MPLX):
+                    if idx in self.plant.imus:
+                        regs = self.plant.imus[idx].registers()
+                        start = register - 0x3b
+                        data = regs[start:start+length] if start >= 0 else []
+                        return data + [0]*(length-len(data))
+            if address in self.mplx:
+                return [self.mplx[address]]*length
+            raise self._no_answer(address)
+
+
+class SimPWM(object):
+    """ Stand-in for the module Adafruit_BBIO.PWM """
+    def __init__(self, plant):
+        self.plant = plant
+        self.duty_cycle = {}
+
+    def start(self, channel, duty, freq=2000, polarity=0):
+        self.set_duty_cycle(channel, duty)
+
+    def set_duty_cycle(self, channel, duty):
+        if not 0. <= duty <= 100.:
+            raise ValueError('duty_cycle must have a value from 0.0 to 100.0')
+        self.duty_cycle[channel] = duty
+        self.plant.set_duty_cycle(channel, duty)
+
+    def set_frequency(self, channel, freq):
+        pass
+
+    def stop(self, channel):
+        self.set_duty_cycle(channel, 0.)
+
+    def cleanup(self):
+        for channel in list(self.duty_cycle):
+            self.stop(channel)
+
+
+class SimGPIO(object):
+    """ Stand-in for the module Adafruit_BBIO.GPIO """
+    IN = 0
+    OUT = 1
+    LOW = 0
+    HIGH = 1
+    RISING = 1
+    FALLING = 2
+    BOTH = 3
+    PUD_OFF = 0
+    PUD_DOWN = 1
+    PUD_UP = 2
+
+    def __init__(self):
+        self.level = {}
+        self.edges = {}     # pin: edge to detect
+        self.events = {}    # pin: event detected since last call
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+    def setup(self, channel, direction, pull_up_down=0, initial=0,
+              delay=0):
+        self.level.setdefault(channel, initial)
+
+    def output(self, channel, value):
+        self.level[channel] = 1 if value else 0
+
+    def input(self, channel):
+        return self.level.get(channel, 0)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=0):
+        self.edges[channel] = edge
+        self.events[channel] = False
+        self.callbacks[channel] = [callback] if callback else []
+
+    def add_event_callback(self, channel, callback, bouncetime=0):
+        self.callbacks.setdefault(channel, []).append(callback)
+
+    def remove_event_detect(self, channel):
+        self.edges.pop(channel, None)
+        self.callbacks.pop(channel, None)
+
+    def event_detected(self, channel):
+        with self.lock:
+            detected = self.events.get(channel, False)
+            self.events[channel] = False
+        return detected
+
+    def cleanup(self):
+        self.edges.clear()
+        self.events.clear()
+        self.callbacks.clear()
+
+    def set_input(self, channel, value):
+        """ Simulate a signal at the input *channel*, e.g. a pushed button """
+        value = 1 if value else 0
+        old = self.level.get(channel, 0)
+        self.level[channel] = value
+        edge = self.edges.get(channel)
+        if edge is None or old == value:
+            return
+        if (edge == self.BOTH or (edge == self.RISING and value) or
+                (edge == self.FALLING and not value)):
+            with self.lock:
+                self.events[channel] = True
+            for callback in self.callbacks.get(channel, []):
+                callback(channel)
+
+
+class SimADC(object):
+    """ Stand-in for the module Adafruit_BBIO.ADC """
+    def __init__(self):
+        self.values = {}
+
+    def setup(self):
+        pass
+
+    def read(self, channel):
+        return self.values.get(channel, 0.)
+
+    def read_raw(self, channel):
+        return self.read(channel)*4095.
+
+    def set_input(self, channel, value):
+        """ Simulate the normalized voltage *value* [0, 1] at *channel* """
+        self.values[channel] = value
+
+
+class FakeSysfs(object):
+    """ The sysfs files of the PWM and GPIO pins in sysfs.PWM_PINS and
+    sysfs.GPIO_PINS, as plain files in the directory *root* (e.g. a
+    temporary directory). Every channel is exported already, since there is
+    no kernel to do it on a write to export. """
+    def __init__(self, root):
+        self.root = root
+        self.pins = {}      # pin: path of its directory
+        addresses = sorted(set([adr for adr, _ in sysfs.PWM_PINS.values()]))
+        # the kernel numbers the chips in the order they are probed
+        for num, address in enumerate(reversed(addresses)):
+            device = self._mkdir('devices', 'platform', address + '.pwm')
+            chip = self._mkdir('class', 'pwm', 'pwmchip{}'.format(num*2))
+            os.symlink(device, os.path.join(chip, 'device'))
+            self._attr(chip, 'export', '')
+            for pin, (adr, channel) in sysfs.PWM_PINS.items():
+                if adr == address:
+                    path = self._mkdir(chip, 'pwm{}'.format(channel))
+                    for name in ['enable', 'duty_cycle', 'period']:
+                        self._attr(path, name, 0)
+                    self._attr(path, 'polarity', 'normal')
+                    self.pins[pin] = path
+        self._attr(self._mkdir('class', 'gpio'), 'export', '')
+        for pin, number in sysfs.GPIO_PINS.items():
+            path = self._mkdir('class', 'gpio', 'gpio{}'.format(number))
+            self._attr(path, 'direction', 'in')
+            self._attr(path, 'value', 0)
+            self.pins[pin] = path
+
+    def _mkdir(self, *names):
+        path = os.path.join(self.root, *names)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        return path
+
+    def _attr(self, path, name, value):
+        with open(os.path.join(path, name), 'w') as attr:
+            attr.write('{}\n'.format(value))
+
+    def read(self, pin, name):
+        """
+        Args:
+            pin (str): e.g. 'P9_22'
+            name (str): the attribute, e.g. 'duty_cycle' or 'value'
+
+        Returns:
+            (str): the value written last
+        """
+        with open(os.path.join(self.pins[pin], name)) as attr:
+            # a shorter value overwrites the beginning of a longer one
+            return attr.readline().strip()
+
+
+CLOCK = SimClock()
+PLANT = PneumaticPlant(CLOCK)
+ADC = SimADC()
+PWM = SimPWM(PLANT)
+GPIO = SimGPIO()
+I2C = SimI2C(PLANT)
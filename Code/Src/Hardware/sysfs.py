@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+PWM and GPIO outputs via sysfs, with the files kept open.
+
+Adafruit_BBIO opens (and closes) the sysfs files of a pin on every call of
+PWM.set_duty_cycle or GPIO.output. SysfsPWM and SysfsGPIO have the same
+interface, but open the files once in start() or setup(). Afterwards, a
+write costs one lseek and one write syscall.
+
+The pins have to be configured before, e.g.:
+
+    config-pin P9_22 pwm
+    config-pin P8_7 gpio
+
+Only the pins in PWM_PINS and GPIO_PINS are known. The numbering of the
+pwmchips depends on the kernel, so the chip of a pin is found by the
+address of its PWMSS device.
+
+Choose it for the valves with the environment variable GECKOBOT_ACTUATORS,
+see backend.py. The *root* can point to a fake sysfs, see
+simulation.FakeSysfs.
+"""
+
+import os
+
+
+# pin: (address of the PWM device, channel)
+PWM_PINS = {
+    'P9_22': ('48300200', 0),   # ehrpwm0A
+    'P9_21': ('48300200', 1),   # ehrpwm0B
+    'P9_14': ('48302200', 0),   # ehrpwm1A
+    'P9_16': ('48302200', 1),   # ehrpwm1B
+    'P8_19': ('48304200', 0),   # ehrpwm2A
+    'P8_13': ('48304200', 1),   # ehrpwm2B
+    'P9_42': ('48300100', 0),   # ecap0
+    'P9_28': ('48304100', 0),   # ecap2
+}
+
+# pin: number of the gpio
+GPIO_PINS = {
+    'P8_7': 66, 'P8_8': 67, 'P8_9': 69, 'P8_10': 68,
+    'P8_14': 26, 'P8_15': 47, 'P8_16': 46, 'P8_17': 27, 'P8_18': 65,
+}
+
+
+def _write(fd, value):
+    """ Write *value* to the open sysfs file *fd*. The newline ends the
+    value, sysfs ignores it. """
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.write(fd, '{}\n'.format(value))
+
+
+def _write_file(path, value):
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        _write(fd, value)
+    finally:
+        os.close(fd)
+
+
+def _read_file(path):
+    with open(path) as attr:
+        return attr.readline().strip()
+
+
+class SysfsPWM(object):
+    """ Stand-in for the module Adafruit_BBIO.PWM """
+    def __init__(self, root='/sys'):
+        """
+        *Initialize with:*
+
+        Args:
+            root (str): mount point of sysfs
+        """
+        self.root = root
+        self.channels = {}      # pin: [path, fd of duty_cycle, period in ns]
+
+    def _chip(self, address):
+        pwm_class = os.path.join(self.root, 'class', 'pwm')
+        for chip in sorted(os.listdir(pwm_class)):
+            device = os.path.join(pwm_class, chip, 'device')
+            if os.path.basename(os.path.realpath(device)).startswith(
+                    address + '.'):
+                return os.path.join(pwm_class, chip)
+        raise IOError('no pwmchip for the device {}'.format(address))
+
+    def _export(self, pin):
+        if pin not in PWM_PINS:
+            raise ValueError('unknown PWM pin {}'.format(pin))
+        address, channel = PWM_PINS[pin]
+        chip = self._chip(address)
+        # the name of the channel depends on the kernel version
+        names = ['pwm{}'.format(channel),
+                 'pwm-{}:{}'.format(chip.rsplit('pwmchip', 1)[1], channel)]
+        for _ in range(2):
+            for name in names:
+                path = os.path.join(chip, name)
+                if os.path.isdir(path):
+                    return path
+            _write_file(os.path.join(chip, 'export'), channel)
+        raise IOError('could not export {}'.format(pin))
+
+    def start(self, channel, duty, freq=2000, polarity=0):
+        if channel in self.channels:
+            self.stop(channel)
+        path = self._export(channel)
+        period = int(round(1e9/freq))
+        _write_file(os.path.join(path, 'enable'), 0)
+        _write_file(os.path.join(path, 'duty_cycle'), 0)
+        _write_file(os.path.join(path, 'period'), period)
+        if polarity:
+            _write_file(os.path.join(path, 'polarity'), 'inversed')
+        fd = os.open(os.path.join(path, 'duty_cycle'), os.O_WRONLY)
+        self.channels[channel] = [path, fd, period]
+        self.set_duty_cycle(channel, duty)
+        _write_file(os.path.join(path, 'enable'), 1)
+
+    def set_duty_cycle(self, channel, duty):
+        if not 0. <= duty <= 100.:
+            raise ValueError('duty_cycle must have a value from 0.0 to 100.0')
+        _, fd, period = self.channels[channel]
+        _write(fd, int(period*duty/100.))
+
+    def set_frequency(self, channel, freq):
+        path, fd, period = self.channels[channel]
+        new_period = int(round(1e9/freq))
+        # keep the duty cycle, and duty <= period at any time
+        duty = int(_read_file(os.path.join(path, 'duty_cycle')))
+        new_duty = int(duty*float(new_period)/period)
+        if new_period < period:
+            _write(fd, new_duty)
+        _write_file(os.path.join(path, 'period'), new_period)
+        if new_period >= period:
+            _write(fd, new_duty)
+        self.channels[channel][2] = new_period
+
+    def stop(self, channel):
+        if channel not in self.channels:
+            return
+        path, fd, _ = self.channels.pop(channel)
+        os.close(fd)
+        _write_file(os.path.join(path, 'enable'), 0)
+
+    def cleanup(self):
+        for channel in list(self.channels):
+            self.stop(channel)
+
+
+class SysfsGPIO(object):
+    """ Stand-in for the module Adafruit_BBIO.GPIO, outputs and polled
+    inputs only (no event detection) """
+    IN = 0
+    OUT = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 0
+    PUD_DOWN = 1
+    PUD_UP = 2
+
+    def __init__(self, root='/sys'):
+        """
+        *Initialize with:*
+
+        Args:
+            root (str): mount point of sysfs
+        """
+        self.root = root
+        self.fds = {}       # pin: fd of value
+
+    def _export(self, pin):
+        if pin not in GPIO_PINS:
+            raise ValueError('unknown GPIO pin {}'.format(pin))
+        gpio_class = os.path.join(self.root, 'class', 'gpio')
+        path = os.path.join(gpio_class, 'gpio{}'.format(GPIO_PINS[pin]))
+        if not os.path.isdir(path):
+            _write_file(os.path.join(gpio_class, 'export'), GPIO_PINS[pin])
+        return path
+
+    def setup(self, channel, direction, pull_up_down=0, initial=0,
+              delay=0):
+        path = self._export(channel)
+        if direction == self.OUT:
+            # sets the direction and the level at once
+            _write_file(os.path.join(path, 'direction'),
+                        'high' if initial else 'low')
+        else:
+            _write_file(os.path.join(path, 'direction'), 'in')
+        if channel in self.fds:
+            os.close(self.fds[channel])
+        self.fds[channel] = os.open(os.path.join(path, 'value'), os.O_RDWR)
+
+    def output(self, channel, value):
+        _write(self.fds[channel], 1 if value else 0)
+
+    def input(self, channel):
+        fd = self.fds[channel]
+        os.lseek(fd, 0, os.SEEK_SET)
+        return int(os.read(fd, 2)[:1])
+
+    def cleanup(self):
+        for fd in self.fds.values():
+            os.close(fd)
+        self.fds.clear()
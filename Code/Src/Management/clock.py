@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Monotonic time source for the control loop.
+
+Python 2 has no *time.monotonic* and *time.monotonic_ns*, so on Linux (the
+BBB) the POSIX clock_gettime(CLOCK_MONOTONIC) is called via ctypes. Where
+neither is available (e.g. the client on Windows), time.time is used as
+fallback.
+"""
+
+import ctypes
+import ctypes.util
+import time
+
+
+CLOCK_MONOTONIC = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _load_clock_gettime():
+    for name in ['rt', 'c']:
+        path = ctypes.util.find_library(name)
+        if not path:
+            continue
+        try:
+            lib = ctypes.CDLL(path, use_errno=True)
+            return lib.clock_gettime
+        except (OSError, AttributeError):
+            continue
+    return None
+
+
+try:
+    monotonic = time.monotonic
+    monotonic_ns = time.monotonic_ns
+except AttributeError:
+    _clock_gettime = _load_clock_gettime()
+    if _clock_gettime is None:
+        monotonic = time.time
+
+        def monotonic_ns():
+            return int(time.time()*1e9)
+    else:
+        _clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(_Timespec)]
+
+        def monotonic():
+            """
+            Returns:
+                (float): seconds of a clock that never jumps backwards
+            """
+            tspec = _Timespec()
+            _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(tspec))
+            return tspec.tv_sec + tspec.tv_nsec * 1e-9
+
+        def monotonic_ns():
+            """
+            Returns:
+                (int): nanoseconds of a clock that never jumps backwards
+            """
+            tspec = _Timespec()
+            _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(tspec))
+            return tspec.tv_sec*1000000000 + tspec.tv_nsec
@@ -2,43 +2,231 @@
 module for data management
 """
 
+import threading
 import time
 
+import numpy as np
+
 
 class GUIRecorder(object):
     """
     GUIData provide a customized set of data structure for GUI
     control of the GeckoBot system.
     The GUIData is only for the GUI.
+
+    The samples are stored columnwise in preallocated float64 arrays, which
+    double their size when full. All values of a sample share one time
+    stamp (column TIME), in sec since *start_time*. Samples of the server
+    (see extend) are mapped onto this time base, s.t. they can be mixed
+    with the appended ones. Missing values are nan.
+
+    The recorder is filled by one thread (e.g. the StreamReader) and read by
+    another (the GUI). A column is never shifted in place: growing and
+    dropping old samples copy into new arrays, which are swapped under
+    *lock*, s.t. a view returned by window() stays valid.
+
+    Example:
+        >>> rec = GUIRecorder(capacity=2)
+        >>> rec.append({'0': .5}, {'u0': .1})
+        False
+        >>> rec.append({'0': .6, 'u0': .2}, {'r0': None})
+        False
+        >>> rec.append({'0': .7})
+        True
+        >>> rec.max_idx, rec.capacity
+        (3, 4)
+        >>> rec.window('0', 2).tolist(), rec.window('r0').tolist()
+        ([0.6, 0.7], [nan, nan, nan])
+        >>> rec.recorded['u0']['len'], sorted(rec.recorded)
+        (3, ['0', '0_t', 'r0', 'r0_t', 'u0', 'u0_t'])
     """
-    def __init__(self):
+    TIME = '_t'
+
+    def __init__(self, capacity=1024, max_samples=None, session=None):
         """
+        *Initialize with:*
+
+        Args:
+            capacity (int): number of samples to allocate at first
+            max_samples (int): if given, the oldest half of the samples is
+                dropped when max_samples is reached. Use it together with a
+                session to keep the whole history on disk.
+            session (session.SessionRecorder): also write every sample to
+                this file
         """
-        self.recorded = {}
-        self.max_idx = 0
+        self.max_samples = max_samples
+        self.session = session
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {self.TIME: np.zeros(capacity)}
+        self.lock = threading.Lock()
         self.start_time = time.time()
+        self.server_offset = None   # server time - own time (first batch)
 
-    def append(self, sample):
+    @property
+    def max_idx(self):
+        """ Number of recorded samples """
+        return self.size
+
+    def _reserve(self, rows):
+        """ Make room for *rows* more samples. Call with *lock* held. """
+        first = 0   # first row to keep
+        needed = self.size + rows
+        if self.max_samples and needed > self.max_samples:
+            keep = min(self.size, max(self.max_samples//2 - rows, 0))
+            first = self.size - keep
+            needed = keep + rows
+        elif needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        columns = {}
+        for key, column in self.columns.items():
+            copied = np.empty(capacity)
+            copied[:self.size-first] = column[first:self.size]
+            columns[key] = copied
+        self.columns = columns
+        self.capacity = capacity
+        self.size -= first
+
+    def _column(self, key):
+        """ Get the column of *key*, create it if necessary """
+        column = self.columns.get(key)
+        if column is None:
+            column = np.empty(self.capacity)
+            column[:self.size] = np.nan
+            columns = dict(self.columns)
+            columns[key] = column
+            self.columns = columns
+        return column
+
+    def append(self, *samples):
         """
         Append a sample to recorder.
 
         Args:
-            sample (dict): Dictionary of all recorded values in a sample
+            samples (dict): Dictionaries of all recorded values in a sample,
+                e.g. rec, rec_u, rec_r of the server
+
+        Returns:
+            (bool): if all keys were recorded before
         """
-        in_rec = True
-        for key in sample:
-            if key not in self.recorded:
-                self.recorded[key] = {'val': [], 'len': 0}
-                self.recorded[key+'_t'] = {'val': [], 'len': 0}
-                in_rec = False
-            self.recorded[key]['val'].append(sample[key])
-            self.recorded[key+'_t']['val'].append(time.time()-self.start_time)
-            self.recorded[key]['len'] += 1
-            self.recorded[key+'_t']['len'] += 1
-            if self.recorded[key]['len'] > self.max_idx:
-                self.max_idx = self.recorded[key]['len']
+        with self.lock:
+            self._reserve(1)
+            row = self.size
+            in_rec = True
+            recorded = set()
+            for sample in samples:
+                for key in sample:
+                    if key not in self.columns:
+                        in_rec = False
+                    value = sample[key]
+                    self._column(key)[row] = np.nan if value is None else value
+                    recorded.add(key)
+            for key, column in self.columns.items():
+                if key not in recorded and key != self.TIME:
+                    column[row] = np.nan
+            timestamp = time.time() - self.start_time
+            self.columns[self.TIME][row] = timestamp
+            self.size = row + 1
+        if self.session:
+            self.session.append(timestamp, *samples)
         return in_rec
 
+    def extend(self, channels, samples):
+        """
+        Append a batch of samples, e.g. the telemetry pushed by the server.
+        The time is taken from the samples. The last sample of the first
+        batch is taken as received now, i.e. the clock of the server is
+        shifted onto *start_time*.
+
+        Args:
+            channels (list of str): names of the recorded values
+            samples (numpy.ndarray): one row [time, channels...] per sample
+        """
+        rows = len(samples)
+        if not rows:
+            return
+        if self.server_offset is None:
+            self.server_offset = (samples[-1, 0] -
+                                  (time.time() - self.start_time))
+        with self.lock:
+            self._reserve(rows)
+            start, stop = self.size, self.size + rows
+            for idx, key in enumerate(channels):
+                self._column(key)[start:stop] = samples[:, idx+1]
+            for key, column in self.columns.items():
+                if key not in channels and key != self.TIME:
+                    column[start:stop] = np.nan
+            self.columns[self.TIME][start:stop] = \
+                samples[:, 0] - self.server_offset
+            self.size = stop
+        if self.session:
+            samples = samples.copy()
+            samples[:, 0] -= self.server_offset
+            self.session.extend(channels, samples)
+
+    def window(self, key, length=None, stop=None):
+        """
+        View (no copy) on the last *length* values of *key* before *stop*.
+        It is not changed by later samples, but neither extended.
+
+        Args:
+            key (str): name of the value. The key+'_t' gives the time.
+            length (int): number of values, all if None
+            stop (int): index after the last value, the present if None
+        """
+        if key.endswith(self.TIME) and key != self.TIME:
+            key = self.TIME
+        with self.lock:
+            size = self.size
+            column = self.columns[key]
+        stop = size if stop is None else max(0, min(stop, size))
+        start = 0 if length is None else max(0, stop - length)
+        return column[start:stop]
+
+    @property
+    def recorded(self):
+        """
+        The recorder as dictionary {key: {'val': values, 'len': n}}, also
+        containing the time key+'_t' for every key (views, no copies).
+        """
+        with self.lock:
+            size = self.size
+            columns = self.columns
+        time_col = columns[self.TIME][:size]
+        recorded = {}
+        for key, column in columns.items():
+            if key == self.TIME:
+                continue
+            recorded[key] = {'val': column[:size], 'len': size}
+            recorded[key+self.TIME] = {'val': time_col, 'len': size}
+        return recorded
+
+    @recorded.setter
+    def recorded(self, recorded):
+        """ Replace the content by a dictionary as given by *recorded*, e.g.
+        a loaded file. The time of the longest key is used for all keys. """
+        keys = [key for key in recorded if not key.endswith(self.TIME)]
+        size = max([len(recorded[key]['val']) for key in keys] + [0])
+        capacity = max(size, 1)
+        time_col = np.zeros(capacity)
+        columns = {}
+        for key in keys:
+            values = np.array(recorded[key]['val'], dtype=float)
+            column = np.empty(capacity)
+            column[:len(values)] = values
+            column[len(values):] = np.nan
+            columns[key] = column
+            if len(values) == size and key+self.TIME in recorded:
+                time_col[:size] = recorded[key+self.TIME]['val'][:size]
+        columns[self.TIME] = time_col
+        with self.lock:
+            self.columns = columns
+            self.capacity = capacity
+            self.size = size
+
 
 class GUITask(object):
     """
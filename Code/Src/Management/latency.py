@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Low-overhead timing of the phases of the control loop (read_sens, read_imu,
+controller, set_pwm, set_dvalve, ...).
+
+Every phase gets a histogram with fixed, logarithmic buckets (8 per decade
+from 1 us to 1 s), so recording a duration costs one clock call, a bisect
+and an increment, and the memory does not grow with the runtime. The
+percentiles are read from the buckets, i.e. they are exact up to the
+bucket width (~33 %).
+
+Example:
+    >>> timer = PhaseTimer(['read_sens', 'controller'])
+    >>> start = timer.tic()
+    >>> # read_sens ...
+    >>> start = timer.toc('read_sens', start)
+    >>> # controller ...
+    >>> start = timer.toc('controller', start)
+    >>> timer.histograms['read_sens'].count
+    1
+"""
+
+import bisect
+import json
+
+from Src.Management import clock
+
+
+BUCKETS_PER_DECADE = 8
+EDGES = [int(round(10**(3 + float(k)/BUCKETS_PER_DECADE)))
+         for k in range(6*BUCKETS_PER_DECADE + 1)]   # [ns] 1 us .. 1 s
+PERCENTILES = [50, 90, 99, 99.9]
+
+
+class Histogram(object):
+    """ Histogram of durations in ns with fixed buckets """
+    def __init__(self, edges=EDGES):
+        """
+        Args:
+            edges (list of int): upper edges of the buckets in ns. Longer
+                durations are counted in an extra bucket.
+        """
+        self.edges = edges
+        self.counts = [0]*(len(edges) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, duration):
+        """
+        Args:
+            duration (int): in ns
+        """
+        self.counts[bisect.bisect_left(self.edges, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, percent):
+        """
+        Args:
+            percent (float): e.g. 99 for the 99th percentile
+
+        Returns:
+            (int): upper edge of the bucket which contains the percentile in
+                ns (at most the maximum)
+        """
+        if not self.count:
+            return 0
+        rank = percent/100.*self.count
+        cumulated = 0
+        for idx, count in enumerate(self.counts):
+            cumulated += count
+            if cumulated >= rank and count:
+                if idx < len(self.edges):
+                    return min(self.edges[idx], self.max)
+                break
+        return self.max
+
+    def summary(self):
+        """
+        Returns:
+            (dict): count, mean, max and the PERCENTILES ('p50', ...) in us
+        """
+        summary = {'count': self.count,
+                   'mean': self.total/1e3/self.count if self.count else 0.,
+                   'max': self.max/1e3}
+        for percent in PERCENTILES:
+            summary['p{:g}'.format(percent)] = self.percentile(percent)/1e3
+        return summary
+
+    def reset(self):
+        self.counts = [0]*(len(self.edges) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+
+class PhaseTimer(object):
+    """ A Histogram per phase of the loop """
+    def __init__(self, phases, clock_ns=clock.monotonic_ns):
+        """
+        Args:
+            phases (list of str): names of the phases
+            clock_ns (callable): monotonic time source in ns
+        """
+        self.phases = list(phases)
+        self.histograms = dict([(phase, Histogram()) for phase in phases])
+        self.tic = clock_ns
+
+    def toc(self, phase, start):
+        """
+        Record the time since *start* for *phase*.
+
+        Args:
+            phase (str): name of the phase
+            start (int): return value of tic() (or of the last toc())
+
+        Returns:
+            (int): now, i.e. the start of the next phase
+        """
+        now = self.tic()
+        self.histograms[phase].add(now - start)
+        return now
+
+    def summary(self):
+        """
+        Returns:
+            (dict): {phase: Histogram.summary()} of all recorded phases
+        """
+        return dict([(phase, self.histograms[phase].summary())
+                     for phase in self.phases
+                     if self.histograms[phase].count])
+
+    def report(self):
+        """
+        Returns:
+            (str): human readable table of the percentiles in us
+        """
+        header = '{:12} {:>8} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+            'phase [us]', 'count', 'mean', 'p50', 'p99', 'p99.9', 'max')
+        lines = [header]
+        for phase in self.phases:
+            hist = self.histograms[phase]
+            if not hist.count:
+                continue
+            s = hist.summary()
+            lines.append(
+                '{:12} {:8d} {:9.1f} {:9.1f} {:9.1f} {:9.1f} {:9.1f}'.format(
+                    phase, s['count'], s['mean'], s['p50'], s['p99'],
+                    s['p99.9'], s['max']))
+        return '\n'.join(lines)
+
+    def dump(self, filename):
+        """ Write summary and buckets of all phases to a json file """
+        data = {'edges_ns': EDGES, 'phases': {}}
+        for phase in self.phases:
+            hist = self.histograms[phase]
+            data['phases'][phase] = {'summary': hist.summary(),
+                                     'counts': hist.counts}
+        with open(filename, 'w') as fobj:
+            json.dump(data, fobj, indent=1, sort_keys=True)
+
+    def reset(self):
+        for hist in self.histograms.values():
+            hist.reset()
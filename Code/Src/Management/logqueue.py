@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Non-blocking logging for the control loop.
+
+An AsyncHandler only puts the records in a bounded queue. A background
+thread passes them to the actual handlers (file, console, ...), s.t. no
+disk or console write happens in the thread which logs. The message (and
+the traceback) is rendered before queueing, so it shows the values at the
+time of the call, even if they are changed later.
+
+If the queue is full, records are dropped and counted. Once the writer has
+caught up, it logs how many records were dropped.
+
+Example:
+    >>> import logging
+    >>> logger = logging.getLogger('doctest')
+    >>> stream = logging.StreamHandler(sys.stdout)
+    >>> handler = AsyncHandler([stream])
+    >>> logger.addHandler(handler)
+    >>> logger.warning('written by the background thread')
+    >>> handler.close()
+    written by the background thread
+"""
+
+import Queue
+import logging
+import sys
+import threading
+
+
+class AsyncHandler(logging.Handler):
+    def __init__(self, handlers, capacity=10000):
+        """
+        *Initialize with:*
+
+        Args:
+            handlers (list of logging.Handler): write the records
+            capacity (int): max number of queued records
+        """
+        logging.Handler.__init__(self)
+        self.handlers = list(handlers)
+        self.queue = Queue.Queue(capacity)
+        self.dropped = 0        # in total
+        self._reported = 0      # dropped records which are logged already
+        self._drop_lock = threading.Lock()
+        self._exc_formatter = logging.Formatter()
+        self._thread = threading.Thread(target=self._write,
+                                        name='AsyncLogging')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def prepare(self, record):
+        """ Render message and traceback of *record*, s.t. it does not
+        refer to any (mutable) object of the logging thread """
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self._exc_formatter.formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        """ Queue *record*. Never blocks. """
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            with self._drop_lock:
+                self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _write(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            self._handle(record)
+            if self.dropped != self._reported and self.queue.empty():
+                self._report_dropped()
+
+    def _handle(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+
+    def _report_dropped(self):
+        dropped = self.dropped
+        self._handle(logging.LogRecord(
+            'logqueue', logging.WARNING, __file__, 0,
+            'log queue overflow: dropped %d records (%d in total)',
+            (dropped - self._reported, dropped), None))
+        self._reported = dropped
+
+    def close(self):
+        """ Write all queued records, stop the thread and close the
+        handlers """
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+            if self.dropped != self._reported:
+                self._report_dropped()
+        for handler in self.handlers:
+            handler.close()
+        logging.Handler.close(self)
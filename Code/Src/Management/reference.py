@@ -6,25 +6,112 @@ Created on Tue Jun 26 09:12:58 2018
 @author: bianca
 
 Refeference Generator
+
+A pattern is a list of phases, each a row
+
+    [pref_0, ..., pref_N, dref_0, ..., dref_M, tmin]
+
+with the pressure references of the proportional valves, the states of the
+discrete valves and the (minimal) duration of the phase in sec.
+CompiledPattern converts it once, s.t. it can be played without slicing the
+rows again in every phase.
+
+Example:
+    >>> ptrn = CompiledPattern([[.1, .2, True, False, 2.],
+    ...                         [.3, .4, False, True, .5]], n_dvalves=2)
+    >>> ptrn.pressure
+    array([[0.1, 0.2],
+           [0.3, 0.4]])
+    >>> ptrn.dmasks, ptrn.ends
+    ([1, 2], [2.0, 2.5])
+    >>> sorted(ptrn.ref_tasks[1].items())
+    [('0', 0.3), ('1', 0.4)]
 """
 
+import numpy as np
+
 
 n_dvalves = 4
 n_pvalves = 8
 
 
-def generate_walking_ref(pattern, idx):
-    pos = pattern[idx]
-    dv_task, pv_task = {}, {}
+class CompiledPattern(object):
+    """ A pattern as arrays, with the tasks of every phase prepared """
+    def __init__(self, pattern, n_dvalves=n_dvalves):
+        """
+        *Initialize with:*
+
+        Args:
+            pattern (list): the rows of the phases, see above
+            n_dvalves (int): number of discrete valves, the rest of the row
+                are the proportional valves
+        """
+        self.pattern = pattern
+        self.n_phases = len(pattern)
+        self.n_dvalves = n_dvalves
+        self.n_pvalves = len(pattern[0]) - 1 - n_dvalves
+        n_p = self.n_pvalves
+
+        # [phase, valve]
+        self.pressure = np.array([pos[:n_p] for pos in pattern], dtype=float)
+        # bit jdx of a mask is the state of discrete valve jdx
+        self.dmasks = [sum([1 << jdx for jdx, dp in enumerate(pos[n_p:-1])
+                            if dp]) for pos in pattern]
+        self.durations = [float(pos[-1]) for pos in pattern]
+        # end of every phase, from the start of the pattern
+        self.ends = np.cumsum(self.durations).tolist()
+
+        # to update cargo.ref_task and cargo.dvalve_task in place
+        self.ref_tasks = [
+            dict([(str(kdx), pp) for kdx, pp in enumerate(row)])
+            for row in self.pressure.tolist()]
+        self.dvalve_tasks = [
+            dict([(str(jdx), bool(mask >> jdx & 1))
+                  for jdx in range(n_dvalves)]) for mask in self.dmasks]
 
-    local_min_process_time = pos[-1]
-    dpos = pos[-n_dvalves-1:-1]
-    ppos = pos[:n_pvalves]
-    for jdx, dp in enumerate(dpos):
-        dv_task[str(jdx)] = dp
-    for kdx, pp in enumerate(ppos):
-        pv_task[str(kdx)] = pp
-#    time.sleep(local_min_process_time)
+    def __len__(self):
+        return self.n_phases
+
+    def dvalve_state(self, idx, jdx):
+        """
+        Args:
+            idx (int): phase
+            jdx (int): discrete valve
+
+        Returns:
+            (bool): state of the discrete valve in the phase
+        """
+        return bool(self.dmasks[idx] >> jdx & 1)
+
+    def phase_refs(self, valve_idx):
+        """
+        The references of some proportional valves for every phase.
+
+        Args:
+            valve_idx (list of int): columns of the valves, e.g. the indices
+                of cargo.valve
+
+        Returns:
+            (list): per phase, the list of references in the order of
+                *valve_idx*
+        """
+        return self.pressure[:, valve_idx].tolist()
+
+
+def generate_walking_ref(pattern, idx):
+    """
+    The tasks of phase *idx*.
 
-    return dv_task, pv_task, local_min_process_time
+    Args:
+        pattern (list or CompiledPattern): the pattern
+        idx (int): phase
 
+    Returns:
+        (dict): states of the discrete valves
+        (dict): pressure references of the proportional valves
+        (float): min duration of the phase in sec
+    """
+    if not isinstance(pattern, CompiledPattern):
+        pattern = CompiledPattern(pattern)
+    return (dict(pattern.dvalve_tasks[idx]), dict(pattern.ref_tasks[idx]),
+            pattern.durations[idx])
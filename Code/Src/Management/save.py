@@ -15,6 +15,8 @@ import matplotlib.pyplot as plt
 from matplotlib2tikz import save as tikz_save
 import fileinput
 
+from Src.Management import session
+
 
 def save_recorded_data(data, filename):
     """ save the recorded data from GlobalData object to .h5 file  """
@@ -61,8 +63,10 @@ def save_current_plot_as_tikz(toplevel, filename):
 
 
 def load_data(data, filename):
-    """ Reading data back """
+    """ Reading data back, also a (partial) session.SessionRecorder file """
     data.flag['PAUSE'] = True
+    if session.is_session(filename):
+        return session.load(filename)
     return_data = deepdish.io.load(filename)
     return return_data
 
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Fixed-rate scheduler for the control loop.
+
+Instead of sleeping *sampling_time* after every iteration (which makes the
+real period sampling_time + time for reading/computing/writing), the loop
+is released at absolute deadlines on a monotonic clock:
+
+    t_k = t_0 + k*period
+
+Example:
+    >>> loop = LoopScheduler(.001, policy='skip')
+    >>> loop.start('PAUSE')
+    >>> for _ in range(3):
+    ...     # read -> compute -> write
+    ...     release = loop.wait()
+    >>> loop.stats['PAUSE'].ticks
+    3
+"""
+import time
+
+from Src.Management import clock
+from Src.Management import exception
+
+
+POLICIES = ['skip', 'catchup']
+
+
+class TickStats(object):
+    """ Timing statistics of the loop for one tag (i.e. state) """
+    def __init__(self, tag):
+        self.tag = tag
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.jitter = 0
+        self.max_latency = 0.
+        self.max_busy = 0.
+
+    def as_dict(self):
+        return {'ticks': self.ticks, 'overruns': self.overruns,
+                'skipped': self.skipped, 'jitter': self.jitter,
+                'max_latency': self.max_latency, 'max_busy': self.max_busy}
+
+    def __str__(self):
+        return ('[{}] ticks: {}, overruns: {}, skipped: {}, jitter: {}, '
+                'max latency: {:.6f} s, max busy: {:.6f} s'.format(
+                    self.tag, self.ticks, self.overruns, self.skipped,
+                    self.jitter, self.max_latency, self.max_busy))
+
+
+class LoopScheduler(object):
+    """
+    Release a loop at a fixed rate with absolute deadlines and count
+    overruns and jitter per tag.
+    """
+    def __init__(self, period, policy='skip', jitter_tol=None,
+                 clock=clock.monotonic, sleep=time.sleep):
+        """
+        Args:
+            period (float): sampling time of the loop in sec
+            policy (str): what to do if a deadline was missed:
+
+                ========= = =========================================
+                | skip    = drop missed ticks and realign to the grid
+                | catchup = keep the grid and release the missed ticks
+                |           back to back
+                ========= = =========================================
+
+            jitter_tol (float): release latency in sec counted as jitter.
+                Default is 10 percent of *period*.
+            clock (callable): monotonic time source in sec
+            sleep (callable): function to sleep for a given time in sec
+        """
+        if policy not in POLICIES:
+            raise exception.ArgumentError(
+                'policy must be one of {}'.format(POLICIES))
+        self.period = period
+        self.policy = policy
+        self.jitter_tol = jitter_tol
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = {}
+        self.current = None
+        self.deadline = None
+        self.released = None
+
+    def start(self, tag):
+        """
+        (Re)start the grid of deadlines at now. All statistics are
+        collected under *tag* until the next call of start.
+
+        Args:
+            tag (str): name the statistics are collected under, e.g. state
+        """
+        if tag not in self.stats:
+            self.stats[tag] = TickStats(tag)
+        self.current = self.stats[tag]
+        self.released = self.clock()
+        self.deadline = self.released + self.period
+
+    def wait(self, period=None):
+        """
+        Block until the next tick is released.
+
+        Args:
+            period (float): change the sampling time from this tick on
+
+        Returns:
+            (float): time at which the tick was released
+        """
+        if period is not None:
+            self.period = period
+        stats = self.current
+        now = self.clock()
+        busy = now - self.released
+        if busy > stats.max_busy:
+            stats.max_busy = busy
+        stats.ticks += 1
+
+        deadline = self.deadline
+        if now < deadline:
+            self.sleep(deadline - now)
+            now = self.clock()
+        else:
+            stats.overruns += 1
+            if self.policy == 'skip':
+                missed = int((now - deadline) // self.period)
+                stats.skipped += missed
+                deadline += missed*self.period
+        latency = now - deadline
+        if latency > stats.max_latency:
+            stats.max_latency = latency
+        tol = self.jitter_tol if self.jitter_tol is not None else \
+            .1*self.period
+        if latency > tol:
+            stats.jitter += 1
+
+        self.released = now
+        self.deadline = deadline + self.period
+        return now
+
+    def report(self, tag=None):
+        """
+        Args:
+            tag (str): only report this tag. Default: all
+
+        Returns:
+            (str): human readable timing statistics
+        """
+        tags = [tag] if tag is not None else sorted(self.stats)
+        return '\n'.join([str(self.stats[t]) for t in tags if t in self.stats])
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Record a session to a .h5 file while it runs.
+
+requirements:
+pip install h5py
+
+Samples are collected in a buffer of fixed size and appended to resizable,
+chunked and compressed datasets (one per key plus 'time') whenever the
+buffer is full or *flush_interval* has passed. Hence the memory is bounded
+and if the process dies, at most the last *flush_interval* is lost.
+
+Layout of the file:
+
+    ========== = ==================================================
+    | attrs    = format: FORMAT, start_time: time.time() at start
+    | time     = float64[n], time of the sample since start
+    | <key>    = float64[n], value of <key>, nan if not recorded
+    ========== = ==================================================
+
+Keys which appear later in the session are filled up with nan.
+"""
+
+import time
+
+import h5py
+import numpy as np
+
+
+FORMAT = 'geckobot-session'
+TIME = 'time'
+
+
+class SessionRecorder(object):
+    def __init__(self, filename, chunk_size=1024, flush_interval=5.,
+                 compression='gzip'):
+        """
+        *Initialize with:*
+
+        Args:
+            filename (str): the .h5 file (is overwritten)
+            chunk_size (int): number of samples buffered in RAM
+            flush_interval (float): write at least every flush_interval sec
+            compression (str): compression of the datasets, e.g. 'gzip',
+                'lzf' or None
+        """
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.file = h5py.File(filename, 'w')
+        self.file.attrs['format'] = FORMAT
+        self.file.attrs['start_time'] = time.time()
+        self.written = 0    # samples in file
+        self.rows = 0       # samples in buffer
+        self.buffer = {TIME: np.empty(chunk_size)}
+        self.last_flush = time.time()
+
+    def _buffer(self, key):
+        buf = self.buffer.get(key)
+        if buf is None:
+            buf = np.empty(self.chunk_size)
+            buf[:self.rows] = np.nan
+            self.buffer[key] = buf
+        return buf
+
+    def append(self, timestamp, *samples):
+        """
+        Record one sample.
+
+        Args:
+            timestamp (float): time of the sample
+            samples (dict): values of the sample, None is stored as nan
+        """
+        row = self.rows
+        recorded = set([TIME])
+        for sample in samples:
+            for key in sample:
+                value = sample[key]
+                self._buffer(key)[row] = np.nan if value is None else value
+                recorded.add(key)
+        for key in self.buffer:
+            if key not in recorded:
+                self.buffer[key][row] = np.nan
+        self.buffer[TIME][row] = timestamp
+        self.rows = row + 1
+        self._flush_if_due()
+
+    def extend(self, channels, samples):
+        """
+        Record a batch of samples.
+
+        Args:
+            channels (list of str): names of the values
+            samples (numpy.ndarray): one row [time, channels...] per sample
+        """
+        start = 0
+        while start < len(samples):
+            stop = min(len(samples), start + self.chunk_size - self.rows)
+            rows = slice(self.rows, self.rows + stop - start)
+            for idx, key in enumerate(channels):
+                self._buffer(key)[rows] = samples[start:stop, idx+1]
+            for key in self.buffer:
+                if key not in channels and key != TIME:
+                    self.buffer[key][rows] = np.nan
+            self.buffer[TIME][rows] = samples[start:stop, 0]
+            self.rows = rows.stop
+            self._flush_if_due()
+            start = stop
+
+    def _flush_if_due(self):
+        if (self.rows == self.chunk_size or
+                time.time() - self.last_flush > self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """ Append the buffer to the file """
+        rows, written = self.rows, self.written
+        if rows:
+            total = written + rows
+            # time last, s.t. its length is the number of complete samples
+            for key in sorted(self.buffer, key=lambda key: key == TIME):
+                dataset = self.file.get(key)
+                if dataset is None:
+                    dataset = self.file.create_dataset(
+                        key, shape=(written,), maxshape=(None,),
+                        dtype='f8', chunks=(self.chunk_size,),
+                        compression=self.compression, fillvalue=np.nan)
+                dataset.resize((total,))
+                dataset[written:total] = self.buffer[key][:rows]
+            self.written = total
+            self.rows = 0
+        self.file.flush()
+        self.last_flush = time.time()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def is_session(filename):
+    """ Check if *filename* was written by a SessionRecorder """
+    try:
+        with h5py.File(filename, 'r') as fobj:
+            return fobj.attrs.get('format') == FORMAT
+    except IOError:
+        return False
+
+
+def load(filename):
+    """
+    Read a session, also a partial one, i.e. of a crashed process.
+
+    Returns:
+        (dict): {key: {'val': values, 'len': n}}, including the time of
+            every key as key+'_t', see datamanagement.GUIRecorder.recorded
+    """
+    recorded = {}
+    with h5py.File(filename, 'r') as fobj:
+        # samples beyond 'time' were not completely written
+        size = len(fobj[TIME])
+        time_col = fobj[TIME][:size]
+        for key in fobj:
+            if key == TIME:
+                continue
+            values = fobj[key][:size]
+            recorded[key] = {'val': values, 'len': len(values)}
+            recorded[key+'_t'] = {'val': time_col[:len(values)],
+                                  'len': len(values)}
+    return recorded
@@ -6,21 +6,88 @@ Created on Sun May 29 12:29:56 2016
 
 refered to:
 http://www.python-course.eu/finite_state_machine.php
+
+A handler is called with the cargo and returns the next state and the cargo.
+It can either block as long as it is in its state (run), or do one tick of
+work and return at once (start and step). In the latter case, several
+machines can be driven by one loop, see run_machines.
+
+Example:
+    >>> def count(cargo):
+    ...     cargo.append(len(cargo))
+    ...     return ('count' if len(cargo) < 3 else 'EXIT', cargo)
+    >>> automat = StateMachine()
+    >>> automat.add_state('COUNT', count)
+    >>> automat.add_state('EXIT', None, end_state=True)
+    >>> automat.set_start('COUNT')
+    >>> automat.start([])
+    >>> while automat.step():
+    ...     pass
+    reached  EXIT
+    >>> automat.cargo
+    [0, 1, 2]
+    >>> automat.stats['COUNT'].entries, automat.transitions
+    (1, {('COUNT', 'EXIT'): 1})
 """
 # pylint: disable=bare-except
 
+from __future__ import print_function
 
+from Src.Management import clock
 from Src.Management import exception
 
 
+class StateStats(object):
+    """ How often and how long the machine was in one state """
+    def __init__(self, name):
+        self.name = name
+        self.entries = 0
+        self.dwell = 0.         # [sec] total
+        self.max_dwell = 0.     # [sec] longest single stay
+
+    def as_dict(self):
+        return {'entries': self.entries, 'dwell': self.dwell,
+                'max_dwell': self.max_dwell}
+
+    def __str__(self):
+        return ('[{}] entries: {}, dwell: {:.6f} s, max dwell: {:.6f} s'
+                .format(self.name, self.entries, self.dwell, self.max_dwell))
+
+
 class StateMachine(object):
     """ A simple code snippet that represents a state machine in python """
-    def __init__(self):
+    def __init__(self, clock=clock.monotonic):
+        """
+        *Initialize with:*
+
+        Args:
+            clock (callable): monotonic time source in sec for the dwell times
+        """
         self.handlers = {}
+        self.on_enter = {}
+        self.on_exit = {}
         self.start_state = None
         self.end_states = []
+        self.clock = clock
+        self.names = {}         # name as given: interned upper case name
+        self.stats = {}
+        self.transitions = {}   # (from, to): count
+        self.state = None
+        self.cargo = None
+        self.entered = None     # time the current state was entered
+        self.done = False
+
+    def _name(self, name):
+        """ The interned upper case of *name*, str.upper only on its first
+        appearance """
+        try:
+            return self.names[name]
+        except KeyError:
+            self.names[name] = intern(name.upper())
+            return self.names[name]
 
-    def add_state(self, name, handler, end_state=False):
+    def add_state(self, name, handler, end_state=False, on_enter=None,
+                  on_exit=None):
         """ Adds an state to the state machine.
 
         Args:
@@ -30,9 +97,18 @@ class StateMachine(object):
                 cargo, where cargo is something which is transported from state
                 to state.
             - end_state (Optional bool): Defines if added state is end_state
+            - on_enter (Optional callable): function(cargo), called when the
+                state is entered
+            - on_exit (Optional callable): function(cargo), called when the
+                state is left
         """
-        name = name.upper()
+        name = self._name(name)
         self.handlers[name] = handler
+        self.stats[name] = StateStats(name)
+        if on_enter:
+            self.on_enter[name] = on_enter
+        if on_exit:
+            self.on_exit[name] = on_exit
         if end_state:
             self.end_states.append(name)
 
@@ -41,28 +117,100 @@ class StateMachine(object):
         Args:
             - name (str): Set an already added state to start_state
         """
-        self.start_state = name.upper()
+        self.start_state = self._name(name)
 
-    def run(self, cargo):
+    def start(self, cargo):
         """
-        Run the Automaton.
+        Enter the start state, s.t. the machine can be driven by step().
 
         Args:
             - cargo (object): the things that are manipulating the statemachine
         """
-        try:
-            handler = self.handlers[self.start_state]
-        except:
+        if self.start_state not in self.handlers:
             raise exception.InitializationError(
                 "must call .set_start() before .run()")
         if not self.end_states:
             raise exception.InitializationError(
                 "at least 1 state must be an end_state")
+        self.cargo = cargo
+        self.done = False
+        self.state = None
+        self._enter(self.start_state, self.clock())
+
+    def step(self):
+        """
+        Call the handler of the current state once and switch to the state
+        it returned.
+
+        Returns:
+            (bool): False once an end state is reached
+        """
+        (new_state, self.cargo) = self.handlers[self.state](self.cargo)
+        new_state = self._name(new_state)
+        if new_state is not self.state:
+            if new_state not in self.handlers:
+                raise exception.ArgumentError(
+                    'unknown state {}'.format(new_state))
+            now = self.clock()
+            self._exit(now)
+            key = (self.state, new_state)
+            self.transitions[key] = self.transitions.get(key, 0) + 1
+            self._enter(new_state, now)
+        return not self.done
+
+    def run(self, cargo):
+        """
+        Run the Automaton.
+
+        Args:
+            - cargo (object): the things that are manipulating the statemachine
+        """
+        self.start(cargo)
+        while self.step():
+            pass
+
+    def _enter(self, name, now):
+        self.state = name
+        self.entered = now
+        self.stats[name].entries += 1
+        if name in self.on_enter:
+            self.on_enter[name](self.cargo)
+        if name in self.end_states:
+            print("reached ", name)
+            self.done = True
+
+    def _exit(self, now):
+        name = self.state
+        if name in self.on_exit:
+            self.on_exit[name](self.cargo)
+        stats = self.stats[name]
+        dwell = now - self.entered
+        stats.dwell += dwell
+        if dwell > stats.max_dwell:
+            stats.max_dwell = dwell
+
+    def report(self):
+        """
+        Returns:
+            (str): human readable dwell times and transition counts
+        """
+        lines = [str(self.stats[name]) for name in sorted(self.stats)
+                 if self.stats[name].entries]
+        lines += ['{} -> {}: {}'.format(src, dst, count) for (src, dst), count
+                  in sorted(self.transitions.items())]
+        return '\n'.join(lines)
+
+
+def run_machines(machines, wait):
+    """
+    Drive several started machines with tick based handlers by one loop.
 
-        while True:
-            (new_state, cargo) = handler(cargo)
-            if new_state.upper() in self.end_states:
-                print("reached ", new_state)
-                break
-            else:
-                handler = self.handlers[new_state.upper()]
+    Args:
+        machines (list of StateMachine): already started, see
+            StateMachine.start
+        wait (callable): called after every round, e.g. LoopScheduler.wait
+    """
+    active = list(machines)
+    while active:
+        active = [automat for automat in active if automat.step()]
+        wait()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Hand tasks from other threads (e.g. the CommunicationThread) to the control
+loop, s.t. the cargo is only changed between two ticks of the loop.
+
+StateHandoff goes the other way: the control loop tells the other threads
+which state it actually is in.
+"""
+
+import Queue
+import threading
+
+from Src.Management import clock
+
+
+STATE_TIMEOUT = 5.  # [sec] max wait of a thread for the control loop
+
+
+class TaskQueue(object):
+    """ Thread safe queue of function calls """
+    def __init__(self):
+        self.queue = Queue.Queue()
+
+    def put(self, func, *args):
+        """
+        Queue the call func(*args). Can be called from any thread.
+
+        Example:
+            >>> tasks = TaskQueue()
+            >>> ref_task = {'0': 0.}
+            >>> tasks.put(ref_task.update, {'0': .5})
+            >>> ref_task
+            {'0': 0.0}
+            >>> tasks.run_pending()
+            1
+            >>> ref_task
+            {'0': 0.5}
+        """
+        self.queue.put((func, args))
+
+    def run_pending(self):
+        """
+        Execute all queued calls in the calling thread (the control loop).
+
+        Returns:
+            (int): number of executed calls
+        """
+        count = 0
+        while True:
+            try:
+                func, args = self.queue.get_nowait()
+            except Queue.Empty:
+                return count
+            func(*args)
+            count += 1
+
+
+class StateHandoff(object):
+    """ The state the control loop is actually in. Other threads can block
+    until a state is reached, instead of polling it.
+
+    Python 2 implements Condition.wait(timeout) by polling, so the waiters
+    block without timeout, and a Timer wakes them at the deadline.
+    Threads which wait in select() instead (e.g. the CommunicationThread)
+    can register a listener, which is called on every set(). """
+    def __init__(self, state):
+        """
+        *Initialize with:*
+
+        Args:
+            state (str): initial state
+        """
+        self.cond = threading.Condition()
+        self.state = state
+        self.listeners = []     # callables(state), called by set()
+
+    def set(self, state):
+        """
+        Set the actual state and wake the waiting threads. Called by the
+        state handlers of the control loop.
+
+        Args:
+            state (str): the state the loop arrived in
+        """
+        with self.cond:
+            self.state = state
+            self.cond.notify_all()
+        for listener in self.listeners:
+            listener(state)
+
+    def _wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def wait(self, state, timeout=None):
+        """
+        Block until the control loop is in *state*.
+
+        Example:
+            >>> handoff = StateHandoff('PAUSE')
+            >>> handoff.wait('USER_CONTROL', timeout=.01)
+            False
+            >>> timer = threading.Timer(.01, handoff.set, ['USER_CONTROL'])
+            >>> timer.start()
+            >>> handoff.wait('USER_CONTROL', timeout=5.)
+            True
+
+        Args:
+            state (str): the awaited state
+            timeout (float): [sec] give up after it, None waits forever
+
+        Returns:
+            (bool): whether the state was reached
+        """
+        if timeout is not None:
+            deadline = clock.monotonic() + timeout
+        with self.cond:
+            while self.state != state:
+                if timeout is None:
+                    self.cond.wait()
+                    continue
+                remaining = deadline - clock.monotonic()
+                if remaining <= 0:
+                    return False
+                timer = threading.Timer(remaining, self._wake)
+                timer.start()
+                try:
+                    self.cond.wait()
+                finally:
+                    timer.cancel()
+            return True
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Preallocated ring buffer of timestamped samples, i.e. the history of the
+server's recorders (cargo.rec, cargo.rec_u, ...).
+
+There is a single writer (the control loop), which never waits for
+readers. It writes the sample to slot *seq % capacity* and only then
+increments the sequence counter *seq*. A reader copies all samples from its
+last cursor up to *seq* and checks the counter again afterwards; samples
+which may have been overwritten in the meantime are dropped.
+
+The buffer lives in a mmap. If a filename is given (e.g. in /dev/shm), other
+processes can read the telemetry with *TelemetryRing.attach(filename)*.
+
+Layout of the buffer:
+
+    ======== = =====================================================
+    | header = int64[4]: magic, capacity, number of channels, seq
+    | names  = NAME_LEN bytes per channel
+    | data   = float64[capacity, 1 + number of channels], col 0 is time
+    ======== = =====================================================
+"""
+
+import mmap
+import os
+
+import numpy as np
+
+from Src.Management import clock as clk
+
+
+MAGIC = 0x6765636b6f    # 'gecko'
+HEADER_LEN = 4
+NAME_LEN = 16
+_CAPACITY, _WIDTH, _SEQ = 1, 2, 3
+
+
+def _layout(capacity, n_channels):
+    names_offset = HEADER_LEN*8
+    data_offset = names_offset + n_channels*NAME_LEN
+    data_offset += (-data_offset) % 8
+    size = data_offset + capacity*(1+n_channels)*8
+    return names_offset, data_offset, size
+
+
+class TelemetryRing(object):
+    """ Single-writer ring buffer of timestamped samples """
+    def __init__(self, channels, capacity=4096, filename=None, _buf=None):
+        """
+        Args:
+            channels (list of str): names of the channels of a sample
+            capacity (int): number of samples the ring holds
+            filename (str): if given, the ring is mapped to this file, so it
+                can be read from other processes. Otherwise it is anonymous.
+
+        Example:
+            >>> ring = TelemetryRing(['0', 'u0'], capacity=8)
+            >>> ring.push(.1, [.5, .2])
+            >>> ring.push(.2, [.6, None])
+            >>> cursor, samples = ring.read(0)
+            >>> cursor, samples.tolist()
+            (2, [[0.1, 0.5, 0.2], [0.2, 0.6, nan]])
+        """
+        self.channels = list(channels)
+        self.capacity = capacity
+        n_channels = len(self.channels)
+        names_offset, data_offset, size = _layout(capacity, n_channels)
+        self.filename = filename
+
+        if _buf is not None:
+            self.buf = _buf
+        elif filename is not None:
+            with open(filename, 'w+b') as fobj:
+                fobj.truncate(size)
+                self.buf = mmap.mmap(fobj.fileno(), size)
+        else:
+            self.buf = mmap.mmap(-1, size)
+
+        self.header = np.ndarray((HEADER_LEN,), np.int64, buffer=self.buf)
+        self.data = np.ndarray((capacity, 1+n_channels), np.float64,
+                               buffer=self.buf, offset=data_offset)
+        if _buf is None:
+            names = ''.join([name[:NAME_LEN].ljust(NAME_LEN, '\0')
+                             for name in self.channels])
+            self.buf[names_offset:names_offset+len(names)] = names.encode()
+            self.header[_CAPACITY] = capacity
+            self.header[_WIDTH] = n_channels
+            self.header[_SEQ] = 0
+            self.header[0] = MAGIC
+
+    @classmethod
+    def attach(cls, filename):
+        """
+        Open a ring which is written by another process (read only).
+
+        Args:
+            filename (str): file the ring was created with
+        """
+        with open(filename, 'rb') as fobj:
+            size = os.fstat(fobj.fileno()).st_size
+            buf = mmap.mmap(fobj.fileno(), size, access=mmap.ACCESS_READ)
+        header = np.ndarray((HEADER_LEN,), np.int64, buffer=buf)
+        if header[0] != MAGIC:
+            raise IOError('{} is no telemetry ring'.format(filename))
+        capacity, n_channels = int(header[_CAPACITY]), int(header[_WIDTH])
+        names_offset = _layout(capacity, n_channels)[0]
+        names = buf[names_offset:names_offset+n_channels*NAME_LEN]
+        names = str(names.decode())
+        channels = [names[idx*NAME_LEN:(idx+1)*NAME_LEN].rstrip('\0')
+                    for idx in range(n_channels)]
+        return cls(channels, capacity, filename, _buf=buf)
+
+    @property
+    def seq(self):
+        """ Number of samples written so far """
+        return int(self.header[_SEQ])
+
+    def push(self, timestamp, sample):
+        """
+        Append a sample. Must only be called by the one writer.
+
+        Args:
+            timestamp (float): time of the sample
+            sample (list): value of each channel. None is stored as nan.
+        """
+        seq = self.header[_SEQ]
+        row = self.data[seq % self.capacity]
+        row[0] = timestamp
+        row[1:] = sample
+        self.header[_SEQ] = seq + 1
+
+    def read(self, cursor=0, limit=None):
+        """
+        Get all samples since *cursor*.
+
+        Args:
+            cursor (int): the cursor returned by the last read
+            limit (int): maximal number of samples to return (the oldest)
+
+        Returns:
+            (int): the cursor for the next read
+            (numpy.ndarray): samples, one row [time, channels...] each.
+                If the reader was too slow, the oldest samples are lost,
+                i.e. len(samples) < returned cursor - cursor.
+        """
+        seq = self.seq
+        start = max(cursor, seq - self.capacity + 1)
+        if limit is not None:
+            seq = min(seq, start + limit)
+        if start >= seq:
+            return max(cursor, seq), self.data[:0].copy()
+        samples = self.data[np.arange(start, seq) % self.capacity]
+        # samples older than this may have been overwritten while copying
+        first_valid = self.seq - self.capacity + 1
+        if first_valid > start:
+            samples = samples[min(first_valid, seq)-start:]
+        return seq, samples
+
+
+class RecTelemetry(TelemetryRing):
+    """ Telemetry of a set of recorder dicts, e.g. cargo.rec, cargo.rec_u """
+    def __init__(self, recs, capacity=4096, filename=None,
+                 clock=clk.monotonic):
+        """
+        The channels are the keys of the dicts. Tuple values (e.g. the
+        acceleration of an IMU) get a channel per element, named
+        key_0, key_1, ...
+
+        Args:
+            recs (list of dict): the recorders to sample
+            capacity (int): number of samples the ring holds
+            filename (str): see TelemetryRing
+            clock (function): timestamps samples recorded without time
+        """
+        self.recs = recs
+        self.clock = clock
+        self.keys = []      # (rec, key, length or None)
+        channels = []
+        for rec in recs:
+            for key in sorted(rec):
+                value = rec[key]
+                if isinstance(value, (tuple, list)):
+                    self.keys.append((rec, key, len(value)))
+                    channels += ['{}_{}'.format(key, idx)
+                                 for idx in range(len(value))]
+                else:
+                    self.keys.append((rec, key, None))
+                    channels.append(key)
+        super(RecTelemetry, self).__init__(channels, capacity, filename)
+
+    def record(self, timestamp=None):
+        """ Push the current values of the recorders """
+        if timestamp is None:
+            timestamp = self.clock()
+        sample = []
+        for rec, key, length in self.keys:
+            if length is None:
+                sample.append(rec[key])
+            else:
+                sample.extend(rec[key])
+        self.push(timestamp, sample)
+
+
+class Subscription(object):
+    """ Periodic, decimated reader of a ring, e.g. for a streaming client """
+    def __init__(self, ring, decimation=1, interval=.1, clock=clk.monotonic):
+        """
+        Args:
+            ring (TelemetryRing): the ring to read
+            decimation (int): forward only every *decimation*-th sample
+            interval (float): time between two batches in sec
+            clock (function): time base of *interval*
+        """
+        self.ring = ring
+        self.decimation = max(1, int(decimation))
+        self.interval = interval
+        self.clock = clock
+        self.cursor = ring.seq      # start with the next sample
+        self.due = clock()
+
+    def timeout(self):
+        """ Time until the next batch is due """
+        return max(0., self.due - self.clock())
+
+    def poll(self):
+        """
+        Get the batch if it is due.
+
+        Returns:
+            (int): cursor of the ring after the batch
+            (numpy.ndarray): the decimated samples or None if not due yet
+        """
+        now = self.clock()
+        if now < self.due:
+            return self.cursor, None
+        self.due = max(self.due + self.interval, now)
+        cursor, samples = self.ring.read(self.cursor)
+        # keep the samples with seq % decimation == 0, across batches
+        first = cursor - len(samples)
+        samples = samples[(-first) % self.decimation::self.decimation]
+        self.cursor = cursor
+        return cursor, samples
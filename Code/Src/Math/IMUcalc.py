@@ -49,21 +49,87 @@ import numpy as np
 #    return alpha_IMU, delta
 
 def calc_angle(vec1, vec2, rotate_angle=0., delta_out=False):
-    theta = np.radians(rotate_angle)
-    vec1 = rotate(vec1, theta)
-    x1, y1, z1 = normalize(vec1)
-    x2, y2, z2 = normalize(vec2)
-    phi1 = np.arctan2(y1, x1)
-    vec2 = rotate([x2, y2, 0], -phi1+np.pi*.5)
-    phi2 = np.degrees(np.arctan2(vec2[1], vec2[0]))
+    """
+    Angle between two IMUs, see calc_angles.
 
-    alpha_IMU = -phi2+90
+    Args:
+        vec1 (tuple): acceleration of the first IMU, turned by rotate_angle
+        vec2 (tuple): acceleration of the second IMU
+        rotate_angle (float): in deg
+        delta_out (bool): return the inclination delta as well
 
-    if delta_out:
-        z = np.mean([z1, z2])
-        delta = np.degrees(np.arccos(z))
+    Returns:
+        (float): alpha in deg (and delta in deg if delta_out)
+    """
+    alpha, delta = calc_angles([vec1, vec2], [[0, 1]], [rotate_angle], True)
+    return alpha[0] if not delta_out else (alpha[0], delta[0])
 
-    return alpha_IMU if not delta_out else (alpha_IMU, delta)
+
+class JointAngles(object):
+    """ Angles of several IMU pairs, with the rotations precomputed """
+    def __init__(self, pairs, rot_angles):
+        """
+        *Initialize with:*
+
+        Args:
+            pairs (list): [idx0, idx1] of every joint, i.e. the rows of the
+                acceleration matrix. The acc of idx0 is turned by rot_angle.
+            rot_angles (list of float): rotation of idx0 around z in deg
+        """
+        pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+        self.idx0 = pairs[:, 0]
+        self.idx1 = pairs[:, 1]
+        theta = np.radians(np.asarray(rot_angles, dtype=float))
+        self.cos = np.cos(theta)
+        self.sin = np.sin(theta)
+
+    def calc(self, acc, delta_out=False):
+        """
+        Args:
+            acc (numpy.ndarray): acceleration of every IMU, shape (n_imu, 3)
+            delta_out (bool): return the inclinations as well
+
+        Returns:
+            (numpy.ndarray): alpha of every pair in deg
+            (numpy.ndarray): delta of every pair in deg, if delta_out
+        """
+        acc = np.asarray(acc, dtype=float)
+        vec1 = acc[self.idx0]
+        vec2 = acc[self.idx1]
+        # turn vec1 by rot_angle, then vec2 s.t. vec1 points to y
+        x1 = self.cos*vec1[:, 0] - self.sin*vec1[:, 1]
+        y1 = self.sin*vec1[:, 0] + self.cos*vec1[:, 1]
+        gamma = np.pi*.5 - np.arctan2(y1, x1)
+        c, s = np.cos(gamma), np.sin(gamma)
+        x2, y2 = vec2[:, 0], vec2[:, 1]
+        alpha = 90. - np.degrees(np.arctan2(s*x2 + c*y2, c*x2 - s*y2))
+        if not delta_out:
+            return alpha
+        z1 = vec1[:, 2]/np.sqrt((vec1**2).sum(axis=1))
+        z2 = vec2[:, 2]/np.sqrt((vec2**2).sum(axis=1))
+        delta = np.degrees(np.arccos((z1 + z2)*.5))
+        return alpha, delta
+
+
+def calc_angles(acc_matrix, pairs, rot_angles, delta_out=False):
+    """
+    Angles of several IMU pairs in one pass.
+
+    Example:
+        >>> acc = [[0., 1., 1.], [1., 0., 1.]]
+        >>> calc_angles(acc, [[0, 1]], [-90.]).tolist()
+        [0.0]
+
+    Args:
+        acc_matrix (numpy.ndarray): acceleration of every IMU (n_imu, 3)
+        pairs (list): [idx0, idx1] of every joint
+        rot_angles (list of float): rotation of idx0 around z in deg
+        delta_out (bool): return the inclinations as well
+
+    Returns:
+        see JointAngles.calc
+    """
+    return JointAngles(pairs, rot_angles).calc(acc_matrix, delta_out)
 
 
 def normalize(vec):
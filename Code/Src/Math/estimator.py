@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Estimate the joint angles by fusing the angle calculated from the
+accelerometers (IMUcalc.JointAngles.calc, noisy, but without drift) with
+the joint rate measured by the gyros (smooth, but drifting).
+
+All filters treat the joints as a vector, keep their state in preallocated
+arrays and cost the same for every sample:
+
+    >>> est = ComplementaryFilter(2, tau=.1)
+    >>> est.update(np.array([10., 20.]), np.zeros(2), .001).tolist()
+    [10.0, 20.0]
+
+Angles are in deg and rates in deg/s. Innovations are wrapped to
+(-180, 180], s.t. the estimate does not jump if the angle does.
+"""
+
+import numpy as np
+
+
+GYRO_LSB = 131.     # LSB per deg/s of the MPU-9150 at +-250 deg/s
+
+
+def joint_rates(gyro, pairs):
+    """
+    Rate of the angle alpha (see IMUcalc.calc_angle) of every joint.
+
+    The angle is measured in the x-y plane of the IMUs, so it changes with
+    the difference of their angular velocities around z.
+
+    Args:
+        gyro (numpy.ndarray): raw angular velocity of every IMU (n_imu, 3)
+        pairs (IMUcalc.JointAngles): the joints
+
+    Returns:
+        (numpy.ndarray): rate of every joint in deg/s
+    """
+    return (gyro[pairs.idx1, 2] - gyro[pairs.idx0, 2])/GYRO_LSB
+
+
+def wrap(angle):
+    """ Wrap *angle* [deg] to (-180, 180] """
+    return 180. - np.mod(180. - angle, 360.)
+
+
+class ComplementaryFilter(object):
+    """ High pass the integrated rate, low pass the measured angle """
+    def __init__(self, n, tau=.1):
+        """
+        *Initialize with:*
+
+        Args:
+            n (int): number of joints
+            tau (float): time constant of the crossover in sec
+        """
+        self.tau = tau
+        self.angle = np.zeros(n)
+        self.initialized = False
+
+    def reset_state(self):
+        self.angle[:] = 0
+        self.initialized = False
+
+    def update(self, measured, rate, dt):
+        """
+        Args:
+            measured (numpy.ndarray): angle of every joint from the acc
+            rate (numpy.ndarray): rate of every joint from the gyros
+            dt (float): time since the last update in sec
+
+        Returns:
+            (numpy.ndarray): estimated angle of every joint (the state, do
+                not modify)
+        """
+        if not self.initialized:
+            self.angle[:] = measured
+            self.initialized = True
+            return self.angle
+        gain = dt/(self.tau + dt)
+        self.angle += rate*dt
+        self.angle += gain*wrap(measured - self.angle)
+        return self.angle
+
+
+class KalmanFilter(object):
+    """ Kalman filter with the states angle and gyro bias per joint """
+    def __init__(self, n, q_angle=.001, q_bias=.003, r_measure=.03):
+        """
+        *Initialize with:*
+
+        Args:
+            n (int): number of joints
+            q_angle (float): process noise of the angle
+            q_bias (float): process noise of the bias of the rate
+            r_measure (float): noise of the measured angle
+        """
+        self.q_angle = q_angle
+        self.q_bias = q_bias
+        self.r_measure = r_measure
+        self.angle = np.zeros(n)
+        self.bias = np.zeros(n)
+        self.P = np.zeros((4, n))   # covariance [P00, P01, P10, P11]
+        self.initialized = False
+
+    def reset_state(self):
+        self.angle[:] = 0
+        self.bias[:] = 0
+        self.P[:] = 0
+        self.initialized = False
+
+    def update(self, measured, rate, dt):
+        """
+        Args:
+            measured (numpy.ndarray): angle of every joint from the acc
+            rate (numpy.ndarray): rate of every joint from the gyros
+            dt (float): time since the last update in sec
+
+        Returns:
+            (numpy.ndarray): estimated angle of every joint (the state, do
+                not modify)
+        """
+        if not self.initialized:
+            self.angle[:] = measured
+            self.initialized = True
+            return self.angle
+        P00, P01, P10, P11 = self.P
+        # predict
+        self.angle += dt*(rate - self.bias)
+        P00 += dt*(dt*P11 - P01 - P10 + self.q_angle)
+        P01 -= dt*P11
+        P10 -= dt*P11
+        P11 += dt*self.q_bias
+        # correct
+        gain0 = P00/(P00 + self.r_measure)
+        gain1 = P10/(P00 + self.r_measure)
+        innovation = wrap(measured - self.angle)
+        self.angle += gain0*innovation
+        self.bias += gain1*innovation
+        P00_, P01_ = P00.copy(), P01.copy()
+        P00 -= gain0*P00_
+        P01 -= gain0*P01_
+        P10 -= gain1*P00_
+        P11 -= gain1*P01_
+        return self.angle
+
+
+FILTERS = {'complementary': ComplementaryFilter, 'kalman': KalmanFilter}
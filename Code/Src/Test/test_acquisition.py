@@ -0,0 +1,75 @@
+""" Tests for the sensor acquisition threads"""
+
+import errno
+import unittest
+
+import numpy as np
+
+from Src.Hardware import acquisition
+
+
+class FakeBank(object):
+    """ Bank whose sweep returns the number of the sweep """
+    names = ['0', '1', '2']
+
+    def __init__(self, error_at=None):
+        self.count = 0
+        self.error_at = error_at
+        self.failed = []
+
+    def sweep(self):
+        self.count += 1
+        if self.error_at and self.count >= self.error_at:
+            raise IOError(errno.EIO, 'bus error')
+        return np.ones(3)*self.count
+
+
+# pylint: disable=R0904
+class TestAcquisition(unittest.TestCase):
+    """ Tests for DoubleBuffer and Sampler"""
+
+    def test_double_buffer(self):
+        """read copies the latest complete write"""
+        buf = acquisition.DoubleBuffer((2,))
+        out = np.zeros(2)
+        self.assertEqual(buf.read(out), (0, None, ()))
+        buf.write([1., 1.], 10., ['0'])
+        buf.write([2., 2.], 11.)
+        self.assertEqual(buf.read(out), (2, 11., ()))
+        self.assertEqual(out.tolist(), [2., 2.])
+
+    def test_sampler(self):
+        """The sweeps are consistent and errors reach the reader"""
+        bank = FakeBank()
+        sampler = acquisition.Sampler('test', bank, period=.001)
+        sampler.start()
+        self.assertTrue(sampler.wait_first())
+        out = np.zeros(3)
+        sampler.read(out)
+        self.assertEqual(len(set(out.tolist())), 1)
+        bank.error_at = bank.count + 1
+        sampler.join(5.)
+        self.assertFalse(sampler.is_alive())
+        self.assertRaises(IOError, sampler.read, out)
+        sampler.stop()
+
+
+    def test_virtual_time(self):
+        """The sampler sleeps with the sleep of its clock"""
+        now = [0.]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        bank = FakeBank(error_at=4)
+        sampler = acquisition.Sampler('test', bank, period=.5,
+                                      clock=lambda: now[0], sleep=sleep)
+        sampler.run()
+        self.assertEqual(sleeps, [.5, .5])
+        self.assertEqual(sampler.buffer.read(np.zeros(3))[:2], (2, .5))
+
+
+if __name__ == '__main__':
+    unittest.main()
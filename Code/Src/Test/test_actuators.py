@@ -0,0 +1,107 @@
+""" Tests for the actuators on the simulated hardware"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+os.environ['GECKOBOT_BACKEND'] = 'sim'
+
+from Src.Hardware import actuators   # noqa: E402
+from Src.Hardware import backend   # noqa: E402
+from Src.Hardware import simulation   # noqa: E402
+from Src.Hardware import sysfs   # noqa: E402
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestValve(unittest.TestCase):
+    """ Tests for the write coalescing of Valve.set_pwm"""
+
+    def test_deadband(self):
+        """Changes within the deadband are not written"""
+        valve = actuators.Valve('0', 'P_test_valve', deadband=.5)
+        chamber = backend.plant.chamber('P_test_valve')
+        for duty_cycle in [20., 20., 20.4, 19.6, 21., 21.]:
+            valve.set_pwm(duty_cycle)
+        self.assertEqual(chamber.duty_cycle, 21.)
+        self.assertEqual(valve.write_stats(),
+                         {'issued': 2, 'suppressed': 4})
+        valve.set_pwm(21.2, force=True)
+        self.assertEqual(chamber.duty_cycle, 21.2)
+        self.assertEqual(valve.writes, 3)
+
+    def test_cleanup(self):
+        """After a cleanup, the next duty cycle is written in any case"""
+        valve = actuators.Valve('0', 'P_test_cleanup')
+        valve.set_pwm(10.)
+        self.assertEqual(valve.suppressed, 1)
+        valve.cleanup()
+        valve.set_pwm(10.)
+        self.assertEqual(valve.write_stats(),
+                         {'issued': 1, 'suppressed': 1})
+
+
+# pylint: disable=R0904
+class TestSysfs(unittest.TestCase):
+    """ Tests for SysfsPWM and SysfsGPIO on a fake sysfs"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.fake = simulation.FakeSysfs(self.root)
+        self.pwm = sysfs.SysfsPWM(self.root)
+        self.gpio = sysfs.SysfsGPIO(self.root)
+
+    def tearDown(self):
+        self.pwm.cleanup()
+        self.gpio.cleanup()
+        shutil.rmtree(self.root)
+
+    def test_pwm(self):
+        """The duty cycle is written in ns of the period"""
+        for pin in sysfs.PWM_PINS:
+            self.pwm.start(pin, 10., 25000)
+            self.assertEqual([self.fake.read(pin, name) for name in
+                              ['period', 'duty_cycle', 'enable']],
+                             ['40000', '4000', '1'])
+        self.pwm.set_duty_cycle('P9_42', 50.5)
+        self.assertEqual(self.fake.read('P9_42', 'duty_cycle'), '20200')
+        self.pwm.set_duty_cycle('P9_42', 0.)
+        self.assertEqual(self.fake.read('P9_42', 'duty_cycle'), '0')
+        self.assertEqual(self.fake.read('P9_28', 'duty_cycle'), '4000')
+        self.assertRaises(ValueError, self.pwm.set_duty_cycle, 'P9_42', 101)
+        self.pwm.set_frequency('P9_42', 50000)
+        self.pwm.set_duty_cycle('P9_42', 50.)
+        self.assertEqual(self.fake.read('P9_42', 'period'), '20000')
+        self.assertEqual(self.fake.read('P9_42', 'duty_cycle'), '10000')
+        self.pwm.stop('P9_42')
+        self.assertEqual(self.fake.read('P9_42', 'enable'), '0')
+
+    def test_gpio(self):
+        """Outputs start low and follow output()"""
+        self.gpio.setup('P8_7', self.gpio.OUT)
+        self.assertEqual(self.fake.read('P8_7', 'direction'), 'low')
+        self.gpio.output('P8_7', self.gpio.HIGH)
+        self.assertEqual(self.fake.read('P8_7', 'value'), '1')
+        self.assertEqual(self.gpio.input('P8_7'), 1)
+        self.gpio.output('P8_7', False)
+        self.assertEqual(self.fake.read('P8_7', 'value'), '0')
+        self.assertRaises(ValueError, self.gpio.setup, 'P9_99', 1)
+
+    def test_valves(self):
+        """Valve and DiscreteValve work the same with the sysfs driver"""
+        pwm, gpio = actuators.PWM, actuators.GPIO
+        actuators.PWM, actuators.GPIO = self.pwm, self.gpio
+        try:
+            valve = actuators.Valve('0', 'P9_22')
+            valve.set_pwm(20.)
+            dvalve = actuators.DiscreteValve('0', 'P8_10')
+            dvalve.set_state(True)
+        finally:
+            actuators.PWM, actuators.GPIO = pwm, gpio
+        self.assertEqual(self.fake.read('P9_22', 'duty_cycle'), '8000')
+        self.assertEqual(self.fake.read('P8_10', 'value'), '1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+""" Tests for the multi-client server of the communication thread"""
+
+import select
+import socket
+import time
+import unittest
+
+from Src.Communication import client_commands
+from Src.Communication import communication_thread as comm
+from Src.Communication import protocol
+from Src.Management import tasks
+from Src.Management import telemetry
+
+
+class FakeCargo(object):
+    def __init__(self):
+        self.state = 'PAUSE'
+        self.handoff = tasks.StateHandoff('PAUSE')
+        self.sampling_time = .01
+        self.tasks = tasks.TaskQueue()
+        self.telemetry = telemetry.TelemetryRing(['0'], capacity=16)
+        self.maxpressure = 1.
+        self.sens = []
+        self.ref_task = {'0': 0.}
+
+    @property
+    def actual_state(self):
+        return self.handoff.state
+
+
+# pylint: disable=R0904
+class TestCommunicationThread(unittest.TestCase):
+    """ Tests for CommunicationThread with clients on the loopback"""
+
+    def setUp(self):
+        self.cargo = FakeCargo()
+        # no init_connection(), it binds the fixed port of the robot
+        self.thread = comm.CommunicationThread.__new__(
+            comm.CommunicationThread)
+        self.thread.cargo = self.cargo
+        self.thread.clients = []
+        self.thread.SOCK = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.thread.SOCK.bind(('127.0.0.1', 0))
+        self.thread.SOCK.listen(5)
+        self.thread.init_wakeup()
+        self.conns = []
+        self.poll_time = comm.POLL_TIME
+        comm.POLL_TIME = .001
+        self.state_timeout = comm.STATE_TIMEOUT
+
+    def tearDown(self):
+        comm.POLL_TIME = self.poll_time
+        for conn in self.conns:
+            conn.close()
+        for client in self.thread.clients:
+            client.sock.close()
+        self.thread.SOCK.close()
+        self.thread.close_wakeup()
+        comm.STATE_TIMEOUT = self.state_timeout
+
+    def connect(self):
+        sock = socket.create_connection(self.thread.SOCK.getsockname())
+        sock.settimeout(2.)
+        n_clients = len(self.thread.clients)
+        while len(self.thread.clients) == n_clients:
+            self.thread.serve()
+        conn = protocol.Connection(sock)
+        self.conns.append(conn)
+        return conn, self.thread.clients[-1]
+
+    def serve_until_readable(self, conn, timeout=2.):
+        deadline = time.time() + timeout
+        while (not select.select([conn], [], [], 0)[0] and
+               time.time() < deadline):
+            self.thread.serve()
+
+    def request(self, conn, order):
+        conn.send(order)
+        self.serve_until_readable(conn)
+        return conn.recv()
+
+    def test_roles(self):
+        """The first client controls, set_* of the others are ignored"""
+        conn0, client0 = self.connect()
+        conn1, client1 = self.connect()
+        self.assertEqual((client0.role, client1.role),
+                         ('control', 'read_only'))
+        self.assertEqual(self.request(conn1, [['role', 'control']]),
+                         'read_only')
+        self.assertEqual(self.request(conn1, [['set_maxpressure', 2.]]), 1.)
+        conn1.send([['set_ref', {'0': .5}]])
+        self.assertEqual(self.request(conn1, [['set_maxpressure', 3.]]), 1.)
+        self.assertEqual(self.cargo.tasks.run_pending(), 0)
+        self.assertEqual(self.cargo.ref_task, {'0': 0.})
+        self.assertEqual(self.request(conn0, [['set_maxpressure', 2.]]), 2.)
+        self.assertEqual(self.cargo.tasks.run_pending(), 1)
+        self.assertEqual(self.cargo.maxpressure, 2.)
+
+    def test_lost_control(self):
+        """Losing the controlling client pauses the robot"""
+        conn0, _ = self.connect()
+        conn1, client1 = self.connect()
+        self.cargo.state = 'USER_CONTROL'
+        conn0.close()
+        self.conns.remove(conn0)
+        while len(self.thread.clients) == 2:
+            self.thread.serve()
+        self.assertEqual(self.cargo.state, 'PAUSE')
+        self.assertEqual(self.request(conn1, [['role', 'control']]),
+                         'control')
+        self.assertTrue(client1.control)
+
+    def test_change_state(self):
+        """change_state is answered once the loop reached the state"""
+        conn, client = self.connect()
+        conn.send([['change_state', 'USER_CONTROL']])
+        while client.awaited_state is None:
+            self.thread.serve()
+        self.assertEqual(self.cargo.state, 'USER_CONTROL')
+        conn.sock.settimeout(.05)
+        self.assertRaises(socket.timeout, conn.recv)
+        comm.POLL_TIME = 10.
+        self.cargo.handoff.set('USER_CONTROL')
+        self.thread.serve()     # woken by the handoff, not by POLL_TIME
+        conn.sock.settimeout(2.)
+        self.assertEqual(conn.recv(), 'USER_CONTROL')
+        self.assertIsNone(client.awaited_state)
+
+    def test_change_state_timeout(self):
+        """If the state is not reached, the actual state is answered"""
+        comm.STATE_TIMEOUT = .05
+        conn, client = self.connect()
+        conn.send([['change_state', 'USER_CONTROL']])
+        self.serve_until_readable(conn)
+        self.assertEqual(conn.recv(), 'PAUSE')
+        self.assertIsNone(client.awaited_state)
+
+    def test_delayed_push(self):
+        """Pushes wait while the outbox of a slow client is too large"""
+        conn, client = self.connect()
+        self.assertEqual(self.request(conn, [['subscribe', 1, 0.]]), 1)
+        for k in range(3):
+            self.cargo.telemetry.push(k, [k])
+        client.outbox = ' '*(comm.MAX_OUTBOX + 1)
+        self.thread.push_telemetry(client)
+        self.assertEqual(client.delayed_pushes, 1)
+        self.assertEqual(len(client.outbox), comm.MAX_OUTBOX + 1)
+        client.outbox = ''
+        self.thread.push_telemetry(client)
+        self.thread.flush(client)
+        samples = conn.recv()
+        self.assertTrue(samples.pushed)
+        self.assertEqual(samples.samples[:, 1].tolist(), [0, 1, 2])
+
+    def test_malformed_frame(self):
+        """A client which sends garbage (e.g. a pickle) is dropped"""
+        conn, _ = self.connect()
+        conn.sock.sendall(protocol.frame(protocol.MSG_JSON, '\x80\x02]q'))
+        while self.thread.clients:
+            self.thread.serve()
+        self.assertEqual(self.thread.clients, [])
+
+
+class TestStreamConnection(unittest.TestCase):
+    """ Tests for the client side of a subscription"""
+
+    def test_reader_error(self):
+        """Any error of the reader is raised by recv, it never blocks"""
+        sock0, sock1 = socket.socketpair()
+        try:
+            stream = client_commands.StreamConnection(
+                protocol.Connection(sock0), lambda *args: None)
+            sock1.sendall(protocol.frame(protocol.MSG_JSON, 'no json'))
+            stream.reader.join(2.)
+            self.assertRaises(ValueError, stream.recv)
+            self.assertRaises(ValueError, stream.recv)
+        finally:
+            sock0.close()
+            sock1.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -52,6 +52,42 @@ class TestPidController(unittest.TestCase):
             self.pid_controller.output(ref, sys_out), 100)
 
 
+class TestPidBank(unittest.TestCase):
+    """ Tests for the vectorised bank of PID controllers"""
+
+    def setUp(self):
+        self.gains = [[1.05, 0.03, 0.01], [2., .5, 0.], [.5, 1., .2]]
+        tsampling = .001
+        maxoutput = .5
+        self.bank = controller.PidBank(self.gains, tsampling, maxoutput)
+        self.single = [controller.PidController(gain, tsampling, maxoutput)
+                       for gain in self.gains]
+
+    def test_pid_bank_equals_pid_controller(self):
+        """Check that all channels behave like single PidControllers"""
+        rnd = np.random.RandomState(0)
+        for _ in range(200):
+            ref = rnd.uniform(-1, 1, 3)
+            sys_out = rnd.uniform(-1, 1, 3)
+            out = self.bank.output(ref, sys_out)
+            for idx, ctr in enumerate(self.single):
+                self.assertAlmostEqual(out[idx],
+                                       ctr.output(ref[idx], sys_out[idx]))
+
+    def test_pid_bank_channel_interface(self):
+        """Check per channel gain setting and saturation"""
+        self.assertEqual(len(self.bank), 3)
+        self.assertIsInstance(self.bank[1], controller.PidController)
+        self.bank[1].set_gain([3., 2., 1.])
+        self.assertEqual([self.bank[1].Kp, self.bank[1].Ti,
+                          self.bank[1].Td], [3., 2., 1.])
+        for ctr in self.bank:
+            ctr.set_maxoutput(100)
+        self.assertLessEqual(
+            abs(self.bank[0].output(2, 1)), 99)
+        self.assertEqual(self.bank[0].output(1000, 1), 100)
+
+
 class TestLqriController(unittest.TestCase):
     """ Tests for controllers"""
 
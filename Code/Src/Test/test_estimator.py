@@ -0,0 +1,47 @@
+""" Tests for the joint angle estimators"""
+
+import unittest
+
+import numpy as np
+
+from Src.Math import estimator
+
+
+# pylint: disable=R0904
+class TestEstimator(unittest.TestCase):
+    """ Tests for ComplementaryFilter and KalmanFilter"""
+
+    def track(self, est):
+        """ Track a joint which turns across 180 deg and one at rest """
+        rng = np.random.RandomState(0)
+        truth = np.array([170., -20.])
+        rate = np.array([30., 0.])
+        errors, noise = [], []
+        for k in range(3000):
+            truth = estimator.wrap(truth + rate*.001)
+            measured = truth + rng.randn(2)*3.
+            angle = est.update(measured, rate + rng.randn(2)*.2, .001)
+            if k > 1000:
+                errors.append(estimator.wrap(angle - truth))
+                noise.append(measured - truth)
+        self.assertTrue((np.std(errors, axis=0) <
+                         np.std(noise, axis=0)/5.).all())
+        self.assertTrue((np.abs(np.mean(errors, axis=0)) < .5).all())
+
+    def test_complementary(self):
+        """The complementary filter smoothes the measured angle"""
+        self.track(estimator.ComplementaryFilter(2))
+
+    def test_kalman(self):
+        """The kalman filter smoothes the measured angle"""
+        self.track(estimator.KalmanFilter(2))
+
+    def test_wrap(self):
+        """Angles are wrapped to (-180, 180]"""
+        self.assertEqual(estimator.wrap(np.array([190., -180., 180.,
+                                                  540.])).tolist(),
+                         [-170., 180., 180., 180.])
+
+
+if __name__ == '__main__':
+    unittest.main()
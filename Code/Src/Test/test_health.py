@@ -0,0 +1,48 @@
+""" Tests for the sensor health"""
+
+import unittest
+
+from Src.Hardware import health
+
+
+# pylint: disable=R0904
+class TestSensorHealth(unittest.TestCase):
+    """ Tests for SensorHealth and HealthLog"""
+
+    def setUp(self):
+        self.now = 0.
+        self.health = health.SensorHealth('imu', ['0', '1'], backoff=.01,
+                                          max_backoff=.04,
+                                          clock=lambda: self.now)
+
+    def test_backoff(self):
+        """The backoff doubles up to max_backoff and resets on success"""
+        retries = []
+        for _ in range(5):
+            self.health.failed(0, self.now)
+            retries.append(round(self.health.retry_at[0] - self.now, 6))
+        self.assertEqual(retries, [.01, .02, .04, .04, .04])
+        self.assertFalse(self.health.due(0, self.now + .03))
+        self.assertEqual(self.health.skipped[0], 1)
+        self.health.ok(0, 1.)
+        self.health.failed(0, 1.)
+        self.assertEqual(self.health.retry_at[0], 1.01)
+        stats = self.health.stats(1.5)
+        self.assertEqual((stats['0']['errors'], stats['0']['age']), (6, .5))
+        self.assertEqual(stats['1']['age'], None)
+
+    def test_log(self):
+        """Failures are summarized at most every interval"""
+        lines = []
+        log = health.HealthLog(lines.append, [self.health], interval=1.,
+                               clock=lambda: self.now)
+        for tick in range(2500):
+            self.now = tick*.001
+            self.health.failed(1, self.now)
+            log.check()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('[1] 1001x, age never read', lines[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,191 @@
+""" Tests for the front panel on the simulated GPIO and ADC"""
+
+import logging
+import os
+import threading
+import time
+import unittest
+
+os.environ['GECKOBOT_BACKEND'] = 'sim'
+
+from Src.Communication import hardware_control as HUI   # noqa: E402
+from Src.Hardware import backend   # noqa: E402
+from Src.Management import reference   # noqa: E402
+from Src.Management import tasks   # noqa: E402
+
+
+class FastTime(object):
+    """ time without the blinking of the LEDs """
+    time = staticmethod(time.time)
+
+    @staticmethod
+    def sleep(secs):
+        pass
+
+
+class CountingADC(object):
+    def __init__(self, adc):
+        self.adc = adc
+        self.reads = 0
+
+    def setup(self):
+        pass
+
+    def read(self, pin):
+        self.reads += 1
+        return self.adc.read(pin)
+
+
+class SpyGPIO(object):
+    """ Records the writes to the outputs """
+    def __init__(self, gpio):
+        self.gpio = gpio
+        self.writes = []
+
+    def __getattr__(self, name):
+        return getattr(self.gpio, name)
+
+    def output(self, channel, value):
+        self.writes.append((channel, value))
+        self.gpio.output(channel, value)
+
+
+class FakeWalkingCommander(object):
+    def __init__(self):
+        self.confirm = False
+        self.is_active = False
+        self.user_pattern = False
+        self.ptrndic = {'default': HUI.generate_pattern(*[.5]*8)}
+        self.pattern = self.ptrndic['default']
+
+    @property
+    def pattern(self):
+        return self.compiled.pattern
+
+    @pattern.setter
+    def pattern(self, pattern):
+        self.compiled = reference.CompiledPattern(pattern)
+
+
+class FakeCargo(object):
+    def __init__(self):
+        self.state = 'PAUSE'
+        self.handoff = tasks.StateHandoff('PAUSE')
+        self.sampling_time = .01
+        self.wcomm = FakeWalkingCommander()
+        self.pwm_task = dict([(str(idx), 0.) for idx in range(8)])
+        self.ref_task = dict([(str(idx), 0.) for idx in range(8)])
+        self.dvalve_task = dict([(str(idx), False) for idx in range(4)])
+
+    @property
+    def actual_state(self):
+        return self.handoff.state
+
+    @actual_state.setter
+    def actual_state(self, state):
+        self.handoff.set(state)
+
+    def wait_state(self, state, timeout=None):
+        return self.handoff.wait(state, timeout)
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestHUIThread(unittest.TestCase):
+    """ Buttons by callback, potis once per cycle, LEDs on a change"""
+
+    def setUp(self):
+        self.time, self.gpio, self.adc = HUI.time, HUI.GPIO, HUI.ADC
+        HUI.time = FastTime
+        HUI.GPIO = SpyGPIO(backend.GPIO)
+        HUI.ADC = CountingADC(backend.ADC)
+        for pin in HUI.BTNS + HUI.DISCRETEPRESSUREREF:
+            backend.GPIO.set_input(pin, 0)
+        for pin in HUI.CONTINUOUSPRESSUREREF:
+            backend.ADC.set_input(pin, 0.)
+        self.cargo = FakeCargo()
+        self.hui = HUI.HUIThread(self.cargo, logging.getLogger('test_hui'))
+
+    def tearDown(self):
+        HUI.time, HUI.GPIO, HUI.ADC = self.time, self.gpio, self.adc
+
+    def push(self, btn):
+        backend.GPIO.set_input(btn, 1)
+        backend.GPIO.set_input(btn, 0)
+
+    def cycle(self):
+        """ One pass of run() """
+        self.hui.wake.clear()
+        self.hui.sample_potis()
+        self.hui.get_tasks()
+
+    def test_button_wakes(self):
+        """A pushed button is taken once and wakes the thread"""
+        self.assertFalse(self.hui.wake.is_set())
+        self.push(HUI.PWMREFMODE)
+        self.assertTrue(self.hui.wake.is_set())
+        self.assertTrue(self.hui.take_event(HUI.PWMREFMODE))
+        self.assertFalse(self.hui.take_event(HUI.PWMREFMODE))
+
+    def test_user_control(self):
+        """The potis are read once per cycle, the LEDs on a change only"""
+        self.cargo.actual_state = 'USER_CONTROL'
+        backend.GPIO.set_input(HUI.DISCRETEPRESSUREREF[2], 1)
+        self.push(HUI.PWMREFMODE)
+        del HUI.GPIO.writes[:]
+        HUI.ADC.reads = 0
+        self.cycle()
+        self.assertEqual(self.cargo.state, 'USER_CONTROL')
+        self.assertEqual(HUI.ADC.reads, 2*len(HUI.CONTINUOUSPRESSUREREF))
+        self.assertEqual(len(HUI.GPIO.writes), len(self.hui.leds))
+        self.assertEqual(self.cargo.dvalve_task['2'], True)
+
+        backend.ADC.set_input(HUI.CONTINUOUSPRESSUREREF[1], .423)
+        del HUI.GPIO.writes[:]
+        for _ in range(3):
+            self.cycle()
+        self.assertEqual(HUI.GPIO.writes, [])
+        self.assertEqual(self.cargo.pwm_task['1'], 42.)
+        self.assertEqual(HUI.ADC.reads, 8*len(HUI.CONTINUOUSPRESSUREREF))
+
+    def test_change_state(self):
+        """change_state returns once the loop arrived in the state"""
+        timer = threading.Timer(.05, setattr,
+                                [self.cargo, 'actual_state', 'USER_CONTROL'])
+        timer.start()
+        self.hui.change_state('USER_CONTROL')
+        self.assertEqual(self.cargo.state, 'USER_CONTROL')
+        self.assertEqual(self.cargo.actual_state, 'USER_CONTROL')
+        timer.join()
+        self.cargo.state = 'EXIT'
+        self.hui.change_state('PAUSE')
+        self.assertEqual(self.cargo.state, 'EXIT')
+
+    def test_pattern_ref(self):
+        """The phases of the compiled pattern are set in place"""
+        ref_task, dvalve_task = self.cargo.ref_task, self.cargo.dvalve_task
+        self.cargo.wcomm.pattern = HUI.generate_pattern(
+            *[idx/10. for idx in range(8)])
+        self.assertEqual(self.hui.generate_pattern_ref(), .66)
+        self.assertEqual(self.hui.ptrn_idx, 1)
+        self.assertIs(self.cargo.ref_task, ref_task)
+        self.assertIs(self.cargo.dvalve_task, dvalve_task)
+        self.assertEqual([ref_task[str(idx)] for idx in range(8)],
+                         [0., .1, .2, 0., .25, .5, .6, 0.])
+        self.assertEqual([dvalve_task[str(idx)] for idx in range(4)],
+                         [True, True, True, True])
+
+    def test_potis_not_zero(self):
+        """No change of the state while a poti is turned"""
+        backend.ADC.set_input(HUI.CONTINUOUSPRESSUREREF[0], .5)
+        self.cycle()
+        self.assertTrue(self.hui.potis_changed)
+        self.push(HUI.PRESSUREREFMODE)
+        self.cycle()
+        self.assertFalse(self.hui.potis_changed)
+        self.assertEqual(self.cargo.state, 'PAUSE')
+        self.assertEqual(self.hui.state, 'PAUSE')
+
+
+if __name__ == '__main__':
+    unittest.main()
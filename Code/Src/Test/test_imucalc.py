@@ -0,0 +1,57 @@
+""" Tests for the joint angles from the IMUs"""
+
+import unittest
+
+import numpy as np
+
+from Src.Math import IMUcalc
+
+
+def scalar_angle(vec1, vec2, rotate_angle=0.):
+    """ calc_angle as it was before the vectorisation, one pair at a time """
+    vec1 = IMUcalc.rotate(vec1, np.radians(rotate_angle))
+    x1, y1, z1 = IMUcalc.normalize(vec1)
+    x2, y2, z2 = IMUcalc.normalize(vec2)
+    phi1 = np.arctan2(y1, x1)
+    vec2 = IMUcalc.rotate([x2, y2, 0], -phi1+np.pi*.5)
+    alpha = -np.degrees(np.arctan2(vec2[1], vec2[0])) + 90
+    delta = np.degrees(np.arccos(np.mean([z1, z2])))
+    return alpha, delta
+
+
+def scalar_angles(acc, pairs, rot_angles):
+    angles = [scalar_angle(acc[idx0], acc[idx1], rot)
+              for (idx0, idx1), rot in zip(pairs, rot_angles)]
+    return np.array(angles).T
+
+
+# pylint: disable=R0904
+class TestJointAngles(unittest.TestCase):
+    """ The vectorised JointAngles equals the scalar formula"""
+
+    def assert_scalar(self, acc, pairs, rot_angles):
+        alpha, delta = IMUcalc.JointAngles(pairs, rot_angles).calc(
+            acc, delta_out=True)
+        expected = scalar_angles(acc, pairs, rot_angles)
+        self.assertLess(np.abs(alpha - expected[0]).max(), 1e-12)
+        self.assertLess(np.abs(delta - expected[1]).max(), 1e-12)
+
+    def test_random_pairs(self):
+        """Random accelerations, pairs and rotations"""
+        rand = np.random.RandomState(0)
+        for _ in range(100):
+            acc = rand.randint(-2**15, 2**15, (6, 3)).astype(float)
+            pairs = [rand.choice(6, 2, replace=False) for _ in range(6)]
+            rot_angles = rand.choice([-90., 0., 90., 180.], 6)
+            self.assert_scalar(acc, pairs, rot_angles)
+
+    def test_calc_angle(self):
+        """The scalar interface still works"""
+        acc = [[0., 1., 1.], [1., 0., 1.]]
+        self.assertAlmostEqual(IMUcalc.calc_angle(acc[0], acc[1], -90.), 0.)
+        alpha, delta = IMUcalc.calc_angle(acc[0], acc[1], -90., True)
+        self.assertAlmostEqual(delta, 45.)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+""" Tests for the latency histograms"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from Src.Management import latency
+
+
+# pylint: disable=R0904
+class TestHistogram(unittest.TestCase):
+    """ Tests for Histogram and PhaseTimer"""
+
+    def test_percentiles(self):
+        """Percentiles are the upper edge of their bucket"""
+        hist = latency.Histogram(edges=[10, 100, 1000])
+        for duration in [5]*90 + [50]*9 + [500]:
+            hist.add(duration)
+        self.assertEqual(hist.percentile(50), 10)
+        self.assertEqual(hist.percentile(90), 10)
+        self.assertEqual(hist.percentile(99), 100)
+        self.assertEqual(hist.percentile(100), 500)
+        hist.add(5000)
+        self.assertEqual(hist.counts, [90, 9, 1, 1])
+        self.assertEqual(hist.percentile(100), 5000)
+        self.assertEqual(hist.summary()['max'], 5.)
+
+    def test_phase_timer(self):
+        """toc records the time since the last toc"""
+        ticks = iter(range(0, 10000, 1000))
+
+        def clock_ns():
+            return next(ticks)
+        timer = latency.PhaseTimer(['read', 'write'], clock_ns=clock_ns)
+        start = timer.tic()
+        start = timer.toc('read', start)
+        timer.toc('write', start)
+        self.assertEqual(timer.histograms['read'].total, 1000)
+        self.assertEqual(timer.histograms['write'].total, 1000)
+        self.assertEqual(sorted(timer.summary()), ['read', 'write'])
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'latency.json')
+            timer.dump(filename)
+            with open(filename) as fobj:
+                data = json.load(fobj)
+            self.assertEqual(data['phases']['read']['summary']['count'], 1)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
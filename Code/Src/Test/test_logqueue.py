@@ -0,0 +1,68 @@
+""" Tests for the asynchronous logging"""
+
+import logging
+import threading
+import unittest
+
+from Src.Management import logqueue
+
+
+class SlowHandler(logging.Handler):
+    """ Collects the messages, blocks until released """
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.release = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.release.wait()
+        self.messages.append(record.getMessage())
+
+
+# pylint: disable=R0904
+class TestAsyncHandler(unittest.TestCase):
+    """ Tests for AsyncHandler"""
+
+    def test_overflow(self):
+        """Records beyond the capacity are dropped and reported"""
+        slow = SlowHandler()
+        handler = logqueue.AsyncHandler([slow], capacity=5)
+        logger = logging.getLogger('test_logqueue')
+        logger.propagate = False
+        logger.addHandler(handler)
+        for idx in range(20):
+            logger.warning('record %d', idx)
+        self.assertGreaterEqual(handler.dropped, 14)
+        slow.release.set()
+        handler.close()
+        logger.removeHandler(handler)
+        self.assertEqual(slow.messages[0], 'record 0')
+        self.assertEqual(len(slow.messages), 20 - handler.dropped + 1)
+        self.assertIn('dropped', slow.messages[-1])
+
+    def test_prepare(self):
+        """The message shows the arguments at the time of the call"""
+        slow = SlowHandler()
+        slow.setFormatter(logging.Formatter('%(message)s'))
+        written = []
+        slow.emit = lambda record: written.append(slow.format(record))
+        handler = logqueue.AsyncHandler([slow])
+        logger = logging.getLogger('test_logqueue_prepare')
+        logger.propagate = False
+        logger.addHandler(handler)
+        rec = {'0': 1.}
+        logger.warning('rec: %s', rec)
+        rec['0'] = 2.
+        try:
+            raise ValueError('bus error')
+        except ValueError:
+            logger.exception('failed')
+        handler.close()
+        logger.removeHandler(handler)
+        self.assertEqual(written[0], "rec: {'0': 1.0}")
+        self.assertTrue(written[1].startswith('failed\nTraceback'))
+        self.assertIn('ValueError: bus error', written[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
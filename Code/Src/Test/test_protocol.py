@@ -0,0 +1,99 @@
+""" Tests for the client-server wire protocol"""
+
+import pickle
+import socket
+import unittest
+
+import numpy
+
+from Src.Communication import protocol
+
+
+# pylint: disable=R0904
+class TestProtocol(unittest.TestCase):
+    """ Tests for Encoder, Decoder and Connection"""
+
+    def setUp(self):
+        self.encoder = protocol.Encoder()
+        self.decoder = protocol.Decoder()
+
+    def roundtrip(self, data):
+        messages = self.decoder.feed(self.encoder.encode(data))
+        self.assertEqual(len(self.decoder.buffer), 0)
+        self.assertEqual(len(messages), 1)
+        return messages[0]
+
+    def test_hot_messages(self):
+        """update, set_ref & Co. are packed and come back equal"""
+        order = [['set_ref', {'0': .5, '1': .25}],
+                 ['set_dvalve', {'0': True, '1': False}]]
+        self.assertEqual(self.roundtrip(order), order)
+        self.assertEqual(self.roundtrip([['update']]), [['update']])
+        answer = [{'0': .5}, {'u0': .125}, {'r0': None}]
+        self.assertEqual(self.roundtrip(answer), answer)
+        data = self.encoder.encode(answer)
+        length, msg_type = protocol.HEADER.unpack_from(data)
+        self.assertEqual(msg_type, protocol.MSG_RECS)
+        self.assertEqual(len(data), protocol.HEADER.size + length)
+
+    def test_json_fallback(self):
+        """Everything else is sent as json"""
+        for data in ['PAUSE', [['set_pidgain', 0, [1., 2., 3.]]],
+                     [[0.1, 0.2, False, 3.0]], [{'0': [1, 2, 3]}],
+                     {'pressure': {'0': {'errors': 1, 'age': None}}}]:
+            self.assertEqual(self.roundtrip(data), data)
+        self.assertIsInstance(self.roundtrip(['PAUSE'])[0], str)
+        self.assertEqual(self.roundtrip([{'0': (1, 2)}]), [{'0': [1, 2]}])
+        self.assertEqual(self.roundtrip([numpy.float64(.5), numpy.int64(3),
+                                         numpy.zeros(2)]), [.5, 3, [0., 0.]])
+
+    def test_no_pickle(self):
+        """A pickled frame is rejected, not executed"""
+        payload = pickle.dumps([['set_valve', {'0': 1.}]])
+        with self.assertRaises(ValueError):
+            self.decoder.feed(protocol.frame(protocol.MSG_JSON, payload))
+
+    def test_samples(self):
+        """Telemetry keeps float64 precision and the push flag"""
+        samples = numpy.array([[1e5+1e-3, .1, numpy.nan],
+                               [1e5+2e-3, .2, .3]])
+        data = self.roundtrip(protocol.Samples(7, ['0', 'r0'], samples,
+                                               pushed=True))
+        self.assertEqual((data.cursor, data.channels, data.pushed),
+                         (7, ['0', 'r0'], True))
+        numpy.testing.assert_array_equal(data.samples, samples)
+
+    def test_stream(self):
+        """Fragmented and coalesced frames are split correctly"""
+        orders = [[['update']], [['set_valve', {'0': 20.}]], 'EXIT']
+        stream = ''.join([self.encoder.encode(order) for order in orders])
+        received = []
+        for idx in range(0, len(stream), 3):
+            received += self.decoder.feed(stream[idx:idx+3])
+        self.assertEqual(received, orders)
+        self.assertEqual(len(self.decoder.buffer), 0)
+
+    def test_max_frame(self):
+        """A too large frame is rejected by its header"""
+        header = protocol.HEADER.pack(protocol.MAX_FRAME + 1,
+                                      protocol.MSG_JSON)
+        self.assertRaises(IOError, self.decoder.feed, header)
+
+    def test_connection(self):
+        """A large message is received as a whole"""
+        sock0, sock1 = socket.socketpair()
+        try:
+            conn0 = protocol.Connection(sock0)
+            conn1 = protocol.Connection(sock1)
+            samples = [[float(k)]*20 for k in range(100)]
+            conn0.send([['update']])
+            conn0.send([3, samples])
+            self.assertEqual(conn1.recv(), [['update']])
+            self.assertEqual(conn1.recv(), [3, samples])
+        finally:
+            sock0.close()
+            sock1.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+""" Tests for the fixed-rate loop scheduler"""
+
+import unittest
+from Src.Management import scheduler
+
+
+class FakeClock(object):
+    """ Clock which only advances on sleep or by hand """
+    def __init__(self):
+        self.now = 100.
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+# pylint: disable=R0904
+class TestLoopScheduler(unittest.TestCase):
+    """ Tests for LoopScheduler"""
+
+    def setUp(self):
+        self.fake = FakeClock()
+
+    def make(self, policy):
+        loop = scheduler.LoopScheduler(.01, policy, clock=self.fake.clock,
+                                       sleep=self.fake.sleep)
+        loop.start('TEST')
+        return loop
+
+    def test_fixed_rate(self):
+        """Work time must not stretch the period"""
+        loop = self.make('skip')
+        for k in range(1, 6):
+            self.fake.now += .004   # work
+            self.assertAlmostEqual(loop.wait(), 100. + k*.01)
+        stats = loop.stats['TEST']
+        self.assertEqual(stats.ticks, 5)
+        self.assertEqual(stats.overruns, 0)
+        self.assertEqual(stats.jitter, 0)
+
+    def test_skip_policy(self):
+        """Missed ticks are dropped and the grid is kept"""
+        loop = self.make('skip')
+        self.fake.now += .035
+        release = loop.wait()
+        self.assertAlmostEqual(release, 100.035)
+        self.assertAlmostEqual(loop.deadline, 100.04)
+        stats = loop.stats['TEST']
+        self.assertEqual(stats.overruns, 1)
+        self.assertEqual(stats.skipped, 2)
+
+    def test_catchup_policy(self):
+        """Missed ticks are released back to back"""
+        loop = self.make('catchup')
+        self.fake.now += .035
+        loop.wait()
+        loop.wait()
+        loop.wait()
+        self.assertAlmostEqual(self.fake.now, 100.035)
+        self.assertEqual(loop.stats['TEST'].overruns, 3)
+        self.assertEqual(loop.stats['TEST'].skipped, 0)
+        loop.wait()
+        self.assertAlmostEqual(self.fake.now, 100.04)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+""" Tests for the sensor banks on the simulated bus"""
+
+import errno
+import os
+import struct
+import unittest
+
+# the sensors talk to the bus when they are imported
+os.environ['GECKOBOT_BACKEND'] = 'sim'
+
+import numpy as np   # noqa: E402
+
+from Src.Hardware import acquisition   # noqa: E402
+from Src.Hardware import backend   # noqa: E402
+from Src.Hardware import sensors   # noqa: E402
+from Src.Hardware import simulation   # noqa: E402
+
+
+class SpyDevice(object):
+    """ Records the writes to an I2C device """
+    def __init__(self, device):
+        self.device = device
+        self.writes = []
+
+    def write8(self, register, value):
+        self.writes.append(value)
+        self.device.write8(register, value)
+
+
+class DeadDevice(object):
+    """ A sensor which does not answer """
+    def readList(self, register, length):
+        raise IOError(errno.EREMOTEIO, 'Remote I/O error')
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestDPressureSensBank(unittest.TestCase):
+    """ Tests for MultiPlexer.select and DPressureSensBank"""
+
+    def setUp(self):
+        self.plexer = sensors.DPressureSens.plexer
+        self.device = self.plexer.i2c
+        self.spy = self.plexer.i2c = SpyDevice(self.device)
+        self.plexer.port = None
+        for mplx_id in range(4):
+            backend.plant.connect('P{}'.format(mplx_id), mplx_id)
+            backend.plant.chamber('P{}'.format(mplx_id)).pressure = \
+                .1*(mplx_id+1)
+        self.sensors = [sensors.DPressureSens(str(idx), mplx_id)
+                        for idx, mplx_id in enumerate([2, 0, 3, 1])]
+        self.bank = sensors.DPressureSensBank(self.sensors)
+
+    def tearDown(self):
+        self.plexer.i2c = self.device
+        self.plexer.port = None
+
+    def test_select(self):
+        """The bus is only written on a change of the channel"""
+        self.plexer.select(2)
+        self.plexer.select(2)
+        self.plexer.select(1)
+        self.assertEqual(self.spy.writes, [1 << 2, 1 << 1])
+        self.assertEqual(self.plexer.port, 1)
+
+    def test_sweep_order(self):
+        """The sweep starts at the selected channel"""
+        self.plexer.select(2)
+        self.bank.sweep()
+        self.assertEqual(self.spy.writes, [1 << 2, 1 << 3, 1 << 0, 1 << 1])
+        del self.spy.writes[:]
+        self.bank.sweep()   # starts at channel 1
+        self.assertEqual(self.spy.writes, [1 << 2, 1 << 3, 1 << 0])
+
+    def test_vectorised(self):
+        """The bank calibrates like DPressureSens.get_value"""
+        for sensor in self.sensors:
+            sensor.set_maxpressure(.8)
+        expected = [sensor.get_value() for sensor in self.sensors]
+        np.testing.assert_allclose(self.bank.sweep(), expected, rtol=1e-12)
+        np.testing.assert_allclose(expected, np.array([.3, .1, .4, .2])/.8,
+                                   atol=.01)
+
+    def test_no_answer(self):
+        """A failing sensor keeps its last good value and resets the
+        cached channel"""
+        good = self.bank.sweep()
+        backend.plant.chamber('P3').pressure = 1.
+        self.sensors[2].i2c = DeadDevice()
+        self.plexer.select(0)   # s.t. the dead sensor is the last one read
+        values = self.bank.sweep()
+        self.assertEqual(self.bank.failed, ['2'])
+        self.assertEqual(values[2], good[2])
+        self.assertEqual(self.bank.health.errors, [0, 0, 1, 0])
+        # channel 3 was selected last, but it is not trusted anymore
+        self.assertIsNone(self.plexer.port)
+        del self.spy.writes[:]
+        self.plexer.select(3)
+        self.assertEqual(self.spy.writes, [1 << 3])
+
+
+class SequenceADC(object):
+    """ An ADC which returns the given values one after the other, then
+    starts again """
+    def __init__(self, values):
+        self.values = list(values)
+        self.reads = 0
+
+    def setup(self):
+        pass
+
+    def read(self, pin):
+        value = self.values[self.reads % len(self.values)]
+        self.reads += 1
+        return value
+
+
+# pylint: disable=R0904
+class TestPressureSens(unittest.TestCase):
+    """ Tests for the oversampling and filtering of PressureSens"""
+
+    def setUp(self):
+        self.adc = sensors.ADC
+
+    def tearDown(self):
+        sensors.ADC = self.adc
+
+    def sensor(self, values, **kwargs):
+        sensors.ADC = SequenceADC(values)
+        return sensors.PressureSens('0', 'P9_39', **kwargs)
+
+    def test_default(self):
+        """10 reads, the first 2 are dropped, the rest is averaged"""
+        sensor = self.sensor([1., 1.] + [.5]*8)
+        self.assertAlmostEqual(sensor.get_value(), .5*1.8)
+        self.assertEqual(sensors.ADC.reads, 10)
+
+    def test_reductions(self):
+        """Median and trimmed mean ignore an outlier"""
+        values = [.2, .3, 1., .1]
+        for reduction, expected in [('mean', .4), ('median', .25),
+                                    ('trimmed', .25)]:
+            sensor = self.sensor(values, samples=4, skip=0,
+                                 reduction=reduction)
+            self.assertAlmostEqual(sensor.get_value(), expected*1.8)
+        self.assertRaises(ValueError, self.sensor, [], samples=2, skip=2)
+
+    def test_iir(self):
+        """With alpha, one read per call is filtered across the calls"""
+        sensor = self.sensor([0., 1., 1.], samples=1, skip=0, alpha=.5)
+        values = [sensor.get_value()/1.8 for _ in range(3)]
+        self.assertEqual(values, [0., .5, .75])
+        self.assertEqual(sensors.ADC.reads, 3)
+        sensor.reset_filter()
+        sensors.ADC.values = [1.]
+        self.assertEqual(sensor.get_value(), 1.8)
+
+    def test_bank(self):
+        """A bank of analog sensors can be swept by a Sampler"""
+        sensors.ADC = SequenceADC([.1, .2])
+        bank = sensors.AnalogPressureBank([
+            sensors.PressureSens(str(idx), 'P9_39', samples=1, skip=0)
+            for idx in range(2)])
+        sampler = acquisition.Sampler('analog', bank, period=.001)
+        sampler.start()
+        try:
+            self.assertTrue(sampler.wait_first())
+            out = np.zeros(2)
+            sampler.read(out)
+        finally:
+            sampler.stop()
+        np.testing.assert_allclose(out, [.1*1.8, .2*1.8])
+
+
+class WordIMU(simulation.SimIMU):
+    """ An IMU whose registers hold the given words """
+    def __init__(self, words):
+        simulation.SimIMU.__init__(self)
+        self.words = words
+
+    def registers(self):
+        return list(bytearray(struct.pack('>7h', *self.words)))
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestIMUBank(unittest.TestCase):
+    """ Tests for the burst read of MPU_9150 and IMUBank"""
+
+    WORDS = [[-16384, 1, -1, 1234, -32768, 32767, -2],
+             [8192, -300, 16000, -5, 7, -7, 0]]
+
+    def setUp(self):
+        self.imus = dict(backend.plant.imus)
+        backend.plant.imus.clear()
+        for idx, words in enumerate(self.WORDS):
+            backend.plant.imus[idx] = WordIMU(words)
+        self.sensors = [sensors.MPU_9150(str(idx), idx)
+                        for idx in range(len(self.WORDS))]
+
+    def tearDown(self):
+        backend.plant.imus.clear()
+        backend.plant.imus.update(self.imus)
+
+    def read_words(self, imu, first, count):
+        """ The word by word reading before the burst """
+        words = []
+        for reg in range(first, first + 2*count, 2):
+            imu.plexer.select(imu.mplx_id)
+            words.append(imu._read_word_2c(reg))
+        return words
+
+    def test_acceleration(self):
+        """The burst equals three word reads, also for negative values"""
+        for imu, words in zip(self.sensors, self.WORDS):
+            self.assertEqual(list(imu.get_acceleration()),
+                             self.read_words(imu, 0x3b, 3))
+            self.assertEqual(list(imu.get_acceleration()), words[:3])
+        bank = sensors.IMUBank(self.sensors)
+        acc = bank.sweep()
+        self.assertEqual(acc.shape, (2, 3))
+        self.assertEqual(acc.tolist(), [w[:3] for w in self.WORDS])
+
+    def test_motion(self):
+        """The temperature is skipped, the gyro follows the acceleration"""
+        for imu, words in zip(self.sensors, self.WORDS):
+            acc, gyro = imu.get_motion()
+            self.assertEqual(list(gyro), self.read_words(imu, 0x43, 3))
+            self.assertEqual((list(acc), list(gyro)), (words[:3], words[4:]))
+        bank = sensors.IMUBank(self.sensors, gyro=True)
+        motion = bank.sweep()
+        self.assertEqual(motion.dtype, np.float64)
+        self.assertEqual(motion.tolist(),
+                         [w[:3] + w[4:] for w in self.WORDS])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+""" Run the control loop of the server on the simulated hardware"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+os.environ['GECKOBOT_BACKEND'] = 'sim'
+
+import numpy as np   # noqa: E402
+
+from Src.Hardware import backend   # noqa: E402
+from Src.Test import test_imucalc   # noqa: E402
+
+SECONDS = 3.    # [sec] virtual time
+server = None
+
+
+def setUpModule():
+    """ The server writes its log to log/ of the working directory """
+    global server, CWD, TMPDIR
+    if not backend.SIMULATED:
+        return
+    CWD = os.getcwd()
+    TMPDIR = tempfile.mkdtemp()
+    os.chdir(TMPDIR)
+    os.mkdir('log')
+    import server_hardware_controlled as server
+    server.logHandler.handlers.remove(server.consoleHandler)
+
+
+def tearDownModule():
+    if server is None:
+        return
+    server.rootLogger.removeHandler(server.logHandler)
+    server.logHandler.close()
+    os.chdir(CWD)
+    shutil.rmtree(TMPDIR)
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestServerSim(unittest.TestCase):
+    """ The whole server loop: sensors, controller, valves and plant"""
+
+    def test_user_reference(self):
+        """The chamber pressures track the reference"""
+        sens, valve, dvalve, IMU = server.init_hardware()
+        controller, imu_ctr = server.init_controller()
+        parallel = server.PARALLEL_ACQUISITION
+        server.PARALLEL_ACQUISITION = False   # the threads run in real time
+        try:
+            cargo = server.Cargo('USER_REFERENCE', sens=sens, valve=valve,
+                                 dvalve=dvalve, controller=controller,
+                                 IMU=IMU, imu_ctr=imu_ctr)
+        finally:
+            server.PARALLEL_ACQUISITION = parallel
+        refs = dict([(v.name, .2 + .1*idx) for idx, v in enumerate(valve)])
+        cargo.ref_task.update(refs)
+        automat = server.init_automat('USER_REFERENCE')
+
+        start = backend.monotonic()
+        wait = cargo.loop.wait
+
+        def stop_in_time(period):
+            if backend.monotonic() - start > SECONDS:
+                cargo.state = 'EXIT'
+            return wait(period)
+        cargo.loop.wait = stop_in_time
+        automat.run(cargo)
+
+        self.assertEqual(cargo.actual_state, 'EXIT')
+        self.assertEqual(automat.transitions,
+                         {('USER_REFERENCE', 'EXIT'): 1, ('EXIT', 'QUIT'): 1})
+        stats = cargo.loop.stats['USER_REFERENCE']
+        self.assertGreaterEqual(stats.ticks, SECONDS/cargo.sampling_time)
+        for name, ref in refs.items():
+            self.assertAlmostEqual(cargo.rec[name], ref, delta=.02)
+            self.assertEqual(cargo.rec_r['r'+name], ref)
+
+    def test_joint_angles(self):
+        """The angles of the server equal the scalar formula for its
+        IMU_IDX table"""
+        names = sorted(server.IMU_IDX)
+        pairs = [server.IMU_IDX[name][:2] for name in names]
+        rot_angles = [server.IMU_IDX[name][2] for name in names]
+        joint_angles = server.IMUcalc.JointAngles(pairs, rot_angles)
+        rand = np.random.RandomState(1)
+        for _ in range(100):
+            acc = rand.randint(-2**15, 2**15, (6, 3)).astype(float)
+            alpha = joint_angles.calc(acc)
+            expected = test_imucalc.scalar_angles(acc, pairs, rot_angles)[0]
+            self.assertLess(np.abs(alpha - expected).max(), 1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
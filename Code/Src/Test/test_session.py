@@ -0,0 +1,99 @@
+""" Tests for the session recording"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from Src.Management import session
+from Src.Management import datamanagement
+
+
+# pylint: disable=R0904
+class TestSessionRecorder(unittest.TestCase):
+    """ Tests for SessionRecorder and load"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'session.h5')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunks(self):
+        """Samples are written in chunks, late keys are filled with nan"""
+        rec = session.SessionRecorder(self.filename, chunk_size=4,
+                                      flush_interval=1e3)
+        for k in range(6):
+            rec.append(k, {'0': k}, {'r0': None})
+        self.assertEqual((rec.written, rec.rows), (4, 2))
+        samples = numpy.array([[6+k, 10*k] for k in range(7)], dtype=float)
+        rec.extend(['u0'], samples)
+        self.assertEqual((rec.written, rec.rows), (12, 1))
+        rec.close()
+
+        self.assertTrue(session.is_session(self.filename))
+        recorded = session.load(self.filename)
+        self.assertEqual(recorded['0_t']['val'].tolist(), range(13))
+        self.assertEqual(recorded['0']['val'][:6].tolist(), range(6))
+        self.assertTrue(numpy.isnan(recorded['0']['val'][6:]).all())
+        self.assertTrue(numpy.isnan(recorded['u0']['val'][:6]).all())
+        self.assertEqual(recorded['u0']['val'][6:].tolist(),
+                         range(0, 70, 10))
+        self.assertTrue(numpy.isnan(recorded['r0']['val']).all())
+
+    def test_partial(self):
+        """Samples without time (interrupted flush) are ignored"""
+        rec = session.SessionRecorder(self.filename, chunk_size=2)
+        rec.append(0., {'0': 1.})
+        rec.flush()
+        rec.file['0'].resize((3,))
+        rec.file.close()
+
+        recorded = session.load(self.filename)
+        self.assertEqual(recorded['0']['len'], 1)
+        gui_rec = datamanagement.GUIRecorder()
+        gui_rec.recorded = recorded
+        self.assertEqual(gui_rec.window('0').tolist(), [1.])
+
+    def test_gui_recorder(self):
+        """The GUIRecorder keeps the latest samples, the file all"""
+        rec = session.SessionRecorder(self.filename, chunk_size=8)
+        gui_rec = datamanagement.GUIRecorder(capacity=4, max_samples=8,
+                                             session=rec)
+        for k in range(20):
+            gui_rec.append({'0': k})
+        self.assertLessEqual(gui_rec.max_idx, 8)
+        self.assertEqual(gui_rec.window('0', 2).tolist(), [18, 19])
+        rec.close()
+        self.assertEqual(session.load(self.filename)['0']['val'].tolist(),
+                         range(20))
+
+    def test_stable_window(self):
+        """Dropping old samples does not change a window of the GUI"""
+        gui_rec = datamanagement.GUIRecorder(capacity=8, max_samples=8)
+        for k in range(8):
+            gui_rec.append({'0': k})
+        window = gui_rec.window('0')
+        gui_rec.extend(['0'], numpy.array([[k, k] for k in range(8, 10)]))
+        self.assertEqual(window.tolist(), range(8))
+        self.assertEqual(gui_rec.window('0').tolist(), [6, 7, 8, 9])
+
+
+    def test_time_base(self):
+        """The time of the server is mapped onto the time of append"""
+        gui_rec = datamanagement.GUIRecorder()
+        gui_rec.append({'0': 0.})
+        gui_rec.extend(['0'], numpy.array([[1e5, 1.], [1e5+.5, 2.]]))
+        gui_rec.extend(['0'], numpy.array([[1e5+1., 3.]]))
+        gui_rec.append({'0': 4.})
+        times = gui_rec.window('_t')
+        numpy.testing.assert_allclose(numpy.diff(times[1:4]), [.5, .5])
+        self.assertLess(abs(times[2] - times[0]), 1.)
+        self.assertLess(times[3] - times[4], 1.)
+
+
+if __name__ == '__main__':
+    unittest.main()
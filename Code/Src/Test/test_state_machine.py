@@ -0,0 +1,101 @@
+""" Tests for the state machine"""
+
+import unittest
+
+from Src.Management import exception
+from Src.Management import state_machine
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def clock(self):
+        return self.now
+
+
+class Ticker(object):
+    """ Tick based handlers, which stay *ticks* ticks in every state """
+    def __init__(self, clock, ticks):
+        self.fake = clock
+        self.ticks = ticks
+        self.calls = []
+
+    def handler(self, name, next_state):
+        def tick(cargo):
+            self.calls.append(name)
+            self.fake.now += 1.
+            if self.calls.count(name) % self.ticks:
+                return (name.lower(), cargo)
+            return (next_state, cargo)
+        return tick
+
+
+# pylint: disable=R0904
+class TestStateMachine(unittest.TestCase):
+    """ Tests for StateMachine"""
+
+    def setUp(self):
+        self.fake = FakeClock()
+        self.hooks = []
+
+    def make(self, ticks, prefix=''):
+        ticker = Ticker(self.fake, ticks)
+        automat = state_machine.StateMachine(clock=self.fake.clock)
+        automat.add_state(prefix + 'A', ticker.handler(prefix + 'A', 'b'),
+                          on_exit=lambda cargo: self.hooks.append('exit A'))
+        automat.add_state(prefix + 'B', ticker.handler(prefix + 'B', 'end'),
+                          on_enter=lambda cargo: self.hooks.append('enter B'))
+        automat.add_state('END', None, end_state=True)
+        automat.set_start(prefix + 'A')
+        return automat, ticker
+
+    def test_run(self):
+        """Hooks, dwell times and transitions of a blocking run"""
+        automat, ticker = self.make(3)
+        automat.run(cargo=None)
+        self.assertEqual(ticker.calls, ['A']*3 + ['B']*3)
+        self.assertEqual(self.hooks, ['exit A', 'enter B'])
+        self.assertEqual(automat.state, 'END')
+        self.assertEqual(automat.transitions,
+                         {('A', 'B'): 1, ('B', 'END'): 1})
+        self.assertEqual(automat.stats['A'].entries, 1)
+        self.assertEqual(automat.stats['A'].dwell, 3.)
+        self.assertEqual(automat.stats['B'].max_dwell, 3.)
+        self.assertIn('A -> B: 1', automat.report())
+
+    def test_interned(self):
+        """The names of the states are normalised once"""
+        automat, _ = self.make(2)
+        automat.run(cargo=None)
+        self.assertIs(automat.state, intern('END'))
+        self.assertIs(automat.names['end'], automat.names['END'])
+
+    def test_run_machines(self):
+        """One loop drives several tick based machines"""
+        automat0, ticker0 = self.make(1)
+        automat1, ticker1 = self.make(3)
+        automat0.start(None)
+        automat1.start(None)
+        rounds = []
+        state_machine.run_machines([automat0, automat1],
+                                   lambda: rounds.append(1))
+        self.assertEqual(len(rounds), 6)
+        self.assertEqual(ticker0.calls, ['A', 'B'])
+        self.assertEqual(ticker1.calls, ['A']*3 + ['B']*3)
+        self.assertTrue(automat0.done and automat1.done)
+
+    def test_errors(self):
+        """Missing start or end state and unknown states"""
+        automat = state_machine.StateMachine()
+        automat.add_state('A', lambda cargo: ('C', cargo))
+        self.assertRaises(exception.InitializationError, automat.run, None)
+        automat.set_start('A')
+        self.assertRaises(exception.InitializationError, automat.run, None)
+        automat.add_state('END', None, end_state=True)
+        self.assertRaises(exception.ArgumentError, automat.run, None)
+        self.assertEqual(automat.state, 'A')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+""" Tests for the telemetry ring buffer"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from Src.Management import telemetry
+
+
+# pylint: disable=R0904
+class TestTelemetryRing(unittest.TestCase):
+    """ Tests for TelemetryRing"""
+
+    def test_wraparound(self):
+        """Slow readers lose the oldest samples, never get mixed ones"""
+        ring = telemetry.TelemetryRing(['a'], capacity=4)
+        for k in range(10):
+            ring.push(k, [10*k])
+        cursor, samples = ring.read(0)
+        self.assertEqual(cursor, 10)
+        self.assertEqual(samples[:, 0].tolist(), [7, 8, 9])
+        self.assertEqual(samples[:, 1].tolist(), [70, 80, 90])
+        cursor, samples = ring.read(cursor)
+        self.assertEqual((cursor, len(samples)), (10, 0))
+
+    def test_limit(self):
+        """The cursor continues after the returned samples"""
+        ring = telemetry.TelemetryRing(['a'], capacity=8)
+        for k in range(5):
+            ring.push(k, [k])
+        cursor, samples = ring.read(0, limit=2)
+        self.assertEqual((cursor, samples[:, 0].tolist()), (2, [0, 1]))
+        cursor, samples = ring.read(cursor)
+        self.assertEqual((cursor, samples[:, 0].tolist()), (5, [2, 3, 4]))
+
+    def test_attach(self):
+        """Another reader maps the same file"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'ring')
+            rec = {'0': .5, '1': .2}
+            rec_imu = {'0': (1, 2, 3)}
+            writer = telemetry.RecTelemetry([rec, rec_imu], 8, filename)
+            writer.record(1.)
+            reader = telemetry.TelemetryRing.attach(filename)
+            self.assertEqual(reader.channels,
+                             ['0', '1', '0_0', '0_1', '0_2'])
+            rec['0'] = .7
+            writer.record(2.)
+            cursor, samples = reader.read(0)
+            self.assertEqual(cursor, 2)
+            self.assertEqual(samples.tolist(), [[1., .5, .2, 1., 2., 3.],
+                                                [2., .7, .2, 1., 2., 3.]])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+# pylint: disable=R0904
+class TestSubscription(unittest.TestCase):
+    """ Tests for Subscription"""
+
+    def test_decimation(self):
+        """Every n-th sample is forwarded, independent of the batches"""
+        now = [0.]
+        ring = telemetry.TelemetryRing(['a'], capacity=64)
+        sub = telemetry.Subscription(ring, decimation=3, interval=1.,
+                                     clock=lambda: now[0])
+        received = []
+        for k in range(20):
+            ring.push(k, [k])
+            now[0] += .25
+            cursor, samples = sub.poll()
+            if samples is not None:
+                received += samples[:, 0].tolist()
+        cursor, samples = sub.poll()
+        self.assertIsNone(samples)
+        self.assertEqual(cursor, 20)
+        now[0] += 1.
+        received += sub.poll()[1][:, 0].tolist()
+        self.assertEqual(received, range(0, 20, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+""" Tests for the valve automata of the Walking_Commander"""
+
+import os
+import time
+import unittest
+
+os.environ['GECKOBOT_BACKEND'] = 'sim'
+
+from Src.Controller import controller as ctrlib   # noqa: E402
+from Src.Controller import walk_commander   # noqa: E402
+from Src.Hardware import actuators   # noqa: E402
+from Src.Hardware import backend   # noqa: E402
+from Src.Hardware import sensors   # noqa: E402
+from Src.Management import tasks   # noqa: E402
+
+PINS = ['P9_22', 'P8_19']
+DPINS = ['P8_7', 'P8_8']
+
+
+class FakeCargo(object):
+    def __init__(self):
+        self.sampling_time = .001
+        self.valve = [actuators.Valve(str(idx), pin)
+                      for idx, pin in enumerate(PINS)]
+        self.sens = [sensors.DPressureSens(str(idx), idx)
+                     for idx in range(len(PINS))]
+        for valve, sensor in zip(self.valve, self.sens):
+            backend.plant.connect(valve.pwm_pin, sensor.mplx_id)
+        self.controller = [ctrlib.PidController([1.05, .03, .01],
+                                                self.sampling_time, .5)
+                           for _ in PINS]
+        self.dvalve = [actuators.DiscreteValve(str(idx), pin)
+                       for idx, pin in enumerate(DPINS)]
+        self.rec = {}
+        self.rec_r = {}
+        self.rec_u = {}
+        self.r_key = dict([(v.name, 'r' + v.name) for v in self.valve])
+        self.u_key = dict([(v.name, 'u' + v.name) for v in self.valve])
+        self.tasks = tasks.TaskQueue()
+        self.records = 0
+
+    def record(self):
+        self.records += 1
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestWalkingCommander(unittest.TestCase):
+    """ All valves are driven by one ValveExecutor"""
+
+    def setUp(self):
+        self.cargo = FakeCargo()
+        self.wcomm = walk_commander.Walking_Commander(self.cargo)
+        self.wcomm.run_threads()
+
+    def tearDown(self):
+        for pvalve in self.wcomm.pvalves:
+            pvalve.stop()
+        self.wcomm.executor.join()
+
+    def test_track(self):
+        """The valves reach the reference and hold it"""
+        self.assertEqual(len(self.wcomm.pvalves), 2)
+        self.wcomm._set_pos([.3, .5])
+        time.sleep(.05)     # like process_pattern, s.t. PROCESS is entered
+        self.wcomm._wait()
+        self.assertEqual(self.wcomm.status, ['HOLD', 'HOLD'])
+        for pvalve in self.wcomm.pvalves:
+            self.assertEqual(pvalve.automat.transitions,
+                             {('HOLD', 'PROCESS'): 1, ('PROCESS', 'HOLD'): 1})
+        for name, ref in [('0', .3), ('1', .5)]:
+            self.assertAlmostEqual(self.cargo.rec[name], ref, delta=.05)
+            self.assertEqual(self.cargo.rec_r['r' + name], ref)
+        self.assertGreater(self.wcomm.executor.loop.stats['VALVES'].ticks, 0)
+
+    def test_clean(self):
+        """clean brings the valves down and ends the executor"""
+        self.wcomm._set_pos([.4, .4])
+        self.wcomm.clean()
+        self.assertFalse(self.wcomm.executor.is_alive())
+        self.assertEqual(self.wcomm.status, ['cleaning', 'cleaning'])
+        self.assertEqual([valve.duty_cycle for valve in self.cargo.valve],
+                         [0, 0])
+
+
+# pylint: disable=R0904
+@unittest.skipUnless(backend.SIMULATED, 'needs GECKOBOT_BACKEND=sim')
+class TestSimpleWalkingCommander(unittest.TestCase):
+    """ Tests for SimpleWalkingCommander.process_pattern"""
+
+    def test_process_pattern(self):
+        """The phases end at the cumulative times of the pattern"""
+        cargo = FakeCargo()
+        cargo.telemetry = cargo
+        wcomm = walk_commander.SimpleWalkingCommander(cargo)
+        states = []
+        cargo.dvalve[1].set_state = states.append
+        tstart = time.time()
+        wcomm.process_pattern([[.2, .1, False, True, .02],
+                               [.4, .3, True, False, .03]])
+        self.assertAlmostEqual(time.time() - tstart, .05, delta=.02)
+        self.assertEqual(states, [True, False])
+        self.assertEqual(cargo.rec_r, {'r0': .4, 'r1': .3})
+        self.assertGreater(cargo.records, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
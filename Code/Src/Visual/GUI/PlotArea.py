@@ -25,11 +25,9 @@ class PlotArea(Gtk.Bin):
             key (str): keyword which data
         """
         if self.look_at_present:
-            val_new = self.data.recorded[key]['val'][-self._bufsize:]
+            val_new = self.data.window(key, self._bufsize)
         else:
-            start_idx = self.look_at_head - self._bufsize
-            val_new =\
-                self.data.recorded[key]['val'][start_idx:self.look_at_head]
+            val_new = self.data.window(key, self._bufsize, self.look_at_head)
         return val_new
 
     def update(self, keylist):
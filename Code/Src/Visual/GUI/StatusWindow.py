@@ -147,9 +147,9 @@ class StatusObject(Gtk.Bin):
     def update_gecko_repr(self, data):
         """ Update the Gecko Representation according to the actual data """
         for part in self.gecko_repr:
-            if part in data.recorded:
-                #  print data.recorded[part]['val'][-1]
-                pressure = int(round(data.recorded[part]['val'][-1]*10)*10)
+            if part in data.columns and data.max_idx:
+                #  print data.window(part, 1)[0]
+                pressure = int(round(data.window(part, 1)[0]*10)*10)
                 p_f = '00' + str(pressure)
                 p_f = p_f[-3:]
                 image_path = 'Src/Visual/GUI/pictures/'+part+'/'+p_f+'.png'
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks which run on the simulated hardware, i.e. without a robot.
+
+Measure how many ticks per second the control loop of
+server_hardware_controlled achieves in a given state:
+
+    python benchmark.py loop [STATE] [SECONDS]
+
+e.g.:
+
+    python benchmark.py loop USER_REFERENCE 5
+
+Since the simulation runs in virtual time, the loop is never put to sleep
+and the ticks per (wall clock) second are the throughput of one iteration
+read -> compute -> write.
+
+Compare the wire protocol with plain pickle for the hot messages between
+client and server:
+
+    python benchmark.py codec [REPETITIONS]
+
+Compare a duty cycle write with the sysfs file kept open (sysfs.SysfsPWM)
+and opened on every write (like Adafruit_BBIO), on a fake sysfs in /tmp:
+
+    python benchmark.py sysfs [REPETITIONS]
+
+Compare the valve controllers of the Walking_Commander on one thread per
+valve (walk_commander.Thread_ProportinalValve) and on one thread for all
+(walk_commander.ValveExecutor):
+
+    python benchmark.py valves [SECONDS]
+"""
+from __future__ import print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+os.environ['GECKOBOT_BACKEND'] = 'sim'
+if not os.path.isdir('log'):
+    os.mkdir('log')
+
+import server_hardware_controlled as server   # noqa: E402
+from Src.Communication import pickler   # noqa: E402
+from Src.Communication import protocol   # noqa: E402
+from Src.Controller import walk_commander   # noqa: E402
+from Src.Management import clock   # noqa: E402
+from Src.Hardware import simulation   # noqa: E402
+from Src.Hardware import sysfs   # noqa: E402
+
+
+def bench_loop(state='USER_REFERENCE', seconds=5.):
+    """
+    Run the server StateMachine in *state* for *seconds* (wall clock) and
+    print the achieved loop rate.
+    """
+    sens, valve, dvalve, IMU = server.init_hardware()
+    controller, imu_ctr = server.init_controller()
+    cargo = server.Cargo(state, sens=sens, valve=valve, dvalve=dvalve,
+                         controller=controller, IMU=IMU, imu_ctr=imu_ctr)
+    for name in cargo.ref_task:
+        cargo.ref_task[name] = .5
+        cargo.pwm_task[name] = 70.
+    automat = server.init_automat(state)
+    if cargo.acquisition:
+        cargo.acquisition.start()
+
+    def stop():
+        cargo.state = 'EXIT'
+    timer = threading.Timer(seconds, stop)
+
+    tstart = time.time()
+    vstart = server.backend.monotonic()
+    timer.start()
+    automat.run(cargo)
+    wall = time.time() - tstart
+    virtual = server.backend.monotonic() - vstart
+
+    ticks = cargo.loop.stats[state].ticks
+    print('\nstate:            {}'.format(state))
+    print('ticks:            {}'.format(ticks))
+    print('wall time:        {:.3f} s'.format(wall))
+    print('simulated time:   {:.3f} s'.format(virtual))
+    print('loop rate:        {:.1f} Hz'.format(ticks/wall))
+    print('time per tick:    {:.1f} us'.format(wall/ticks*1e6))
+    print('pressures:        {}'.format(
+        ', '.join(['{:.2f}'.format(cargo.rec[s.name]) for s in sens])))
+    print('\n' + cargo.latency.report())
+    if cargo.acquisition:
+        print('\n' + cargo.acquisition.report())
+
+
+def bench_codec(repetitions=10000):
+    """
+    Encode and decode the messages of one GUI cycle (update request and
+    answer, set_ref and set_dvalve order) with the protocol and with pickle
+    and print time and size per message.
+    """
+    names = [str(idx) for idx in range(8)]
+    rec = dict([(name, .5) for name in names])
+    rec_u = dict([('u'+name, .3) for name in names])
+    rec_r = dict([('r'+name, None) for name in names])
+    messages = {
+        'update': [['update']],
+        'answer': [rec, rec_u, rec_r],
+        'set_ref': [['set_ref', dict(rec)],
+                    ['set_dvalve', dict([(name, False) for name in names])]]}
+
+    encoder, decoder = protocol.Encoder(), protocol.Decoder()
+
+    def codec(data):
+        return decoder.feed(encoder.encode(data))[0]
+
+    def pickle_codec(data):
+        return pickler.unpickle_data(pickler.pickle_data(data))
+
+    print('\n{:10} {:>12} {:>12} {:>10} {:>10}'.format(
+        'message', 'pickle [us]', 'codec [us]', 'pickle [B]', 'codec [B]'))
+    for name in sorted(messages):
+        data = messages[name]
+        codec(data)     # announce the schemas
+        result = []
+        for func in [pickle_codec, codec]:
+            tstart = time.time()
+            for _ in range(repetitions):
+                func(data)
+            result.append((time.time() - tstart)/repetitions*1e6)
+        sizes = [len(pickler.pickle_data(data)), len(encoder.encode(data))]
+        print('{:10} {:12.2f} {:12.2f} {:10} {:10}'.format(
+            name, result[0], result[1], sizes[0], sizes[1]))
+
+
+def bench_sysfs(repetitions=10000):
+    """
+    Write the duty cycle of all valves *repetitions* times and print the
+    time per write.
+    """
+    root = tempfile.mkdtemp()
+    try:
+        fake = simulation.FakeSysfs(root)
+        pwm = sysfs.SysfsPWM(root)
+        pins = sorted(sysfs.PWM_PINS)
+        for pin in pins:
+            pwm.start(pin, 0., 25000)
+
+        def reopen(pin, duty):
+            with open(os.path.join(fake.pins[pin], 'duty_cycle'), 'w') as f:
+                f.write(str(int(40000*duty/100.)))
+
+        print('{:12} {:>12}'.format('driver', 'write [us]'))
+        for name, write in [('reopen', reopen),
+                            ('kept open', pwm.set_duty_cycle)]:
+            start = time.time()
+            for k in range(repetitions):
+                for pin in pins:
+                    write(pin, k % 100)
+            duration = (time.time() - start)/repetitions/len(pins)
+            print('{:12} {:12.2f}'.format(name, duration*1e6))
+        pwm.cleanup()
+    finally:
+        shutil.rmtree(root)
+
+
+class CountingController(object):
+    """ Counts the control ticks of a valve """
+    def __init__(self, controller):
+        self.controller = controller
+        self.ticks = 0
+
+    def output(self, reference, system_output):
+        self.ticks += 1
+        return self.controller.output(reference, system_output)
+
+
+class CheckedDevice(object):
+    """ Counts the reads of a pressure sensor, and those where another
+    channel of the multiplexer was selected """
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self.device = sensor.i2c
+        self.reads = 0
+        self.wrong = 0
+
+    def readList(self, register, length):
+        self.reads += 1
+        if self.sensor.plexer.port != self.sensor.mplx_id:
+            self.wrong += 1
+        return self.device.readList(register, length)
+
+
+def bench_valves(seconds=2.):
+    """
+    Let the valve controllers hold .5 for *seconds*, on a thread per valve
+    and in one ValveExecutor, and print the control ticks per second and
+    valve, the CPU load, the multiplexer switches per read and the reads of
+    a wrong channel.
+
+    Unlike the other benchmarks, the valves sleep in real time, like on the
+    robot. Else, a thread would only give up the GIL after a few thousand
+    ticks and the threads would hardly interleave.
+    """
+    sens, valve, _, _ = server.init_hardware()
+    controller, _ = server.init_controller()
+    plexer = sens[0].plexer
+    rec, rec_r, rec_u = {}, {}, {}
+
+    print('{:10} {:>8} {:>12} {:>8} {:>10} {:>12}'.format(
+        'driver', 'threads', 'ticks [1/s]', 'CPU [%]', 'switches',
+        'wrong reads'))
+    for name in ['threads', 'executor']:
+        status = [None]*len(valve)
+        ctrs = [CountingController(controller[idx])
+                for idx in range(len(valve))]
+        devices = []
+        for sensor in sens:
+            sensor.i2c = CheckedDevice(sensor)
+            devices.append(sensor.i2c)
+        write8 = plexer.i2c.write8
+        switches = []
+
+        def count_switch(register, value):
+            switches.append(value)
+            write8(register, value)
+        plexer.i2c.write8 = count_switch
+
+        n_threads = threading.active_count()
+        if name == 'threads':
+            pvalves = [walk_commander.Thread_ProportinalValve(
+                v, s, c, idx, status, rec, rec_r, rec_u, server.TSAMPLING)
+                for idx, (v, s, c) in enumerate(zip(valve, sens, ctrs))]
+            threads = pvalves
+        else:
+            pvalves = [walk_commander.ProportionalValve(
+                v, s, c, idx, status, rec, rec_r, rec_u)
+                for idx, (v, s, c) in enumerate(zip(valve, sens, ctrs))]
+            threads = [walk_commander.ValveExecutor(
+                pvalves, server.TSAMPLING, clock=clock.monotonic,
+                sleep=time.sleep)]
+        for pvalve in pvalves:
+            pvalve.set_ref(.5)
+        for thread in threads:
+            thread.start()
+        n_threads = threading.active_count() - n_threads
+        cpu = sum(os.times()[:2])
+        time.sleep(seconds)
+        cpu = sum(os.times()[:2]) - cpu
+        for pvalve in pvalves:
+            pvalve.stop()
+        for thread in threads:
+            thread.join()
+
+        del plexer.i2c.write8
+        for sensor, device in zip(sens, devices):
+            sensor.i2c = device.device
+        reads = sum([device.reads for device in devices])
+        print('{:10} {:8} {:12.1f} {:8.1f} {:10.3f} {:12}'.format(
+            name, n_threads, sum([c.ticks for c in ctrs])/seconds/len(ctrs),
+            cpu/seconds*100, len(switches)/float(reads),
+            sum([device.wrong for device in devices])))
+
+
+if __name__ == '__main__':
+    ARGS = sys.argv[1:]
+    if not ARGS or ARGS[0] == 'loop':
+        STATE = ARGS[1] if len(ARGS) > 1 else 'USER_REFERENCE'
+        SECONDS = float(ARGS[2]) if len(ARGS) > 2 else 5.
+        bench_loop(STATE, SECONDS)
+    elif ARGS[0] == 'codec':
+        REPETITIONS = int(ARGS[1]) if len(ARGS) > 1 else 10000
+        bench_codec(REPETITIONS)
+    elif ARGS[0] == 'sysfs':
+        REPETITIONS = int(ARGS[1]) if len(ARGS) > 1 else 10000
+        bench_sysfs(REPETITIONS)
+    elif ARGS[0] == 'valves':
+        SECONDS = float(ARGS[1]) if len(ARGS) > 1 else 2.
+        bench_valves(SECONDS)
+    else:
+        print(__doc__)
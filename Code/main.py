@@ -16,6 +16,7 @@ from termcolor import colored
 
 from Src.Visual.GUI import gtk_gui_v2
 from Src.Management import datamanagement
+from Src.Management import session
 from Src.Communication import client_commands as client
 from Src.Management import exception
 from Src.Management import state_machine
@@ -72,6 +73,9 @@ def main():
     - close the socket - connection to server
     """
     TSAMPLING_GUI = .1
+    STREAM_DECIMATION = 10  # server pushes every 10th sample, 0 = polling
+    SESSION_FILE = time.strftime('session_%Y_%m_%d-%H_%M_%S.h5')
+    MAX_GUI_SAMPLES = 2**18     # older samples are only in the SESSION_FILE
     START_STATE = 'PAUSE'
 
     print('Initialize connection ...')
@@ -95,16 +99,22 @@ def main():
     print('with', len(dvalve_data), 'discrete valves')
     print('with', len(sens_data), 'pressure sensors')
 
-    gui_rec = datamanagement.GUIRecorder()
+    session_rec = session.SessionRecorder(SESSION_FILE)
+    gui_rec = datamanagement.GUIRecorder(max_samples=MAX_GUI_SAMPLES,
+                                         session=session_rec)
     gui_task = datamanagement.GUITask(START_STATE, valve_data, dvalve_data,
                                       maxpressure, maxctrout, tsampling,
                                       PID_gains, pattern)
-    gui_rec.append(sens_data)
-    gui_rec.append(rec_u)
-    gui_rec.append(rec_r)
+    gui_rec.append(sens_data, rec_u, rec_r)
     gui = GuiThread(gui_rec, gui_task)
     gui.start()
 
+    streaming = bool(sock and STREAM_DECIMATION)
+    if streaming:
+        print('Subscribe to telemetry ...')
+        sock = client.subscribe(sock, gui_rec.extend, STREAM_DECIMATION,
+                                TSAMPLING_GUI)
+
     print('Initialize Communication State Machine ...')
     automat = state_machine.StateMachine()
     automat.add_state('READ_ONLY', read_only)
@@ -112,7 +122,7 @@ def main():
     automat.add_state('CHANGE_STATE', change_state)
     automat.add_state('EXIT', None, end_state=True)
     automat.set_start('READ_ONLY')
-    cargo = Cargo(gui_rec, gui_task, sock, TSAMPLING_GUI)
+    cargo = Cargo(gui_rec, gui_task, sock, TSAMPLING_GUI, streaming)
 
     try:
         print('Run the StateMachine ...')
@@ -120,6 +130,8 @@ def main():
     finally:
         print('Closing Socket ...')
         sock.close()
+        print('Closing Session', SESSION_FILE, '...')
+        session_rec.close()
 
     gui.join()
     print('all is done')
@@ -128,17 +140,14 @@ def main():
 def read_only(cargo):
     """
     Aslong as User did not send a change_state request:
-        - ask server for actual measurements
+        - ask server for actual measurements (unless they are streamed)
         - store them in the GUI Recorder
         - send setting-request to server
     """
     current_state = cargo.gui_task.state
     while current_state == cargo.gui_task.state:
-        sens_data, rec_u, rec_r = \
-            client.update_sensors(cargo.sock, only_sens=False)
-        cargo.gui_rec.append(sens_data)
-        cargo.gui_rec.append(rec_u)
-        cargo.gui_rec.append(rec_r)
+        if not cargo.streaming:
+            poll_recorder(cargo)
         current_state = cargo.gui_task.state
         # set PID
         set_something(cargo)
@@ -147,6 +156,14 @@ def read_only(cargo):
     return (new_state, cargo)
 
 
+def poll_recorder(cargo):
+    """ Ask the server for the actual measurements and store them in the
+    GUI Recorder (if the server does not push them anyway) """
+    sens_data, rec_u, rec_r = \
+        client.update_sensors(cargo.sock, only_sens=False)
+    cargo.gui_rec.append(sens_data, rec_u, rec_r)
+
+
 def change_state(cargo):
     """
     - Send the change_state-request to server
@@ -168,7 +185,7 @@ def change_state(cargo):
 def read_write(cargo):
     """
     Aslong as User did not send a change_state request:
-        - ask server for actual measurements
+        - ask server for actual measurements (unless they are streamed)
         - store them in the GUI Recorder
         - collect all tasks from GUITask
         - send them to server
@@ -180,11 +197,8 @@ def read_write(cargo):
 
     while current_state == cargo.gui_task.state:
         # read
-        sens_data, rec_u, rec_r = \
-            client.update_sensors(cargo.sock, only_sens=False)
-        cargo.gui_rec.append(sens_data)
-        cargo.gui_rec.append(rec_u)
-        cargo.gui_rec.append(rec_r)
+        if not cargo.streaming:
+            poll_recorder(cargo)
         # write
         order = []
         if cargo.gui_task.state == 'USER_CONTROL':
@@ -205,7 +219,7 @@ def read_write(cargo):
 
 
 class Cargo(object):
-    def __init__(self, rec, task, sock, TSAMPLING_GUI):
+    def __init__(self, rec, task, sock, TSAMPLING_GUI, streaming=False):
         """
         Container for client-sided Communication StateMachine
         *Initialize with:*
@@ -216,11 +230,14 @@ class Cargo(object):
             sock (socket.socket): Socket-Object for Communication
             TSAMPLING_GUI (float): Sampling Time of the GUI, which is also the
                 sampling time of the communication statemachine
+            streaming (bool): the server pushes its telemetry into rec,
+                s.t. there is no need to poll
         """
         self.gui_rec = rec
         self.gui_task = task
         self.sock = sock
         self.TSAMPLING_GUI = TSAMPLING_GUI
+        self.streaming = streaming
 
 
 def set_something(cargo):
@@ -10,7 +10,12 @@ import time
 
 from Src.Hardware import sensors as sensors
 from Src.Hardware import actuators as actuators
+from Src.Hardware import health
 from Src.Management import state_machine
+from Src.Management import telemetry
+from Src.Management import tasks
+from Src.Management import latency
+from Src.Management import reference
 from Src.Communication import communication_thread as comm_t
 from Src.Controller import walk_commander
 from Src.Controller import controller as ctrlib
@@ -21,6 +26,11 @@ from Src.Controller import controller as ctrlib
 MAX_PRESSURE = 0.85    # [bar] v2.4
 MAX_CTROUT = 0.50     # [10V]
 TSAMPLING = 0.001     # [sec]
+TELEMETRY_CAPACITY = 10000  # [samples]
+TELEMETRY_FILE = None   # e.g. '/dev/shm/geckobot' to read from other process
+LATENCY_PHASES = ['read_sens', 'controller', 'set_pwm', 'set_dvalve']
+HEALTH_LOG_INTERVAL = 5.    # [sec] between two summaries of sensor failures
+PWM_DEADBAND = .1   # [%] smaller changes of a duty cycle are not written
 PID = [1.05, 0.03, 0.01]    # [1]
 
 
@@ -144,7 +154,8 @@ def init_hardware():
             {'name': '4', 'pin': 'P9_16'},     # Lower Left Leg
             {'name': '5', 'pin': 'P9_14'}]     # Lower Right Leg
     for elem in sets:
-        valve.append(actuators.Valve(name=elem['name'], pwm_pin=elem['pin']))
+        valve.append(actuators.Valve(name=elem['name'], pwm_pin=elem['pin'],
+                                     deadband=PWM_DEADBAND))
 
     dvalve = []
     dsets = [{'name': '0', 'pin': 'P8_7'},      # Upper Left Leg
@@ -171,22 +182,23 @@ def init_controller():
     *server.py*, but can easily be changed via the user interface of the
     client.
 
+    All channels are computed at once by a controller.PidBank, which can be
+    indexed like the former list of PidControllers.
+
     Return:
-        (list of controller.PIDController)
+        (controller.PidBank)
     """
     tsamplingPID = TSAMPLING
     maxoutPID = MAX_CTROUT
-    controller = []
     sets = [{'name': '0', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '1', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '2', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '3', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '4', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '5', 'P': PID[0], 'I': PID[1], 'D': PID[2]}]
-    for elem in sets:
-        controller.append(
-            ctrlib.PidController([elem['P'], elem['I'], elem['D']],
-                                 tsamplingPID, maxoutPID))
+    controller = ctrlib.PidBank(
+        [[elem['P'], elem['I'], elem['D']] for elem in sets],
+        tsamplingPID, maxoutPID)
     return controller
 
 
@@ -246,10 +258,20 @@ def main():
         traceback.print_tb(sys.exc_info()[2])
 
     communication_thread.join()
+    print(automat.report())
     print('All is done ...')
     sys.exit(0)
 
 
+def read_sens(cargo):
+    """ Read all pressure sensors. Failing sensors keep their last good
+    value, their failures are summarized by cargo.health_log """
+    pressure = cargo.sens_bank.sweep()
+    for name, value in zip(cargo.sens_bank.names, pressure.tolist()):
+        cargo.rec[name] = value
+    cargo.health_log.check()
+
+
 #  SET UP the state Handler
 def pause_state(cargo):
     """
@@ -260,13 +282,16 @@ def pause_state(cargo):
 
     for valve in cargo.valve:
         valve.set_pwm(1.)
-        cargo.rec_u['u{}'.format(valve.name)] = 0.
-        cargo.rec_r['r{}'.format(valve.name)] = None
+        cargo.rec_u[cargo.u_key[valve.name]] = 0.
+        cargo.rec_r[cargo.r_key[valve.name]] = None
 
     while cargo.state == 'PAUSE':
         try:
-            for sensor in cargo.sens:
-                cargo.rec[sensor.name] = sensor.get_value()
+            cargo.tasks.run_pending()
+            start = cargo.latency.tic()
+            read_sens(cargo)
+            cargo.latency.toc('read_sens', start)
+            cargo.telemetry.record()
             time.sleep(cargo.sampling_time)
         except:
             new_state = 'ERROR'
@@ -285,22 +310,27 @@ def user_control(cargo):
 
     while cargo.state == 'USER_CONTROL':
         try:
+            cargo.tasks.run_pending()
             # read
-            for sensor in cargo.sens:
-                cargo.rec[sensor.name] = sensor.get_value()
+            start = cargo.latency.tic()
+            read_sens(cargo)
+            start = cargo.latency.toc('read_sens', start)
 
             # write
             for valve in cargo.valve:
                 pwm = cargo.pwm_task[valve.name]
                 valve.set_pwm(pwm)
-                cargo.rec_r['r{}'.format(valve.name)] = None
-                cargo.rec_u['u{}'.format(valve.name)] = pwm/100.
+                cargo.rec_r[cargo.r_key[valve.name]] = None
+                cargo.rec_u[cargo.u_key[valve.name]] = pwm/100.
+            start = cargo.latency.toc('set_pwm', start)
 
             for dvalve in cargo.dvalve:
                 state = cargo.dvalve_task[dvalve.name]
                 dvalve.set_state(state)
+            cargo.latency.toc('set_dvalve', start)
 
             # meta
+            cargo.telemetry.record()
             time.sleep(cargo.sampling_time)
         except:
             new_state = 'ERROR'
@@ -319,24 +349,31 @@ def user_reference(cargo):
 
     while cargo.state == 'USER_REFERENCE':
         try:
+            cargo.tasks.run_pending()
             # read
-            for sensor in cargo.sens:
-                cargo.rec[sensor.name] = sensor.get_value()
+            start = cargo.latency.tic()
+            read_sens(cargo)
+            start = cargo.latency.toc('read_sens', start)
 
             # write
-            for valve, controller in zip(cargo.valve, cargo.controller):
-                ref = cargo.ref_task[valve.name]
-                sys_out = cargo.rec[valve.name]
-                ctr_out = controller.output(ref, sys_out)
+            valves = cargo.valve[:len(cargo.controller)]
+            refs = [cargo.ref_task[valve.name] for valve in valves]
+            sys_outs = [cargo.rec[valve.name] for valve in valves]
+            ctr_outs = cargo.controller.output(refs, sys_outs).tolist()
+            start = cargo.latency.toc('controller', start)
+            for valve, ref, ctr_out in zip(valves, refs, ctr_outs):
                 valve.set_pwm(ctrlib.sys_input(ctr_out))
-                cargo.rec_r['r{}'.format(valve.name)] = ref
-                cargo.rec_u['u{}'.format(valve.name)] = ctr_out
+                cargo.rec_r[cargo.r_key[valve.name]] = ref
+                cargo.rec_u[cargo.u_key[valve.name]] = ctr_out
+            start = cargo.latency.toc('set_pwm', start)
 
             for dvalve in cargo.dvalve:
                 state = cargo.dvalve_task[dvalve.name]
                 dvalve.set_state(state)
+            cargo.latency.toc('set_dvalve', start)
 
             # meta
+            cargo.telemetry.record()
             time.sleep(cargo.sampling_time)
         except:
             new_state = 'ERROR'
@@ -355,6 +392,7 @@ def reference_tracking(cargo):
         cargo.ref_task[valve.name] = 0.0
 
     try:
+        cargo.tasks.run_pending()
         idx = 0
         while (cargo.wcomm.confirm and
                cargo.state == 'REFERENCE_TRACKING' and
@@ -362,7 +400,7 @@ def reference_tracking(cargo):
             cargo.wcomm.is_active = True
             if idx == 0:
                 cargo.simpleWalkingCommander.process_pattern(INITIAL_PATTERN)
-            cargo.simpleWalkingCommander.process_pattern(cargo.wcomm.pattern)
+            cargo.simpleWalkingCommander.process_pattern(cargo.wcomm.compiled)
             print('wcomm goes to round', idx)
             idx += 1
         cargo.wcomm.confirm = False
@@ -380,8 +418,8 @@ def reference_tracking(cargo):
         # write
         for valve, controller in zip(cargo.valve, cargo.controller):
             valve.set_pwm(1.)
-            cargo.rec_r['r{}'.format(valve.name)] = None
-            cargo.rec_u['u{}'.format(valve.name)] = 1.
+            cargo.rec_r[cargo.r_key[valve.name]] = None
+            cargo.rec_u[cargo.u_key[valve.name]] = 1.
 
         for dvalve in cargo.dvalve:
             dvalve.set_state(False)
@@ -404,9 +442,13 @@ def exit_cleaner(cargo):
     """ Clean everything up """
     print("cleaning ...")
     cargo.actual_state = 'EXIT'
+    print('Latency of the phases:')
+    print(cargo.latency.report())
 
+    print('PWM writes: {}'.format(dict(
+        [(valve.name, valve.write_stats()) for valve in cargo.valve])))
     for idx, valve in enumerate(cargo.valve):
-        valve.set_pwm(1.)
+        valve.set_pwm(1., force=True)
         if idx == 0:
             valve.cleanup()
     for dvalve in cargo.dvalve:
@@ -422,8 +464,12 @@ class Cargo(object):
     def __init__(self, state, sens=[], valve=[], dvalve=[],
                  controller=[]):
         self.state = state
-        self.actual_state = state
+        self.handoff = tasks.StateHandoff(state)
         self.sens = sens
+        self.sens_bank = sensors.DPressureSensBank(sens) if sens else None
+        self.health = [self.sens_bank.health] if sens else []
+        self.health_log = health.HealthLog(print, self.health,
+                                           HEALTH_LOG_INTERVAL)
         self.valve = valve
         self.dvalve = dvalve
         self.controller = controller
@@ -439,14 +485,42 @@ class Cargo(object):
         self.maxctrout = MAX_CTROUT
         for sensor in sens:
             self.rec[sensor.name] = sensor.get_value()
+        self.u_key = {}
+        self.r_key = {}
         for valve in self.valve:
-            self.rec_u['u{}'.format(valve.name)] = 1.
-            self.rec_r['r{}'.format(valve.name)] = None
+            self.u_key[valve.name] = 'u{}'.format(valve.name)
+            self.r_key[valve.name] = 'r{}'.format(valve.name)
+            self.rec_u[self.u_key[valve.name]] = 1.
+            self.rec_r[self.r_key[valve.name]] = None
+        self.telemetry = telemetry.RecTelemetry(
+            [self.rec, self.rec_u, self.rec_r], TELEMETRY_CAPACITY,
+            TELEMETRY_FILE)
+        self.tasks = tasks.TaskQueue()
+        self.latency = latency.PhaseTimer(LATENCY_PHASES)
 
         self.wcomm = WCommCargo()
         self.simpleWalkingCommander = \
             walk_commander.SimpleWalkingCommander(self)
 
+    @property
+    def actual_state(self):
+        """ The state the control loop is in, set by the state handlers """
+        return self.handoff.state
+
+    @actual_state.setter
+    def actual_state(self, state):
+        self.handoff.set(state)
+
+    def wait_state(self, state, timeout=None):
+        """
+        Block until the control loop arrived in *state*, see
+        tasks.StateHandoff.wait.
+
+        Returns:
+            (bool): whether the state was reached
+        """
+        return self.handoff.wait(state, timeout)
+
 
 class WCommCargo(object):
     def __init__(self):
@@ -456,6 +530,16 @@ class WCommCargo(object):
         self.idx_threshold = 3
         self.infmode = False
 
+    @property
+    def pattern(self):
+        return self.compiled.pattern
+
+    @pattern.setter
+    def pattern(self, pattern):
+        """ The pattern is compiled once here, see
+        reference.CompiledPattern """
+        self.compiled = reference.CompiledPattern(pattern)
+
 
 if __name__ == '__main__':
     main()
@@ -123,15 +123,25 @@ fi
 from __future__ import print_function
 
 import sys
-import time
 import logging
-import errno
+
+import numpy as np
 
 from Src.Hardware import sensors as sensors
 from Src.Hardware import actuators as actuators
+from Src.Hardware import backend
+from Src.Hardware import acquisition
+from Src.Hardware import health
 from Src.Management import state_machine
+from Src.Management import scheduler
+from Src.Management import telemetry
+from Src.Management import tasks
+from Src.Management import latency
+from Src.Management import logqueue
+from Src.Management import reference
 from Src.Communication import hardware_control as HUI
 from Src.Math import IMUcalc
+from Src.Math import estimator
 
 
 from Src.Controller import walk_commander
@@ -140,6 +150,7 @@ from Src.Controller import controller as ctrlib
 
 logPath = "log/"
 fileName = 'testlog'
+LOG_QUEUE_SIZE = 10000  # [records] more are dropped (and counted)
 
 logFormatter = logging.Formatter(
     "%(asctime)s [%(threadName)-12.12s] [%(levelname)-5.5s]  %(message)s")
@@ -149,11 +160,14 @@ rootLogger.setLevel(logging.INFO)
 
 fileHandler = logging.FileHandler("{0}/{1}.log".format(logPath, fileName))
 fileHandler.setFormatter(logFormatter)
-rootLogger.addHandler(fileHandler)
 
 consoleHandler = logging.StreamHandler()
 consoleHandler.setFormatter(logFormatter)
-rootLogger.addHandler(consoleHandler)
+
+# the loop only queues the records, file and console are written by a thread
+logHandler = logqueue.AsyncHandler([fileHandler, consoleHandler],
+                                   LOG_QUEUE_SIZE)
+rootLogger.addHandler(logHandler)
 
 
 ptrn_v2_2 = HUI.generate_pattern(.80, 0.80, 0.90, 0.99, 0.80, 0.80, 0.0, 0.0)
@@ -174,8 +188,23 @@ DEFAULT_PATTERN = ptrn_v3_0      # default pattern
 
 MAX_CTROUT = 0.50     # [10V]
 TSAMPLING = 0.001     # [sec]
+LOOP_POLICY = 'skip'  # what to do on missed ticks: 'skip' or 'catchup'
 PID = [1.05, 0.03, 0.01]    # [1]
 PIDimu = [0.0117, 1.012, 0.31]
+# [idx0, idx1, rot_angle] of the IMUs to calc the angle of a valve from
+IMU_IDX = {'0': [0, 1, -90], '1': [1, 2, -90], '2': [1, 4, 180],
+           '3': [4, 1, 180], '4': [4, 3, -90], '5': [5, 4, -90]}
+IMU_FILTER = None   # fuse acc and gyro: None, 'complementary' or 'kalman'
+
+TELEMETRY_CAPACITY = 10000  # [samples]
+TELEMETRY_FILE = None   # e.g. '/dev/shm/geckobot' to read from other process
+LATENCY_PHASES = ['read_sens', 'read_imu', 'controller', 'set_pwm',
+                  'set_dvalve']
+LATENCY_FILE = logPath + 'latency.json'
+PARALLEL_ACQUISITION = True  # sweep pressure and IMU bank on own threads
+ACQUISITION_PERIOD = TSAMPLING  # [sec] min time between two sweeps
+HEALTH_LOG_INTERVAL = 5.    # [sec] between two summaries of sensor failures
+PWM_DEADBAND = .1   # [%] smaller changes of a duty cycle are not written
 
 START_STATE = 'PAUSE'
 
@@ -236,7 +265,8 @@ def init_hardware():
             {'name': '6', 'pin': 'P9_28'},
             {'name': '7', 'pin': 'P9_42'}]
     for elem in sets:
-        valve.append(actuators.Valve(name=elem['name'], pwm_pin=elem['pin']))
+        valve.append(actuators.Valve(name=elem['name'], pwm_pin=elem['pin'],
+                                     deadband=PWM_DEADBAND))
 
     dvalve = []
     dsets = [{'name': '0', 'pin': 'P8_10'},      # Upper Left Leg
@@ -247,6 +277,11 @@ def init_hardware():
         dvalve.append(actuators.DiscreteValve(
             name=elem['name'], pin=elem['pin']))
 
+    if backend.SIMULATED:
+        rootLogger.info('Wire the simulated chambers ...')
+        for sensor, vlv in zip(sens, valve):
+            backend.plant.connect(vlv.pwm_pin, sensor.mplx_id)
+
     return sens, valve, dvalve, IMU
 
 
@@ -263,12 +298,15 @@ def init_controller():
     *server.py*, but can easily be changed via the user interface of the
     client.
 
+    All channels of a set are computed at once by a controller.PidBank,
+    which can be indexed like the former list of PidControllers.
+
     Return:
-        (list of controller.PIDController)
+        (controller.PidBank): pressure controllers
+        (controller.PidBank): IMU (angle) controllers
     """
     tsamplingPID = TSAMPLING
     maxoutPID = MAX_CTROUT
-    controller = []
     sets = [{'name': '0', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '1', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '2', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
@@ -277,26 +315,46 @@ def init_controller():
             {'name': '5', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '6', 'P': PID[0], 'I': PID[1], 'D': PID[2]},
             {'name': '7', 'P': PID[0], 'I': PID[1], 'D': PID[2]}]
-    for elem in sets:
-        controller.append(
-            ctrlib.PidController([elem['P'], elem['I'], elem['D']],
-                                 tsamplingPID, maxoutPID))
+    controller = ctrlib.PidBank(
+        [[elem['P'], elem['I'], elem['D']] for elem in sets],
+        tsamplingPID, maxoutPID)
 
-    imu_controller = []
     sets = [{'name': '0', 'P': PIDimu[0], 'I': PIDimu[1], 'D': PIDimu[2]},
             {'name': '1', 'P': PIDimu[0], 'I': PIDimu[1], 'D': PIDimu[2]},
             {'name': '2', 'P': PIDimu[0], 'I': PIDimu[1], 'D': PIDimu[2]},
             {'name': '3', 'P': PIDimu[0], 'I': PIDimu[1], 'D': PIDimu[2]},
             {'name': '4', 'P': PIDimu[0], 'I': PIDimu[1], 'D': PIDimu[2]},
             {'name': '5', 'P': PIDimu[0], 'I': PIDimu[1], 'D': PIDimu[2]}]
-    for elem in sets:
-        imu_controller.append(
-            ctrlib.PidController([elem['P'], elem['I'], elem['D']],
-                                 tsamplingPID, maxoutPID))
+    imu_controller = ctrlib.PidBank(
+        [[elem['P'], elem['I'], elem['D']] for elem in sets],
+        tsamplingPID, maxoutPID)
 
     return controller, imu_controller
 
 
+def init_automat(start_state):
+    """
+    Initialize the server-side StateMachine.
+
+    Args:
+        start_state (str): the state to start in
+
+    Return:
+        (state_machine.StateMachine)
+    """
+    automat = state_machine.StateMachine(clock=backend.monotonic)
+    automat.add_state('PAUSE', pause_state)
+    automat.add_state('IMU_CONTROL', imu_control)
+    automat.add_state('ERROR', error_state)
+#    automat.add_state('REFERENCE_TRACKING', reference_tracking)
+    automat.add_state('USER_CONTROL', user_control)
+    automat.add_state('USER_REFERENCE', user_reference)
+    automat.add_state('EXIT', exit_cleaner)
+    automat.add_state('QUIT', None, end_state=True)
+    automat.set_start(start_state)
+    return automat
+
+
 def main():
     """
     main Function of server side:
@@ -328,16 +386,11 @@ def main():
                   controller=controller, IMU=IMU, imu_ctr=imu_ctr)
 
     rootLogger.info('Setting up the StateMachine ...')
-    automat = state_machine.StateMachine()
-    automat.add_state('PAUSE', pause_state)
-    automat.add_state('IMU_CONTROL', imu_control)
-    automat.add_state('ERROR', error_state)
-#    automat.add_state('REFERENCE_TRACKING', reference_tracking)
-    automat.add_state('USER_CONTROL', user_control)
-    automat.add_state('USER_REFERENCE', user_reference)
-    automat.add_state('EXIT', exit_cleaner)
-    automat.add_state('QUIT', None, end_state=True)
-    automat.set_start(start_state)
+    automat = init_automat(start_state)
+
+    if cargo.acquisition:
+        rootLogger.info('Starting the Acquisition Threads ...')
+        cargo.acquisition.start()
 
     rootLogger.info('Starting Communication Thread ...')
     communication_thread = HUI.HUIThread(cargo, rootLogger)
@@ -363,7 +416,9 @@ def main():
         communication_thread.kill()
 
     communication_thread.join()
+    rootLogger.info(automat.report())
     rootLogger.info('All is done ...')
+    logHandler.close()     # also reports dropped records
     sys.exit(0)
 
 
@@ -398,19 +453,29 @@ def imu_set_ref(cargo):
     3 ------4 ------5
     <       v       >
     In IMUcalc.calc_angle(acc0, acc1, rot_angle), "acc0" is turned by rot_angle
+    The pairs are given by IMU_IDX.
     '''
-    imu_idx = {'0': [0, 1, -90], '1': [1, 2, -90], '2': [1, 4, 180],
-               '3': [4, 1, 180], '4': [4, 3, -90], '5': [5, 4, -90]}
 #    s = ''
-    imu_rec = cargo.rec_IMU
-    for valve, controller in zip(cargo.valve, cargo.imu_ctr):
-        ref = cargo.ref_task[valve.name]*90.
-        idx0, idx1, rot_angle = imu_idx[valve.name]
-        acc0 = imu_rec[str(idx0)]
-        acc1 = imu_rec[str(idx1)]
-
-        sys_out = IMUcalc.calc_angle(acc0, acc1, rot_angle)
-        ctr_out = controller.output(ref, sys_out)
+    start = cargo.latency.tic()
+    valves = cargo.valve[:len(cargo.imu_ctr)]
+    refs = [cargo.ref_task[valve.name]*90. for valve in valves]
+    sys_outs = cargo.joint_angles.calc(cargo.acc)
+    if cargo.imu_filter:
+        # dt of the IMU samples, not the nominal sampling time (overruns)
+        if cargo.imu_filter_time is None:
+            dt = cargo.sampling_time
+        else:
+            dt = cargo.imu_time - cargo.imu_filter_time
+        if dt > 0:
+            rates = estimator.joint_rates(cargo.gyro, cargo.joint_angles)
+            sys_outs = cargo.imu_filter.update(sys_outs, rates, dt)
+            cargo.imu_filter_time = cargo.imu_time
+        else:   # no new sample since the last update
+            sys_outs = cargo.imu_filter.angle
+    ctr_outs = cargo.imu_ctr.output(refs, sys_outs).tolist()
+    start = cargo.latency.toc('controller', start)
+
+    for valve, ref, ctr_out in zip(valves, refs, ctr_outs):
         pressure = cargo.rec[valve.name]
         pressure_bound = pressure_check(
                 pressure, 1.5*cargo.maxpressure, 1*cargo.maxpressure)
@@ -431,67 +496,80 @@ def imu_set_ref(cargo):
                 ctr_out_ = -MAX_CTROUT
 
         valve.set_pwm(ctrlib.sys_input(ctr_out_))
-        cargo.rec_r['r{}'.format(valve.name)] = ref
-        cargo.rec_u['u{}'.format(valve.name)] = ctr_out
+        cargo.rec_r[cargo.r_key[valve.name]] = ref
+        cargo.rec_u[cargo.u_key[valve.name]] = ctr_out
+    cargo.latency.toc('set_pwm', start)
 #    s = s + '\n\n'
 #    print(s)
     return cargo
 
 
 def set_ref(cargo):
-    for valve, controller in zip(cargo.valve, cargo.controller):
-        ref = cargo.ref_task[valve.name]
-        sys_out = cargo.rec[valve.name]
-        ctr_out = controller.output(ref, sys_out)
+    start = cargo.latency.tic()
+    valves = cargo.valve[:len(cargo.controller)]
+    refs = [cargo.ref_task[valve.name] for valve in valves]
+    sys_outs = [cargo.rec[valve.name] for valve in valves]
+    ctr_outs = cargo.controller.output(refs, sys_outs).tolist()
+    start = cargo.latency.toc('controller', start)
+    for valve, ref, ctr_out in zip(valves, refs, ctr_outs):
         valve.set_pwm(ctrlib.sys_input(ctr_out))
-        cargo.rec_r['r{}'.format(valve.name)] = ref
-        cargo.rec_u['u{}'.format(valve.name)] = ctr_out
+        cargo.rec_r[cargo.r_key[valve.name]] = ref
+        cargo.rec_u[cargo.u_key[valve.name]] = ctr_out
+    cargo.latency.toc('set_pwm', start)
     return cargo
 
 
 def set_dvalve(cargo):
+    start = cargo.latency.tic()
     for dvalve in cargo.dvalve:
         state = cargo.dvalve_task[dvalve.name]
         dvalve.set_state(state)
+    cargo.latency.toc('set_dvalve', start)
 
 
 def read_sens(cargo):
-    for sensor in cargo.sens:
-        try:
-            cargo.rec[sensor.name] = sensor.get_value()
-        except IOError as e:
-            if e.errno == errno.EREMOTEIO:
-                rootLogger.info(
-                    'cant read i2c device.' +
-                    ' Continue anyway ... Fail in [{}]'.format(sensor.name))
-            else:
-                rootLogger.exception('Sensor [{}]'.format(sensor.name))
-                rootLogger.error(e, exc_info=True)
-                raise e
+    start = cargo.latency.tic()
+    try:
+        if cargo.acquisition:
+            cargo.acquisition.pressure.read(cargo.pressure)
+            pressure = cargo.pressure
+        else:
+            pressure = cargo.sens_bank.sweep()
+    except IOError as e:
+        rootLogger.exception('Pressure Sensors')
+        rootLogger.error(e, exc_info=True)
+        raise e
+    # failing sensors keep their last good value, see sensors.*Bank.sweep
+    cargo.health_log.check()
+    for name, value in zip(cargo.sens_bank.names, pressure.tolist()):
+        cargo.rec[name] = value
+    cargo.latency.toc('read_sens', start)
     return cargo
 
 
 def read_imu(cargo):
-    for imu in cargo.IMU:
-        try:
-            cargo.rec_IMU[imu.name] = imu.get_acceleration()
-        except IOError as e:
-            if e.errno == errno.EREMOTEIO:
-                rootLogger.exception(
-                    'cant read imu device.' +
-                    'Continue anyway ...Fail in [{}]'.format(imu.name))
-            else:
-                rootLogger.exception('Sensor [{}]'.format(imu.name))
-                rootLogger.error(e, exc_info=True)
-                raise e
+    start = cargo.latency.tic()
+    try:
+        if cargo.acquisition:
+            _, cargo.imu_time, _ = cargo.acquisition.imu.read(cargo.motion)
+        else:
+            cargo.motion[:] = cargo.imu_bank.sweep()
+            cargo.imu_time = cargo.loop.released
+    except IOError as e:
+        rootLogger.exception('IMU Sensors')
+        rootLogger.error(e, exc_info=True)
+        raise e
+    for name, value in zip(cargo.imu_bank.names, cargo.acc.tolist()):
+        cargo.rec_IMU[name] = value
+    cargo.latency.toc('read_imu', start)
     return cargo
 
 
 def init_output(cargo):
     for valve in cargo.valve:
         valve.set_pwm(20.)
-        cargo.rec_u['u{}'.format(valve.name)] = 20.
-        cargo.rec_r['r{}'.format(valve.name)] = None
+        cargo.rec_u[cargo.u_key[valve.name]] = 20.
+        cargo.rec_r[cargo.r_key[valve.name]] = None
     return cargo
 
 
@@ -499,17 +577,24 @@ def init_output(cargo):
 def imu_control(cargo):
     rootLogger.info("Arriving in IMU_CONTROL State: ")
     cargo.actual_state = 'IMU_CONTROL'
+    cargo.loop.start('IMU_CONTROL')
 
     cargo = init_output(cargo)
+    if cargo.imu_filter:
+        cargo.imu_filter.reset_state()
+        cargo.imu_filter_time = None
     while cargo.state == 'IMU_CONTROL':
+        cargo.tasks.run_pending()
         cargo = read_sens(cargo)
         if cargo.IMU:
             set_dvalve(cargo)
             cargo = read_imu(cargo)
             cargo = imu_set_ref(cargo)
 
-        time.sleep(cargo.sampling_time)
+        cargo.telemetry.record(cargo.loop.released)
+        cargo.loop.wait(cargo.sampling_time)
         new_state = cargo.state
+    rootLogger.info(cargo.loop.report(cargo.actual_state))
     return (new_state, cargo)
 
 
@@ -519,12 +604,16 @@ def pause_state(cargo):
     """
     rootLogger.info("Arriving in PAUSE State: ")
     cargo.actual_state = 'PAUSE'
+    cargo.loop.start('PAUSE')
     cargo = init_output(cargo)
 
     while cargo.state == 'PAUSE':
+        cargo.tasks.run_pending()
         cargo = read_sens(cargo)
-        time.sleep(cargo.sampling_time)
+        cargo.telemetry.record(cargo.loop.released)
+        cargo.loop.wait(cargo.sampling_time)
         new_state = cargo.state
+    rootLogger.info(cargo.loop.report(cargo.actual_state))
     return (new_state, cargo)
 
 
@@ -534,22 +623,28 @@ def user_control(cargo):
     """
     rootLogger.info("Arriving in USER_CONTROL State: ")
     cargo.actual_state = 'USER_CONTROL'
+    cargo.loop.start('USER_CONTROL')
 
     while cargo.state == 'USER_CONTROL':
+        cargo.tasks.run_pending()
         # read
         cargo = read_sens(cargo)
 
         # write
+        start = cargo.latency.tic()
         for valve in cargo.valve:
             pwm = cargo.pwm_task[valve.name]
             valve.set_pwm(pwm)
-            cargo.rec_r['r{}'.format(valve.name)] = None
-            cargo.rec_u['u{}'.format(valve.name)] = pwm/100.
+            cargo.rec_r[cargo.r_key[valve.name]] = None
+            cargo.rec_u[cargo.u_key[valve.name]] = pwm/100.
+        cargo.latency.toc('set_pwm', start)
         set_dvalve(cargo)
         # meta
-        time.sleep(cargo.sampling_time)
+        cargo.telemetry.record(cargo.loop.released)
+        cargo.loop.wait(cargo.sampling_time)
 
         new_state = cargo.state
+    rootLogger.info(cargo.loop.report(cargo.actual_state))
     return (new_state, cargo)
 
 
@@ -559,16 +654,20 @@ def user_reference(cargo):
     """
     rootLogger.info("Arriving in USER_REFERENCE State: ")
     cargo.actual_state = 'USER_REFERENCE'
+    cargo.loop.start('USER_REFERENCE')
 
     while cargo.state == 'USER_REFERENCE':
+        cargo.tasks.run_pending()
         # read
         cargo = read_sens(cargo)
         # write
         cargo = set_ref(cargo)
         set_dvalve(cargo)
         # meta
-        time.sleep(cargo.sampling_time)
+        cargo.telemetry.record(cargo.loop.released)
+        cargo.loop.wait(cargo.sampling_time)
         new_state = cargo.state
+    rootLogger.info(cargo.loop.report(cargo.actual_state))
     return (new_state, cargo)
 
 #
@@ -667,9 +766,25 @@ def exit_cleaner(cargo):
     """ Clean everything up """
     rootLogger.info("cleaning ...")
     cargo.actual_state = 'EXIT'
+    rootLogger.info('Loop timing:\n{}'.format(cargo.loop.report()))
+    if cargo.acquisition:
+        cargo.acquisition.stop()
+        rootLogger.info('Acquisition:\n{}'.format(
+            cargo.acquisition.report()))
+    for sens_health in cargo.health:
+        rootLogger.info('Sensor health {}: {}'.format(
+            sens_health.kind, sens_health.stats()))
+    rootLogger.info('Latency of the phases:\n{}'.format(
+        cargo.latency.report()))
+    try:
+        cargo.latency.dump(LATENCY_FILE)
+    except IOError:
+        rootLogger.exception('Could not write {}'.format(LATENCY_FILE))
 
+    rootLogger.info('PWM writes: {}'.format(dict(
+        [(valve.name, valve.write_stats()) for valve in cargo.valve])))
     for idx, valve in enumerate(cargo.valve):
-        valve.set_pwm(1.)
+        valve.set_pwm(1., force=True)
         if idx == 0:
             valve.cleanup()
     for dvalve in cargo.dvalve:
@@ -685,13 +800,17 @@ class Cargo(object):
     def __init__(self, state, sens=[], valve=[], dvalve=[],
                  controller=[], IMU=[], imu_ctr=[]):
         self.state = state
-        self.actual_state = state
+        self.handoff = tasks.StateHandoff(state)
         self.sens = sens
+        self.sens_bank = sensors.DPressureSensBank(sens) if sens else None
         self.valve = valve
         self.dvalve = dvalve
         self.controller = controller
         self.errmsg = None
         self.sampling_time = TSAMPLING
+        self.loop = scheduler.LoopScheduler(
+            TSAMPLING, LOOP_POLICY, clock=backend.monotonic,
+            sleep=backend.sleep)
         self.pwm_task = {}
         self.dvalve_task = {}
         self.IMU = IMU
@@ -710,17 +829,69 @@ class Cargo(object):
         self.maxctrout = MAX_CTROUT
         for sensor in sens:
             self.rec[sensor.name] = 0.0
+        self.imu_bank = None
+        self.imu_filter = None
+        self.imu_time = None          # time stamp of the last IMU sample
+        self.imu_filter_time = None   # .. of the last filter update
         if IMU:
-            for imu in IMU:
-                self.rec_IMU[imu.name] = imu.get_acceleration()
+            self.imu_bank = sensors.IMUBank(IMU, gyro=bool(IMU_FILTER))
+            self.motion = self.imu_bank.sweep().copy()
+            self.acc = self.motion[:, :3]   # views of motion
+            self.gyro = self.motion[:, 3:]
+            for name, acc in zip(self.imu_bank.names, self.acc.tolist()):
+                self.rec_IMU[name] = acc
+            valves = valve[:len(imu_ctr)]
+            self.joint_angles = IMUcalc.JointAngles(
+                [IMU_IDX[v.name][:2] for v in valves],
+                [IMU_IDX[v.name][2] for v in valves])
+            if IMU_FILTER:
+                self.imu_filter = estimator.FILTERS[IMU_FILTER](len(valves))
+        self.acquisition = None
+        if PARALLEL_ACQUISITION and sens:
+            self.acquisition = acquisition.Acquisition(
+                self.sens_bank, self.imu_bank, ACQUISITION_PERIOD,
+                clock=backend.monotonic, sleep=backend.sleep)
+            self.pressure = np.zeros(len(sens))
+        self.health = [bank.health for bank in [self.sens_bank, self.imu_bank]
+                       if bank]
+        self.health_log = health.HealthLog(rootLogger.warning, self.health,
+                                           HEALTH_LOG_INTERVAL)
+        self.u_key = {}
+        self.r_key = {}
         for valve in self.valve:
-            self.rec_u['u{}'.format(valve.name)] = 1.
-            self.rec_r['r{}'.format(valve.name)] = None
+            self.u_key[valve.name] = 'u{}'.format(valve.name)
+            self.r_key[valve.name] = 'r{}'.format(valve.name)
+            self.rec_u[self.u_key[valve.name]] = 1.
+            self.rec_r[self.r_key[valve.name]] = None
+        self.telemetry = telemetry.RecTelemetry(
+            [self.rec, self.rec_u, self.rec_r, self.rec_IMU],
+            TELEMETRY_CAPACITY, TELEMETRY_FILE, clock=backend.monotonic)
+        self.tasks = tasks.TaskQueue()
+        self.latency = latency.PhaseTimer(LATENCY_PHASES)
 
         self.wcomm = WCommCargo()
         self.simpleWalkingCommander = \
             walk_commander.SimpleWalkingCommander(self)
 
+    @property
+    def actual_state(self):
+        """ The state the control loop is in, set by the state handlers """
+        return self.handoff.state
+
+    @actual_state.setter
+    def actual_state(self, state):
+        self.handoff.set(state)
+
+    def wait_state(self, state, timeout=None):
+        """
+        Block until the control loop arrived in *state*, see
+        tasks.StateHandoff.wait.
+
+        Returns:
+            (bool): whether the state was reached
+        """
+        return self.handoff.wait(state, timeout)
+
 
 class WCommCargo(object):
     def __init__(self):
@@ -734,6 +905,16 @@ class WCommCargo(object):
         self.infmode = True  # default: walk forever
         self.user_pattern = False
 
+    @property
+    def pattern(self):
+        return self.compiled.pattern
+
+    @pattern.setter
+    def pattern(self, pattern):
+        """ The pattern is compiled once here, see
+        reference.CompiledPattern """
+        self.compiled = reference.CompiledPattern(pattern)
+
 
 def initial_pattern(ptrn):
     return [ptrn[-1][:8] + [False, False, False, False, 1.0],